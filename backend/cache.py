@@ -0,0 +1,150 @@
+"""Small persistent TTL cache on SQLite, shared by anything that wants to
+remember an expensive upstream answer across requests and restarts.
+
+Entries expire `ttl_seconds` after they were written and the table is capped
+at `max_entries` (and, optionally, `max_bytes` of values) — once over a cap,
+the least-recently *read* rows go first, so a popular destination's answers
+survive while one-off lookups age out. A single connection guarded by a lock
+is plenty here: every operation is a primary-key lookup or write, far
+cheaper than the network call it replaces.
+
+Reads stay cheap enough to run inline: the database is in WAL mode with
+`synchronous=NORMAL`, so a commit doesn't wait on an fsync, and a hit only
+rewrites its `accessed_at` when the stored one is more than
+ACCESS_GRANULARITY_SECONDS old — the eviction order doesn't need finer
+resolution than that, and most hits then write nothing at all.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+ACCESS_GRANULARITY_SECONDS = 60.0
+
+
+class TTLCache:
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int, max_bytes: Optional[int] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at, accessed_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            if now - row[2] >= ACCESS_GRANULARITY_SECONDS:
+                self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl_seconds, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def get_json(self, key: str):
+        raw = self.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def set_json(self, key: str, value) -> None:
+        self.set(key, json.dumps(value).encode("utf-8"))
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN"
+                " (SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+        if self.max_bytes is not None:
+            (total,) = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()
+            if total > self.max_bytes:
+                # Oldest-read first until the rest fits.
+                self._conn.execute(
+                    "DELETE FROM entries WHERE key IN ("
+                    " SELECT key FROM ("
+                    "  SELECT key, SUM(LENGTH(value)) OVER (ORDER BY accessed_at DESC, key) AS kept"
+                    "  FROM entries)"
+                    " WHERE kept > ?)",
+                    (self.max_bytes,),
+                )
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        return count
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            (total,) = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()
+        return total
+
+    def stats(self) -> dict:
+        stats = {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+        if self.max_bytes is not None:
+            stats.update(bytes=self.total_bytes(), max_bytes=self.max_bytes)
+        return stats
+
+
+class LazyTTLCache:
+    """A module's shared TTLCache, opened on the first call rather than at
+    import, so importing the module (e.g. from tests) never touches the disk.
+    Tests swap in their own cache by setting `cache`."""
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int, max_bytes: Optional[int] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache: Optional[TTLCache] = None
+        self._lock = threading.Lock()
+
+    def __call__(self) -> TTLCache:
+        with self._lock:
+            if self.cache is None:
+                self.cache = TTLCache(self.path, self.ttl_seconds, self.max_entries, max_bytes=self.max_bytes)
+            return self.cache
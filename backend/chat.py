@@ -8,12 +8,30 @@ orchestration live in this same module (added in Task 3) since they're
 tightly coupled to this state shape.
 """
 
+import logging
+import os
 import uuid
-from dataclasses import dataclass, field
-from typing import Callable, Optional, TypedDict
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Optional, TypedDict
 
+from fastpath import extract_fast_path, record_turn
 from jsonutil import extract_json_object
+from metrics import LLM_PARSE_FAILURES
 from prompts import get_prompt_chat_turn
+from store import Codec, open_store
+from tokens import count_tokens
+
+logger = logging.getLogger("wandor.chat")
+
+# The turn prompt is built to fit this many tokens: the instructions and the
+# known trip details always go in, then as many of the latest messages as fit
+# (at most CHAT_HISTORY_MAX_MESSAGES). Older messages are folded into a short
+# rolling summary capped at CHAT_SUMMARY_TOKEN_BUDGET, which is set aside
+# within the budget.
+CHAT_PROMPT_TOKEN_BUDGET = int(os.environ.get("CHAT_PROMPT_TOKEN_BUDGET", 1500))
+CHAT_SUMMARY_TOKEN_BUDGET = int(os.environ.get("CHAT_SUMMARY_TOKEN_BUDGET", 200))
+CHAT_HISTORY_MAX_MESSAGES = int(os.environ.get("CHAT_HISTORY_MAX_MESSAGES", 12))
+SUMMARY_LINE_CHARS = 160
 
 
 class Interest(TypedDict):
@@ -129,6 +147,11 @@ def has_pricing_inputs(state: TripState) -> bool:
     return all(_is_filled(state, f) for f in ("destination", "num_days", "travel_month", "total_budget"))
 
 
+def has_price_search_inputs(state: TripState) -> bool:
+    """Every price search query is built from these two alone."""
+    return all(_is_filled(state, f) for f in ("destination", "travel_month"))
+
+
 def canned_ack(field: str, value) -> str:
     template = CANNED_ACKS.get(field, "Got it.")
     return template.format(value=value) if "{value}" in template else template
@@ -214,27 +237,158 @@ class ChatSession:
     phase: str = "collecting"
     pricing_job_id: Optional[str] = None
     itinerary_job_id: Optional[str] = None
+    # Destination/month key of the last speculative price search started.
+    price_prefetch_key: Optional[str] = None
+    # Messages before this index have been folded into `history_summary`.
+    summarized_messages: int = 0
+    history_summary: str = ""
 
 
-CHAT_SESSIONS: dict[str, ChatSession] = {}
+SESSION_CODEC = Codec(encode=asdict, decode=lambda data: ChatSession(**data))
 
+# Sessions idle for a day are let go; the byte ceiling mostly bounds long
+# transcripts.
+CHAT_SESSIONS = open_store(
+    "chat_sessions",
+    ttl_seconds=float(os.environ.get("SESSION_TTL_SECONDS", 24 * 3600)),
+    max_entries=int(os.environ.get("SESSION_MAX_ENTRIES", 50_000)),
+    max_bytes=int(os.environ.get("SESSION_MAX_BYTES", 256 * 1024 * 1024)),
+    codec=SESSION_CODEC,
+)
 
-def create_session() -> tuple[str, ChatSession]:
+
+async def create_session_async() -> tuple[str, ChatSession]:
     session_id = str(uuid.uuid4())
     session = ChatSession()
-    CHAT_SESSIONS[session_id] = session
+    await CHAT_SESSIONS.set_async(session_id, session)
     return session_id, session
 
 
-def get_session(session_id: str) -> Optional[ChatSession]:
-    return CHAT_SESSIONS.get(session_id)
+async def get_session_async(session_id: str) -> Optional[ChatSession]:
+    return await CHAT_SESSIONS.get_async(session_id)
+
+
+async def save_session_async(session_id: str, session: ChatSession) -> None:
+    """Writes a mutated session back. A no-op in effect for the in-memory
+    store (it holds the object itself), but required for the shared ones."""
+    await CHAT_SESSIONS.set_async(session_id, session)
+
+
+def _history_line(message: dict) -> str:
+    return f"{message['role']}: {message['content']}"
+
+
+def _state_text(state: TripState) -> str:
+    """Only what's actually known — empty fields are noise the model has to
+    read past, and the next-field line already says what's missing."""
+    lines = []
+    for name, value in state.items():
+        if not _is_filled(state, name):
+            continue
+        if name == "interests":
+            value = ", ".join(f"{i['interest']} ({i['rating']}/5)" for i in value)
+        lines.append(f"            - {name}: {value}")
+    return "\n".join(lines)
+
+
+def _fold_into_summary(session: ChatSession, messages: list[dict]) -> None:
+    """Adds older messages to the rolling summary, oldest lines dropping off
+    once it's over its budget. Only the traveler's side is kept: the
+    assistant's questions are implied by the trip details collected since.
+    Done incrementally, so each message is summarized once, with no extra
+    LLM call.
+    """
+    lines = session.history_summary.splitlines()
+    for message in messages:
+        if message["role"] != "user":
+            continue
+        content = " ".join(str(message["content"]).split())
+        if len(content) > SUMMARY_LINE_CHARS:
+            content = content[: SUMMARY_LINE_CHARS - 1].rstrip() + "…"
+        lines.append(f"            - {content}")
+    while lines and count_tokens("\n".join(lines)) > CHAT_SUMMARY_TOKEN_BUDGET:
+        lines.pop(0)
+    session.history_summary = "\n".join(lines)
+
+
+def _turn_prompt(session: ChatSession) -> tuple[Optional[str], str]:
+    next_field = next_missing_field(session.state)
+    state_text = _state_text(session.state)
+
+    def build(history_lines: list[str], history_summary: str) -> str:
+        return get_prompt_chat_turn(
+            history_text="\n".join(history_lines),
+            state=state_text,
+            next_field=next_field,
+            field_options=QUICK_REPLY_OPTIONS.get(next_field) if next_field else None,
+            next_field_hint=CANNED_QUESTIONS.get(next_field, "") if next_field else "",
+            history_summary=history_summary,
+        )
+
+    available = CHAT_PROMPT_TOKEN_BUDGET - CHAT_SUMMARY_TOKEN_BUDGET - count_tokens(build([], ""))
+    unsummarized = session.messages[session.summarized_messages:]
+    recent: list[str] = []
+    for message in reversed(unsummarized[-CHAT_HISTORY_MAX_MESSAGES:]):
+        line = _history_line(message)
+        cost = count_tokens(line) + 1
+        if recent and cost > available:
+            break  # the latest message always goes in, whatever its size
+        recent.insert(0, line)
+        available -= cost
+
+    evicted = len(unsummarized) - len(recent)
+    if evicted:
+        _fold_into_summary(session, unsummarized[:evicted])
+        session.summarized_messages += evicted
+
+    prompt = build(recent, session.history_summary)
+    logger.info(
+        "chat turn prompt: %d tokens (%d recent messages, %d summarized)",
+        count_tokens(prompt),
+        len(recent),
+        session.summarized_messages,
+    )
+    return next_field, prompt
+
 
+def _apply_turn_response(session: ChatSession, raw: str) -> str:
+    """Parses one LLM turn response into session.state and returns the reply.
+    Raises ValueError/KeyError on a malformed response.
+    """
+    parsed = extract_json_object(raw)
+    reply = str(parsed["reply"])
+    extracted = parsed.get("extracted", {})
+    if not isinstance(extracted, dict):
+        extracted = {}
+    session.state = apply_extracted_fields(session.state, extracted)
+    return reply
 
-def _history_text(messages: list[dict]) -> str:
-    return "\n".join(f"{m['role']}: {m['content']}" for m in messages[-12:])
+
+def _fallback_reply(session: ChatSession, next_field: Optional[str]) -> str:
+    fallback_field = next_missing_field(session.state) or next_field
+    return canned_question(fallback_field) if fallback_field else "Got it — could you tell me a bit more?"
 
 
-def run_chat_turn(session: ChatSession, call_llm: Callable[[str], str]) -> str:
+def try_fast_path_turn(session: ChatSession, text: str) -> Optional[str]:
+    """Answers a free-text turn without the LLM when `text` is plainly the
+    answer to the field being asked (see fastpath.py): the value is applied
+    like any extracted field, and the reply is the canned ack plus the next
+    question. Returns None to leave the turn to `run_chat_turn_async`.
+    """
+    field = next_missing_field(session.state)
+    extracted = extract_fast_path(text, field) if field else None
+    record_turn(extracted is not None)
+    if extracted is None:
+        return None
+    session.state = apply_extracted_fields(session.state, extracted)
+    ack = canned_ack(field, extracted[field])
+    following = next_missing_field(session.state)
+    return f"{ack} {canned_question(following)}" if following else ack
+
+
+async def run_chat_turn_async(
+    session: ChatSession, call_llm: Callable[[str], Awaitable[str]]
+) -> str:
     """Runs one LLM turn: extracts whatever fields it can from the latest
     user message, merges them into session.state, and returns a reply
     string. `call_llm` is injected so tests can stub it out.
@@ -242,28 +396,11 @@ def run_chat_turn(session: ChatSession, call_llm: Callable[[str], str]) -> str:
     Retries once on a malformed response, then falls back to a canned
     question for the current next-missing-field without losing state.
     """
-    next_field = next_missing_field(session.state)
-    prompt = get_prompt_chat_turn(
-        history_text=_history_text(session.messages),
-        state=session.state,
-        next_field=next_field,
-        field_options=QUICK_REPLY_OPTIONS.get(next_field) if next_field else None,
-        next_field_hint=CANNED_QUESTIONS.get(next_field, "") if next_field else "",
-    )
-
-    for attempt in range(2):
+    next_field, prompt = _turn_prompt(session)
+    for _ in range(2):
         try:
-            raw = call_llm(prompt)
-            parsed = extract_json_object(raw)
-            reply = str(parsed["reply"])
-            extracted = parsed.get("extracted", {})
-            if not isinstance(extracted, dict):
-                extracted = {}
-            session.state = apply_extracted_fields(session.state, extracted)
-            return reply
+            return _apply_turn_response(session, await call_llm(prompt))
         except (ValueError, KeyError):
-            if attempt == 1:
-                break
-
-    fallback_field = next_missing_field(session.state) or next_field
-    return canned_question(fallback_field) if fallback_field else "Got it — could you tell me a bit more?"
+            LLM_PARSE_FAILURES.inc(site="chat")
+            continue
+    return _fallback_reply(session, next_field)
@@ -0,0 +1,140 @@
+"""Rule-based extraction for chat answers too simple to need the LLM.
+
+Most free-text turns answer exactly the question just asked — "7 days",
+"October", "80k", "just the two of us" — and a full LLM round trip (two,
+when the JSON comes back malformed) is a slow, quota-hungry way to read
+them. `extract_fast_path` recognizes those answers locally, but only when
+the *whole* message is the answer: anything more ("7 days in Goa with my
+kids") may carry other fields, so it's left to the LLM.
+"""
+
+import re
+from typing import Optional
+
+from metrics import CHAT_TURNS
+
+FAST_PATH_FIELDS = ("num_days", "travel_month", "total_budget", "companions", "pace")
+
+MAX_TRIP_DAYS = 90
+# A bare "80" for a budget in INR is more likely shorthand than a real
+# amount; below this, ask the LLM (and through it, the user).
+MIN_BUDGET_INR = 1000
+
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "thirteen": 13, "fourteen": 14, "fifteen": 15, "twenty": 20, "thirty": 30,
+}
+
+_MONTHS = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+)
+_MONTH_NAMES = {month.lower(): month for month in _MONTHS}
+_MONTH_NAMES.update({month[:3].lower(): month for month in _MONTHS})
+_MONTH_NAMES["sept"] = "September"
+
+_BUDGET_MULTIPLIERS = {
+    "k": 1_000, "thousand": 1_000,
+    "l": 100_000, "lakh": 100_000, "lakhs": 100_000, "lac": 100_000, "lacs": 100_000,
+    "cr": 10_000_000, "crore": 10_000_000, "crores": 10_000_000,
+}
+
+_COMPANIONS = {
+    "Solo": ("solo", "alone", "just me", "only me", "me", "myself", "by myself", "on my own"),
+    "Couple": (
+        "couple", "a couple", "as a couple", "the two of us", "just the two of us", "two of us",
+        "with my partner", "my partner", "with my wife", "my wife", "with my husband", "my husband",
+    ),
+    "Family": ("family", "with family", "with my family", "my family", "with kids", "with my kids"),
+    "Group": ("group", "a group", "friends", "with friends", "with my friends", "group of friends"),
+}
+_COMPANION_PHRASES = {phrase: value for value, phrases in _COMPANIONS.items() for phrase in phrases}
+
+_PACES = {
+    "Relaxed": ("relaxed", "slow", "chill", "laid back", "laid-back", "easy", "easygoing", "leisurely"),
+    "Moderate": ("moderate", "balanced", "medium", "normal", "somewhere in between", "in between"),
+    "Packed": ("packed", "fast", "busy", "action packed", "action-packed", "full", "hectic"),
+}
+_PACE_PHRASES = {phrase: value for value, phrases in _PACES.items() for phrase in phrases}
+
+_HEDGES = r"(?:about|around|roughly|approx\.?|approximately|maybe|max|under|up\s*to|upto)\s+"
+
+_DAYS_RE = re.compile(
+    rf"^(?:for\s+)?(?:{_HEDGES})?(?P<count>\d{{1,3}}|[a-z]+)\s*(?P<unit>days?|weeks?)?$"
+)
+_MONTH_RE = re.compile(r"^(?:in\s+)?(?:the\s+)?(?:month\s+of\s+)?(?P<month>[a-z]+)\.?(?:\s+\d{4})?$")
+_BUDGET_RE = re.compile(
+    rf"^(?:{_HEDGES})?(?:₹|rs\.?|inr)?\s*(?P<amount>\d[\d,]*(?:\.\d+)?)\s*"
+    r"(?P<multiplier>k|thousand|l|lakhs?|lacs?|cr|crores?)?\s*(?:₹|rs\.?|inr|rupees)?$"
+)
+
+
+def _normalize(text: str) -> str:
+    text = " ".join(text.lower().split())
+    return text.strip(" .!?")
+
+
+def _count(word: str) -> Optional[int]:
+    if word.isdigit():
+        return int(word)
+    return _NUMBER_WORDS.get(word)
+
+
+def _num_days(text: str) -> Optional[int]:
+    match = _DAYS_RE.match(text)
+    if match is None:
+        return None
+    count = _count(match["count"])
+    unit = match["unit"] or ""
+    if count is None or (not unit and not match["count"].isdigit()):
+        return None  # "a" or "five" alone doesn't say five what
+    days = count * 7 if unit.startswith("week") else count
+    return days if 0 < days <= MAX_TRIP_DAYS else None
+
+
+def _travel_month(text: str) -> Optional[str]:
+    match = _MONTH_RE.match(text)
+    return _MONTH_NAMES.get(match["month"]) if match else None
+
+
+def _total_budget(text: str) -> Optional[float]:
+    match = _BUDGET_RE.match(text)
+    if match is None:
+        return None
+    try:
+        amount = float(match["amount"].replace(",", ""))
+    except ValueError:
+        return None
+    amount *= _BUDGET_MULTIPLIERS.get(match["multiplier"] or "", 1)
+    return amount if amount >= MIN_BUDGET_INR else None
+
+
+_EXTRACTORS = {
+    "num_days": _num_days,
+    "travel_month": _travel_month,
+    "total_budget": _total_budget,
+    "companions": _COMPANION_PHRASES.get,
+    "pace": _PACE_PHRASES.get,
+}
+
+
+def extract_fast_path(text: str, field: str) -> Optional[dict]:
+    """`{field: value}` if `text` is, in its entirety, an answer for `field`
+    this module is sure about; otherwise None."""
+    extractor = _EXTRACTORS.get(field)
+    if extractor is None:
+        return None
+    value = extractor(_normalize(text))
+    return None if value is None else {field: value}
+
+
+def record_turn(fast_path: bool) -> None:
+    CHAT_TURNS.inc(path="fast" if fast_path else "llm")
+
+
+def fast_path_stats() -> dict:
+    """How many free-text chat turns skipped the LLM — each one a saved call."""
+    fast, llm = int(CHAT_TURNS.value(path="fast")), int(CHAT_TURNS.value(path="llm"))
+    turns = fast + llm
+    return {"turns": turns, "fast_path": fast, "fast_path_share": round(fast / turns, 3) if turns else 0.0}
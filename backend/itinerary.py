@@ -0,0 +1,154 @@
+"""Per-day itinerary generation for long trips.
+
+One monolithic itinerary prompt is one long serial generation, so a 14-day
+trip takes roughly 14 days' worth of tokens of wall-clock time. Instead, a
+short skeleton call decides each day's theme and area first, then every day
+block (plus the closing summary/tips/weather sections) is generated
+concurrently against that skeleton and stitched back in order — wall-clock
+time comes close to the skeleton plus the slowest single day.
+
+LLM calls go through the caller's `call_llm(prompt, on_chunk)`, the same way
+chat.py takes it, so this module stays free of transport details.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+from jsonutil import extract_json_object
+from prompts import (
+    get_prompt_itinerary_closing,
+    get_prompt_itinerary_day,
+    get_prompt_itinerary_skeleton,
+)
+from upstream import StreamBuffer
+
+logger = logging.getLogger("wandor.itinerary")
+
+# "single": one prompt for the whole itinerary. "parallel_days": skeleton
+# first, then the days concurrently — for trips of at least
+# ITINERARY_PARALLEL_MIN_DAYS days; shorter ones gain little from it.
+ITINERARY_MODE = os.environ.get("ITINERARY_MODE", "single")
+ITINERARY_PARALLEL_MIN_DAYS = int(os.environ.get("ITINERARY_PARALLEL_MIN_DAYS", 4))
+# Concurrent day streams per itinerary job.
+ITINERARY_DAY_CONCURRENCY = int(os.environ.get("ITINERARY_DAY_CONCURRENCY", 4))
+
+BLOCK_SEPARATOR = "\n\n"
+
+CallLLM = Callable[[str, Optional[Callable[[str], None]]], Awaitable[str]]
+
+
+def use_parallel_days(num_days: int) -> bool:
+    return ITINERARY_MODE == "parallel_days" and num_days >= ITINERARY_PARALLEL_MIN_DAYS
+
+
+class SkeletonError(ValueError):
+    """The skeleton response wasn't a usable day-by-day outline."""
+
+
+def parse_skeleton(raw_response: str, num_days: int) -> list[dict]:
+    try:
+        days = extract_json_object(raw_response).get("days")
+    except ValueError as exc:
+        raise SkeletonError(str(exc)) from exc
+    if not isinstance(days, list) or len(days) != num_days or not all(isinstance(d, dict) for d in days):
+        raise SkeletonError(f"Expected an outline of {num_days} days.")
+    # Numbered by position; the model's own numbering isn't relied on.
+    return [{**entry, "day": number} for number, entry in enumerate(days, start=1)]
+
+
+class BlockStitcher:
+    """Joins concurrently streamed blocks into one text that only ever grows
+    at the end.
+
+    Block N's text is passed on (`on_text(delta)`) as it streams only once
+    blocks 0..N-1 have finished; until then it's held back. That keeps the
+    partial text append-only, so offset-based readers (see
+    `itinerary_status`) never see earlier text change.
+    """
+
+    def __init__(self, count: int, on_text: Callable[[str], None]):
+        self.on_text = on_text
+        self._blocks = [StreamBuffer() for _ in range(count)]
+        self._finished = [False] * count
+        self._current = 0  # first block not yet fully passed on
+        self._passed_on = 0  # characters of the current block passed on
+
+    def append(self, index: int, delta: str) -> None:
+        self._blocks[index].append(delta)
+        self._drain()
+
+    def finish(self, index: int) -> None:
+        self._finished[index] = True
+        self._drain()
+
+    def text(self) -> str:
+        return BLOCK_SEPARATOR.join(block.text().lstrip() for block in self._blocks)
+
+    def _drain(self) -> None:
+        while self._current < len(self._blocks):
+            block = self._blocks[self._current]
+            delta = block.since(self._passed_on)
+            if self._passed_on == 0:
+                delta = delta.lstrip()
+            if delta:
+                self.on_text(delta)
+                self._passed_on = len(block)
+            if not self._finished[self._current]:
+                return
+            self._current += 1
+            self._passed_on = 0
+            if self._current < len(self._blocks):
+                self.on_text(BLOCK_SEPARATOR)
+
+
+async def generate_itinerary_by_day(
+    trip: dict,
+    call_llm: CallLLM,
+    on_text: Callable[[str], None],
+    on_generated: Callable[[int], None],
+    concurrency: int = ITINERARY_DAY_CONCURRENCY,
+) -> str:
+    """Skeleton, then every day and the closing sections concurrently (at most
+    `concurrency` streams at a time). `on_text` receives the stitched
+    itinerary as it becomes available, in order; `on_generated` the number of
+    characters generated so far across all streams.
+
+    Raises SkeletonError if the outline can't be used, so the caller can fall
+    back to the single-prompt itinerary.
+    """
+    generated = 0
+
+    def counting(on_delta: Optional[Callable[[str], None]] = None) -> Callable[[str], None]:
+        def on_chunk(delta: str) -> None:
+            nonlocal generated
+            generated += len(delta)
+            on_generated(generated)
+            if on_delta is not None:
+                on_delta(delta)
+
+        return on_chunk
+
+    num_days = int(trip["num_days"])
+    skeleton = parse_skeleton(await call_llm(get_prompt_itinerary_skeleton(trip), counting()), num_days)
+
+    prompts = [get_prompt_itinerary_day(trip, day, skeleton) for day in range(1, num_days + 1)]
+    prompts.append(get_prompt_itinerary_closing(trip, skeleton))
+    stitcher = BlockStitcher(len(prompts), on_text)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def write_block(index: int, prompt: str) -> None:
+        async with slots:
+            await call_llm(prompt, counting(lambda delta: stitcher.append(index, delta)))
+        stitcher.finish(index)
+
+    blocks = [asyncio.ensure_future(write_block(index, prompt)) for index, prompt in enumerate(prompts)]
+    try:
+        await asyncio.gather(*blocks)
+    except BaseException:
+        for block in blocks:
+            block.cancel()
+        raise
+    logger.info("itinerary for %d days written in %d concurrent blocks", num_days, len(prompts))
+    return stitcher.text()
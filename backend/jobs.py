@@ -0,0 +1,317 @@
+"""Background job runner: one dedicated asyncio event loop on one thread.
+
+Cost-estimate and itinerary jobs outlive the request that started them, so
+they can't live on that request's loop. Instead of a thread per job (and a
+13-thread pool per cost estimate), every job is a coroutine scheduled onto
+this single loop — thousands of in-flight upstream calls cost a few KB of
+task state each rather than a thread stack each.
+
+Cheap as a coroutine is, an unbounded number of them still means an unbounded
+number of concurrent upstream calls during a spike. `JobScheduler` puts a
+fixed worker count and a bounded wait queue in front of each job type, and
+turns a full queue into an immediate `JobQueueFull` (surfaced as HTTP 429)
+instead of letting every job slow down together.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Coroutine, Optional, TypeVar
+
+from metrics import JOB_PHASE_SECONDS
+from store import KeyValueStore
+
+T = TypeVar("T")
+
+PROGRESS_FLUSH_SECONDS = float(os.environ.get("JOB_PROGRESS_FLUSH_SECONDS", 0.5))
+
+
+class JobRunner:
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="wandor-jobs", daemon=True
+                )
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> "Future[T]":
+        """Schedules `coro` on the runner loop; safe to call from any thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run_sync(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Blocks the calling thread until `coro` finishes on the runner loop.
+
+        For sync callers only — calling it from the runner thread itself
+        would wait on a loop that can no longer make progress.
+        """
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("run_sync() called from the job runner's own thread.")
+        return self.submit(coro).result()
+
+
+RUNNER = JobRunner()
+
+
+def submit(coro: Coroutine[Any, Any, T]) -> "Future[T]":
+    return RUNNER.submit(coro)
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    return RUNNER.run_sync(coro)
+
+
+class JobQueueFull(Exception):
+    def __init__(self, job_type: str, retry_after: int):
+        super().__init__(f"Too many {job_type} jobs queued; retry in {retry_after}s.")
+        self.job_type = job_type
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    """Runs at most `workers` jobs of one type at a time on the runner loop;
+    up to `queue_size` more wait in FIFO order, and beyond that `submit`
+    raises `JobQueueFull`.
+
+    `Retry-After` hints come from a moving average of how long jobs of this
+    type actually take, so they track reality rather than a guess.
+    """
+
+    def __init__(
+        self,
+        job_type: str,
+        workers: int,
+        queue_size: int,
+        initial_job_seconds: float = 30.0,
+        runner: JobRunner = RUNNER,
+    ):
+        self.job_type = job_type
+        self.workers = workers
+        self.queue_size = queue_size
+        self.rejected = 0
+        self._runner = runner
+        self._lock = threading.Lock()
+        # job id -> (coroutine, when it was queued)
+        self._waiting: "OrderedDict[str, tuple[Coroutine[Any, Any, None], float]]" = OrderedDict()
+        self._running = 0
+        self._tasks: set[asyncio.Task] = set()
+        self._avg_job_seconds = initial_job_seconds
+
+    def submit(self, job_id: str, coro: Coroutine[Any, Any, None]) -> None:
+        """Queues `coro` under `job_id`; safe to call from any thread."""
+        with self._lock:
+            free_workers = max(0, self.workers - self._running)
+            if len(self._waiting) >= self.queue_size + free_workers:
+                self.rejected += 1
+                retry_after = self._retry_after()
+                coro.close()
+                raise JobQueueFull(self.job_type, retry_after)
+            self._waiting[job_id] = (coro, time.monotonic())
+        self._runner.loop.call_soon_threadsafe(self._dispatch)
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based position among waiting jobs, or None once it's running
+        (or if it was never queued here)."""
+        with self._lock:
+            for position, waiting_id in enumerate(self._waiting, start=1):
+                if waiting_id == job_id:
+                    return position
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": len(self._waiting),
+                "queue_size": self.queue_size,
+                "rejected": self.rejected,
+                "avg_job_seconds": round(self._avg_job_seconds, 2),
+            }
+
+    def _retry_after(self) -> int:
+        # Time for the current queue to drain through the worker slots.
+        drain_seconds = self._avg_job_seconds * (len(self._waiting) + 1) / self.workers
+        return max(1, math.ceil(drain_seconds))
+
+    def _dispatch(self) -> None:
+        # Only ever runs on the runner loop, so `_running` needs the lock
+        # just for the readers on other threads.
+        with self._lock:
+            while self._running < self.workers and self._waiting:
+                _, (coro, queued_at) = self._waiting.popitem(last=False)
+                self._running += 1
+                # The loop only keeps weak references to tasks.
+                task = self._runner.loop.create_task(self._run(coro, queued_at))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, coro: Coroutine[Any, Any, None], queued_at: float) -> None:
+        started = time.monotonic()
+        JOB_PHASE_SECONDS.observe(started - queued_at, job_type=self.job_type, phase="queued")
+        try:
+            await coro
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._running -= 1
+                self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+            self._dispatch()
+
+
+class JobProgress:
+    """Batches one job's field updates into few store writes.
+
+    Progress callbacks fire per Tavily answer and per streamed token; writing
+    each one through to a shared store would cost more than the work being
+    reported. `set()` only buffers, with at most one write per
+    `flush_seconds`; `flush()` writes immediately and is what phase changes
+    and final results use, so those are never delayed. Every write also bumps
+    the job's `seq`, which event streams use as their event id. Must be used
+    from coroutines running on the job runner loop.
+    """
+
+    def __init__(self, store: KeyValueStore, job_id: str, flush_seconds: float = PROGRESS_FLUSH_SECONDS):
+        self.store = store
+        self.job_id = job_id
+        self.flush_seconds = flush_seconds
+        self._pending: dict = {}
+        self._seq = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: set[asyncio.Task] = set()
+        # Serializes writes (asyncio.Lock is FIFO), so they land in seq order
+        # even when the store writes from a worker thread.
+        self._write_lock = asyncio.Lock()
+
+    def set(self, **changes: Any) -> None:
+        self._pending.update(changes)
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_seconds, self._flush_later)
+
+    async def flush(self, **changes: Any) -> None:
+        self._pending.update(changes)
+        self._cancel_timer()
+        await self._write()
+
+    def flush_soon(self, **changes: Any) -> None:
+        """`flush()` for sync callbacks: the write is started now rather than
+        awaited."""
+        self._pending.update(changes)
+        self._cancel_timer()
+        self._start_write()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _flush_later(self) -> None:
+        self._timer = None
+        self._start_write()
+
+    def _start_write(self) -> None:
+        task = asyncio.get_running_loop().create_task(self._write())
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self) -> None:
+        async with self._write_lock:
+            pending = self._take_pending()
+            if pending:
+                await self.store.update_async(self.job_id, pending)
+
+    def _take_pending(self) -> dict:
+        pending, self._pending = self._pending, {}
+        # Values passed as zero-argument callables are evaluated only now, so
+        # something costly to build (a long partial text) is built once per
+        # write rather than once per set().
+        pending = {name: value() if callable(value) else value for name, value in pending.items()}
+        if pending:
+            self._seq += 1
+            pending["seq"] = self._seq
+        return pending
+
+
+class Flight:
+    """One in-progress computation shared by every caller that asked for it.
+
+    The work reports progress through `publish()`; each attached caller's
+    listener sees every change, and callers that attach late are first
+    caught up with the state so far.
+    """
+
+    def __init__(self):
+        self.state: dict = {}
+        self._listeners: list[Callable[[dict], None]] = []
+        self.task: Optional["asyncio.Future[Any]"] = None
+
+    def publish(self, **changes: Any) -> None:
+        self.state.update(changes)
+        for listener in list(self._listeners):
+            listener(changes)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one computation.
+
+    Ten users planning the same trip at the same moment should cost one
+    search-and-generate, not ten. Only calls that overlap in time are
+    coalesced — once the shared work finishes its key is free again — so
+    this complements a result cache rather than replacing it. Per process,
+    and must be used from coroutines running on the job runner loop.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = 0
+        self.coalesced = 0
+        self._flights: dict[str, Flight] = {}
+
+    async def run(
+        self,
+        key: str,
+        work: Callable[[Flight], Coroutine[Any, Any, T]],
+        listener: Optional[Callable[[dict], None]] = None,
+    ) -> T:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = Flight()
+            flight.task = asyncio.ensure_future(work(flight))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        if listener is None:
+            return await asyncio.shield(flight.task)
+        if flight.state:
+            listener(dict(flight.state))
+        flight._listeners.append(listener)
+        try:
+            # One caller giving up (its job evicted, say) mustn't cancel the
+            # work the others are waiting on.
+            return await asyncio.shield(flight.task)
+        finally:
+            flight._listeners.remove(listener)
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._flights), "started": self.started, "coalesced": self.coalesced}
+
+    def _forget(self, key: str, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
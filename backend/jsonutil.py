@@ -3,6 +3,7 @@ prose (the model doesn't always respect "respond with only JSON").
 """
 
 import json
+from typing import Any, Callable, Optional
 
 
 def extract_json_object(text: str) -> dict:
@@ -18,3 +19,95 @@ def extract_json_object(text: str) -> dict:
         return json.loads(text[start:end])
     except json.JSONDecodeError as exc:
         raise ValueError(f"Invalid JSON object: {exc}") from exc
+
+
+class IncrementalObjectParser:
+    """Parses a streamed JSON object as it arrives, reporting each nested
+    object or array the moment its closing bracket does.
+
+    `feed()` takes the stream chunk by chunk; `on_value(path, value)` fires
+    for every container value closed at most `max_depth` keys down, e.g.
+    `("accommodation", "hotel")` and then `("accommodation",)`. Like
+    `extract_json_object`, anything before the first "{" is skipped as prose.
+    """
+
+    def __init__(self, on_value: Callable[[tuple, Any], None], max_depth: int = 2):
+        self.on_value = on_value
+        self.max_depth = max_depth
+        self.done = False
+        self._chunks: list[str] = []
+        self._pos = 0  # offset of the character being parsed
+        self._started = False
+        self._in_string = False
+        self._escaped = False
+        self._key_chars: Optional[list[str]] = None  # set while reading a key
+        # One frame per open container: [opening char, start offset, path,
+        # current key (objects) or index (arrays), expecting a key next].
+        self._stack: list[list] = []
+
+    def feed(self, chunk: str) -> None:
+        if self.done:
+            return
+        self._chunks.append(chunk)
+        for char in chunk:
+            self._step(char)
+            self._pos += 1
+            if self.done:
+                break
+
+    def _step(self, char: str) -> None:
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+                if self._key_chars is not None:
+                    self._stack[-1][3] = json.loads('"' + "".join(self._key_chars) + '"')
+                    self._key_chars = None
+                return
+            if self._key_chars is not None:
+                self._key_chars.append(char)
+            return
+
+        if not self._started:
+            if char != "{":
+                return
+            self._started = True
+
+        if char == '"':
+            self._in_string = True
+            frame = self._stack[-1] if self._stack else None
+            if frame is not None and frame[0] == "{" and frame[4]:
+                self._key_chars = []
+        elif char in "{[":
+            path = ()
+            if self._stack:
+                parent = self._stack[-1]
+                path = parent[2] + (parent[3],)
+            self._stack.append([char, self._pos, path, 0 if char == "[" else None, char == "{"])
+        elif char in "}]":
+            _, start, path, _, _ = self._stack.pop()
+            if not self._stack:
+                self.done = True
+            if path and len(path) <= self.max_depth:
+                try:
+                    value = json.loads(self._slice(start, self._pos + 1))
+                except json.JSONDecodeError:
+                    return  # e.g. a trailing comma; the final parse will report it
+                self.on_value(path, value)
+        elif char == ":" and self._stack:
+            self._stack[-1][4] = False
+        elif char == "," and self._stack:
+            frame = self._stack[-1]
+            if frame[0] == "{":
+                frame[4] = True
+            else:
+                frame[3] += 1
+
+    def _slice(self, start: int, end: int) -> str:
+        # Joined only when a value closes — a handful of times per response.
+        text = "".join(self._chunks)
+        self._chunks = [text]
+        return text[start:end]
@@ -0,0 +1,56 @@
+"""Opt-in cache of whole LLM responses, keyed by what determines them.
+
+The same prompt reaches `call_llm_async` again and again — a regenerated
+itinerary, a refreshed tab, repeated test traffic — and each one otherwise
+pays full OpenRouter latency and quota. Responses are stored on disk (the
+same SQLite TTLCache the price and unit-cost caches use) under a hash of
+(model, normalized prompt, temperature), so any change to the model, the
+wording or the sampling settings is a different entry.
+
+Caching is enabled per call site ("chat", "cost", "itinerary") via
+LLM_CACHE_SITES and is off by default: with a non-zero temperature a cache
+hit returns the earlier answer instead of a fresh sample, which is a
+trade-off each site opts into.
+"""
+
+import hashlib
+import json
+import os
+from typing import Callable, Optional
+
+from cache import LazyTTLCache
+
+LLM_CACHE_SITES = frozenset(
+    site.strip() for site in os.environ.get("LLM_CACHE_SITES", "").split(",") if site.strip()
+)
+LLM_CACHE_PATH = os.environ.get(
+    "LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.sqlite3")
+)
+LLM_CACHE_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_SECONDS", 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 5_000))
+# A cached response is replayed to `on_chunk` in pieces of this size, so
+# progress reporting and incremental parsing see it arrive like a stream.
+LLM_CACHE_REPLAY_CHUNK_CHARS = int(os.environ.get("LLM_CACHE_REPLAY_CHUNK_CHARS", 256))
+
+get_llm_cache = LazyTTLCache(LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES)
+
+
+def llm_cache_enabled(site: Optional[str]) -> bool:
+    return site is not None and site in LLM_CACHE_SITES
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Whitespace-insensitive: the prompts are indented f-strings, and a
+    re-indented template shouldn't invalidate every entry."""
+    return " ".join(prompt.split())
+
+
+def llm_cache_key(model: str, prompt: str, temperature: float) -> str:
+    material = json.dumps([model, normalize_prompt(prompt), float(temperature)], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def replay(text: str, on_chunk: Callable[[str], None], chunk_chars: int = LLM_CACHE_REPLAY_CHUNK_CHARS) -> None:
+    """Feeds a cached response to `on_chunk` the way a stream would have."""
+    for start in range(0, len(text), max(1, chunk_chars)):
+        on_chunk(text[start:start + chunk_chars])
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import os
@@ -10,35 +11,76 @@ from dotenv import load_dotenv
 
 load_dotenv()  # must run before any local import that reads env vars at module load
 
-import markdown2
-import pdfkit
-import requests
-from fastapi import FastAPI, HTTPException, Response
+import httpx
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    JOB_PHASE_SECONDS,
+    LLM_CALLS,
+    LLM_CHARS_PER_SECOND,
+    LLM_FALLBACKS,
+    LLM_PARSE_FAILURES,
+    LLM_RESPONSE_SECONDS,
+    LLM_TIME_TO_FIRST_TOKEN_SECONDS,
+    CallbackMetric,
+    render_metrics,
+)
+from llm_cache import get_llm_cache, llm_cache_enabled, llm_cache_key, replay
+from jobs import Flight, JobProgress, JobQueueFull, JobScheduler, SingleFlight
+from pricing import (
+    COST_CATEGORIES,
+    build_cost_result,
+    get_unit_cost_cache,
+    is_unit_cost_table,
+    unit_cost_cache_key,
+)
+from pdf import PDF_RENDER_SCHEDULER, PdfRenderError, etag_matches, get_pdf_cache, itinerary_pdf, pdf_etag
 from prompts import get_prompt_cost, get_prompt_preference
-from search import gather_price_context
-from jsonutil import extract_json_object
+from routing import FALLBACK_STATUS_CODES, ModelRouter
+from search import SUBCATEGORY_QUERIES, gather_price_context_async, get_price_cache, search_retry_stats
+from sse import SSE_HEADERS, job_event_stream
+from store import open_store
+from upstream import StreamBuffer, get_async_client, pool_stats
+from fastpath import fast_path_stats
+from itinerary import SkeletonError, generate_itinerary_by_day, use_parallel_days
+from jsonutil import IncrementalObjectParser, extract_json_object
 from chat import (
+    CHAT_SESSIONS,
     FIELD_WIDGET,
     QUICK_REPLY_OPTIONS,
     apply_extracted_fields,
     canned_ack,
     canned_question,
-    create_session,
-    get_session,
+    create_session_async,
+    get_session_async,
+    save_session_async,
+    has_price_search_inputs,
     has_pricing_inputs,
     next_missing_field,
-    run_chat_turn,
+    run_chat_turn_async,
+    try_fast_path_turn,
 )
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("wandor.main")
 
 OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_URL = os.environ.get("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
 OPENROUTER_MODEL = os.environ.get("OPENROUTER_MODEL", "inclusionai/ling-3.0-flash:free")
+OPENROUTER_TEMPERATURE = 1.0
+# The read timeout bounds the wait for the response to start and any stall
+# mid-stream, not the stream's total length — an itinerary can stream for
+# minutes. Either way a timeout counts as the model failing.
+OPENROUTER_TIMEOUT = httpx.Timeout(
+    float(os.environ.get("OPENROUTER_READ_TIMEOUT_SECONDS", 60)),
+    connect=float(os.environ.get("OPENROUTER_CONNECT_TIMEOUT_SECONDS", 10)),
+)
+# Per-call-site model lists and circuit breakers, OPENROUTER_MODEL by default.
+MODEL_ROUTER = ModelRouter(OPENROUTER_MODEL)
 
 ALLOWED_ORIGINS = [
     origin.strip()
@@ -52,67 +94,193 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_methods=["GET", "POST"],
-    allow_headers=["Content-Type"],
+    allow_headers=["Content-Type", "Last-Event-ID", "Idempotency-Key", "If-None-Match"],
+    expose_headers=["Retry-After", "Server-Timing", "ETag"],
 )
 
 
-def call_llm(prompt: str, on_chunk: Optional[Callable[[str], None]] = None) -> str:
+@app.exception_handler(JobQueueFull)
+async def job_queue_full_handler(request: Request, exc: JobQueueFull):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+async def call_llm_async(
+    prompt: str, on_chunk: Optional[Callable[[str], None]] = None, site: Optional[str] = None
+) -> str:
     """Calls OpenRouter. When `on_chunk` is given, streams the response (SSE,
-    same format OpenAI-compatible APIs use) and fires `on_chunk(accumulated_text)`
-    as each piece arrives — real generation progress, not a guess, since an LLM
-    can't report a percentage for a response whose final length it doesn't know
-    yet. Without `on_chunk`, behaves exactly as before (one blocking call).
+    same format OpenAI-compatible APIs use) and fires `on_chunk(delta)` with
+    each new piece of text as it arrives — real generation progress, not a
+    guess, since an LLM can't report a percentage for a response whose final
+    length it doesn't know yet. Without `on_chunk`, behaves exactly as before
+    (one blocking call).
+
+    The model comes from `site`'s route (see routing.py). A model that is
+    rate-limited, erroring or unreachable is passed over for the route's
+    next one — unless part of its answer has already been streamed, which
+    can't be taken back.
     """
     if not OPENROUTER_API_KEY:
         raise HTTPException(status_code=500, detail="Server is missing OPENROUTER_API_KEY.")
 
+    site_label = site or "default"
+    failed: Optional[tuple[str, Exception]] = None
+    for model in MODEL_ROUTER.candidates(site):
+        if failed is not None:
+            LLM_FALLBACKS.inc(site=site_label)
+            logger.warning("Model %s failed (%r); falling back to %s.", failed[0], failed[1], model)
+        streamed = False
+        started = time.monotonic()
+
+        def forward(delta: str) -> None:
+            nonlocal streamed
+            if not streamed:
+                LLM_TIME_TO_FIRST_TOKEN_SECONDS.observe(time.monotonic() - started, site=site_label)
+            streamed = True
+            on_chunk(delta)
+
+        try:
+            text = await _call_model(model, prompt, forward if on_chunk is not None else None)
+        except (HTTPException, httpx.TransportError) as exc:
+            LLM_CALLS.inc(site=site_label, model=model, outcome="error")
+            retryable = not isinstance(exc, HTTPException) or exc.status_code in FALLBACK_STATUS_CODES
+            if streamed or not retryable:
+                raise
+            failed = (model, exc)
+            continue
+        elapsed = time.monotonic() - started
+        LLM_CALLS.inc(site=site_label, model=model, outcome="ok")
+        LLM_RESPONSE_SECONDS.observe(elapsed, site=site_label)
+        if text and elapsed > 0:
+            LLM_CHARS_PER_SECOND.observe(len(text) / elapsed, site=site_label)
+        return text
+    # Every model the route had left failed; surface the last one's error.
+    raise failed[1]
+
+
+async def _call_model(model: str, prompt: str, on_chunk: Optional[Callable[[str], None]]) -> str:
+    """One call to one model. Its latency (to the first token when
+    streaming) and outcome feed that model's circuit breaker."""
     streaming = on_chunk is not None
-    response = requests.post(
+    client = get_async_client()
+    request = client.build_request(
+        "POST",
         OPENROUTER_URL,
         headers={
             "Authorization": f"Bearer {OPENROUTER_API_KEY}",
             "X-Title": "Wandor",
         },
         json={
-            "model": OPENROUTER_MODEL,
+            "model": model,
             "messages": [{"role": "user", "content": prompt}],
-            "temperature": 1.0,
+            "temperature": OPENROUTER_TEMPERATURE,
             "stream": streaming,
         },
-        stream=streaming,
+        timeout=OPENROUTER_TIMEOUT,
     )
-    if response.status_code != 200:
-        detail = response.text
+    started = time.monotonic()
+    try:
+        response = await client.send(request, stream=streaming)
+    except httpx.TransportError:
+        MODEL_ROUTER.record(model, time.monotonic() - started, ok=False)
+        raise
+    try:
+        if response.status_code != 200:
+            await response.aread()
+            if response.status_code in FALLBACK_STATUS_CODES:
+                MODEL_ROUTER.record(model, time.monotonic() - started, ok=False)
+            detail = response.text
+            try:
+                detail = response.json().get("error", detail)
+            except ValueError:
+                pass
+            raise HTTPException(status_code=response.status_code, detail=str(detail))
+
+        if not streaming:
+            content = response.json()["choices"][0]["message"]["content"]
+            MODEL_ROUTER.record(model, time.monotonic() - started, ok=True)
+            return content
+
+        full_text = StreamBuffer()
+        # The pooled client decodes as UTF-8 by default — an SSE stream
+        # (`text/event-stream`) carries no charset, and guessing one corrupts
+        # multi-byte characters like ₹ and °.
+        async for line in response.aiter_lines():
+            if not line or not line.startswith("data: "):
+                continue
+            data = line[len("data: "):]
+            if data.strip() == "[DONE]":
+                # Keep reading to the end of the body rather than breaking
+                # out — a fully consumed response can go back to the pool.
+                continue
+            try:
+                chunk = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+            delta = chunk.get("choices", [{}])[0].get("delta", {}).get("content", "")
+            if delta:
+                if not full_text:
+                    MODEL_ROUTER.record(model, time.monotonic() - started, ok=True)
+                full_text.append(delta)
+                on_chunk(delta)
+        if not full_text:
+            MODEL_ROUTER.record(model, time.monotonic() - started, ok=True)
+        return full_text.text()
+    except httpx.TransportError:
+        # A read timeout or a dropped connection mid-response: a model that
+        # stalls counts against its circuit like one that refuses.
+        MODEL_ROUTER.record(model, time.monotonic() - started, ok=False)
+        raise
+    finally:
+        # Hands the connection back to the pool (or drops it if we stopped
+        # reading a stream early) instead of leaking it.
+        await response.aclose()
+
+
+async def call_llm_cached(
+    site: str,
+    prompt: str,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    cache_if: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """`call_llm_async` through the LLM response cache, if LLM_CACHE_SITES
+    enables it for `site`. A hit is replayed through `on_chunk` so progress
+    reporting works the same as for a live stream. Only non-empty responses
+    that pass `cache_if` are stored — a malformed one would otherwise be
+    served back to the caller's own retry.
+    """
+    if not llm_cache_enabled(site):
+        return await call_llm_async(prompt, on_chunk=on_chunk, site=site)
+
+    cache = get_llm_cache()
+    # Keyed by the site's whole route: which of its models answered depends
+    # on their health at the time, not on the prompt.
+    key = llm_cache_key(",".join(MODEL_ROUTER.site_models(site)), prompt, OPENROUTER_TEMPERATURE)
+    cached = cache.get_json(key)
+    if cached is not None:
+        if on_chunk is not None:
+            replay(cached["text"], on_chunk)
+        return cached["text"]
+
+    text = await call_llm_async(prompt, on_chunk=on_chunk, site=site)
+    if text and (cache_if is None or cache_if(text)):
+        cache.set_json(key, {"text": text})
+    return text
+
+
+def _parsed_response_is(check: Callable[[dict], bool]) -> Callable[[str], bool]:
+    """A `cache_if` for responses that must be a JSON object passing `check`."""
+
+    def cache_if(raw_response: str) -> bool:
         try:
-            detail = response.json().get("error", detail)
+            return check(extract_json_object(raw_response))
         except ValueError:
-            pass
-        raise HTTPException(status_code=response.status_code, detail=str(detail))
-
-    if not streaming:
-        return response.json()["choices"][0]["message"]["content"]
-
-    full_text = ""
-    for raw_line in response.iter_lines():
-        # Decode bytes ourselves as UTF-8 — `decode_unicode=True` relies on
-        # `response.encoding`, which requests can't infer from an SSE stream
-        # (no charset in `text/event-stream`) and falls back to guessing,
-        # corrupting multi-byte characters like ₹ and °.
-        line = raw_line.decode("utf-8") if raw_line else ""
-        if not line or not line.startswith("data: "):
-            continue
-        data = line[len("data: "):]
-        if data.strip() == "[DONE]":
-            break
-        try:
-            chunk = json.loads(data)
-        except json.JSONDecodeError:
-            continue
-        delta = chunk.get("choices", [{}])[0].get("delta", {}).get("content", "")
-        if delta:
-            full_text += delta
-            on_chunk(full_text)
-    return full_text
+            return False
+
+    return cache_if
 
 
 class CostEstimateRequest(BaseModel):
@@ -122,74 +290,268 @@ class CostEstimateRequest(BaseModel):
     total_budget: float
 
 
-# In-memory job store. Fine for this app's single-process scale; would need a
-# shared store (e.g. Redis) behind multiple workers or processes.
-COST_ESTIMATE_JOBS: dict[str, dict] = {}
+JOB_TTL_SECONDS = float(os.environ.get("JOB_TTL_SECONDS", 3600))
+JOB_MAX_ENTRIES = int(os.environ.get("JOB_MAX_ENTRIES", 10_000))
+JOB_MAX_BYTES = int(os.environ.get("JOB_MAX_BYTES", 256 * 1024 * 1024))
 
+# Job store, on whichever backend STORE_BACKEND selects. The default in-memory
+# one is per process; pick sqlite or redis to run more than one worker, or
+# status polls that land on a different worker than the job will 404.
+COST_ESTIMATE_JOBS = open_store("cost_estimate_jobs", JOB_TTL_SECONDS, JOB_MAX_ENTRIES, JOB_MAX_BYTES)
 
-def _run_cost_estimate_job(job_id: str, payload: CostEstimateRequest) -> None:
-    job = COST_ESTIMATE_JOBS[job_id]
-    try:
+COST_ESTIMATE_SCHEDULER = JobScheduler(
+    "cost_estimate",
+    workers=int(os.environ.get("COST_ESTIMATE_WORKERS", 50)),
+    queue_size=int(os.environ.get("COST_ESTIMATE_QUEUE_SIZE", 500)),
+)
 
+PRICE_QUERY_COUNT = sum(len(subcategories) for subcategories in SUBCATEGORY_QUERIES.values())
+
+
+# Price searches for the same destination and month share one set of Tavily
+# calls — in particular, a cost estimate picks up the speculative prefetch
+# the chat started a few turns earlier instead of repeating it.
+PRICE_CONTEXT_FLIGHTS = SingleFlight("price_context")
+
+PRICE_PREFETCH_SCHEDULER = JobScheduler(
+    "price_prefetch",
+    workers=int(os.environ.get("PRICE_PREFETCH_WORKERS", 20)),
+    queue_size=int(os.environ.get("PRICE_PREFETCH_QUEUE_SIZE", 200)),
+)
+
+
+async def _gather_shared_price_context(
+    destination: str, travel_month: str, listener: Optional[Callable[[dict], None]] = None
+) -> dict:
+    async def work(flight: Flight) -> dict:
         def on_progress(resolved: int, total: int) -> None:
-            job["resolved"] = resolved
-            job["total"] = total
+            flight.publish(resolved=resolved, total=total)
+
+        def on_outcome(outcome: dict) -> None:
+            flight.publish(search=outcome)
 
-        price_context = gather_price_context(
-            payload.destination, payload.travel_month, on_progress=on_progress
+        return await gather_price_context_async(
+            destination, travel_month, on_progress=on_progress, on_outcome=on_outcome
         )
-        job["status"] = "generating"
 
-        def on_chunk(accumulated_text: str) -> None:
-            job["generated_chars"] = len(accumulated_text)
+    return await PRICE_CONTEXT_FLIGHTS.run(unit_cost_cache_key(destination, travel_month), work, listener)
+
+
+async def _prefetch_prices(destination: str, travel_month: str) -> None:
+    try:
+        await _gather_shared_price_context(destination, travel_month)
+    except Exception:  # speculative; the real job searches again if this failed
+        logger.exception("Price prefetch for %s (%s) failed", destination, travel_month)
+
+
+# Identical cost estimates started close together (same destination and
+# month, whatever the budget or trip length) share one search-and-generate.
+UNIT_COST_FLIGHTS = SingleFlight("unit_cost_table")
+
+
+async def _compute_unit_cost_table(destination: str, travel_month: str, flight: Flight) -> dict:
+    started = time.monotonic()
+    price_context = await _gather_shared_price_context(
+        destination, travel_month, listener=lambda changes: flight.publish(**changes)
+    )
+    generating_at = time.monotonic()
+    JOB_PHASE_SECONDS.observe(generating_at - started, job_type="cost_estimate", phase="searching")
+    flight.publish(status="generating")
+
+    # Categories and their line items are published as soon as each one's
+    # JSON closes, so the breakdown fills in while the rest is generated.
+    partial: dict[str, dict] = {}
+
+    def on_value(path: tuple, value) -> None:
+        if path[0] not in COST_CATEGORIES or not isinstance(value, dict):
+            return
+        if len(path) == 1:
+            partial[path[0]] = value
+        else:
+            partial.setdefault(path[0], {})[path[1]] = value
+        # A fresh copy each time: stores and event streams spot changes by
+        # comparing against what they saw last.
+        flight.publish(partial_result={category: dict(items) for category, items in partial.items()})
+
+    parser = IncrementalObjectParser(on_value)
+    generated_chars = 0
+
+    def on_chunk(delta: str) -> None:
+        nonlocal generated_chars
+        parser.feed(delta)
+        generated_chars += len(delta)
+        flight.publish(generated_chars=generated_chars)
+
+    prompt = get_prompt_cost(
+        destination=destination,
+        travel_month=travel_month,
+        price_context=price_context,
+    )
+    raw_response = await call_llm_cached(
+        "cost", prompt, on_chunk=on_chunk, cache_if=_parsed_response_is(is_unit_cost_table)
+    )
+    JOB_PHASE_SECONDS.observe(time.monotonic() - generating_at, job_type="cost_estimate", phase="generating")
+
+    try:
+        table = extract_json_object(raw_response)
+    except ValueError:
+        LLM_PARSE_FAILURES.inc(site="cost")
+        raise
+    if is_unit_cost_table(table):
+        get_unit_cost_cache().set_json(unit_cost_cache_key(destination, travel_month), table)
+    else:
+        LLM_PARSE_FAILURES.inc(site="cost")
+    return table
 
-        prompt = get_prompt_cost(
-            destination=payload.destination,
-            num_days=payload.num_days,
-            travel_month=payload.travel_month,
-            total_budget=payload.total_budget,
-            price_context=price_context,
-        )
-        raw_response = call_llm(prompt, on_chunk=on_chunk)
 
-        job["result"] = extract_json_object(raw_response)
-        job["status"] = "done"
+async def _run_cost_estimate_job(job_id: str, payload: CostEstimateRequest) -> None:
+    if not await COST_ESTIMATE_JOBS.contains_async(job_id):
+        return  # evicted while still queued; nobody is polling for it
+    progress = JobProgress(COST_ESTIMATE_JOBS, job_id)
+    try:
+        # The per-unit table only depends on where and when, so any earlier
+        # trip to the same place in the same month has already paid for it.
+        cache_key = unit_cost_cache_key(payload.destination, payload.travel_month)
+        table = get_unit_cost_cache().get_json(cache_key)
+        if table is not None:
+            await progress.flush(
+                resolved=PRICE_QUERY_COUNT,
+                result=build_cost_result(table, payload.num_days),
+                status="done",
+            )
+            return
+
+        def on_shared_progress(changes: dict) -> None:
+            # Phase changes and early results go out at once; counters are
+            # batched as usual.
+            if "status" in changes or "partial_result" in changes:
+                progress.flush_soon(**changes)
+            else:
+                progress.set(**changes)
+
+        table = await UNIT_COST_FLIGHTS.run(
+            cache_key,
+            lambda flight: _compute_unit_cost_table(payload.destination, payload.travel_month, flight),
+            listener=on_shared_progress,
+        )
+        await progress.flush(result=build_cost_result(table, payload.num_days), status="done")
     except HTTPException as exc:
-        job["status"] = "error"
-        job["error"] = str(exc.detail)
+        await progress.flush(status="error", error=str(exc.detail))
     except (ValueError, json.JSONDecodeError):
-        job["status"] = "error"
-        job["error"] = "Failed to parse cost estimates from the model response."
+        await progress.flush(
+            status="error", error="Failed to parse cost estimates from the model response."
+        )
     except Exception as exc:  # last-resort guard so a bug never leaves a job hung
-        job["status"] = "error"
-        job["error"] = f"Unexpected error: {exc}"
+        await progress.flush(status="error", error=f"Unexpected error: {exc}")
 
 
-def start_cost_estimate_job(payload: CostEstimateRequest) -> str:
+async def start_cost_estimate_job(payload: CostEstimateRequest, idempotency_key: Optional[str] = None) -> str:
+    """Starts a cost estimate job. With `idempotency_key`, returns the job
+    that key already started instead, if there is one."""
     job_id = str(uuid.uuid4())
-    COST_ESTIMATE_JOBS[job_id] = {
+    await COST_ESTIMATE_JOBS.set_async(job_id, {
+        "seq": 0,
         "status": "searching",
         "resolved": 0,
-        "total": 13,
+        "total": PRICE_QUERY_COUNT,
         "generated_chars": 0,
+        "search": None,
+        "partial_result": None,
         "result": None,
         "error": None,
-    }
-    threading.Thread(target=_run_cost_estimate_job, args=(job_id, payload), daemon=True).start()
+    })
+    if idempotency_key:
+        # The job exists before its key is claimed, so a concurrent retry
+        # that finds the claim also finds the job.
+        try:
+            previous_job_id = await _claim_idempotency_key(idempotency_key, job_id, payload)
+        except BaseException:
+            await COST_ESTIMATE_JOBS.delete_async(job_id)
+            raise
+        if previous_job_id is not None:
+            await COST_ESTIMATE_JOBS.delete_async(job_id)
+            return previous_job_id
+    try:
+        COST_ESTIMATE_SCHEDULER.submit(job_id, _run_cost_estimate_job(job_id, payload))
+    except JobQueueFull:
+        await COST_ESTIMATE_JOBS.delete_async(job_id)
+        if idempotency_key:
+            await COST_ESTIMATE_IDEMPOTENCY_KEYS.delete_async(idempotency_key)
+        raise
     return job_id
 
 
+# Idempotency-Key -> the job it started, so a client retrying a start whose
+# response it never saw gets its original job back instead of a second one.
+COST_ESTIMATE_IDEMPOTENCY_KEYS = open_store(
+    "cost_estimate_idempotency_keys", JOB_TTL_SECONDS, JOB_MAX_ENTRIES, 16 * 1024 * 1024
+)
+
+
+async def _claim_idempotency_key(
+    idempotency_key: str, job_id: str, payload: CostEstimateRequest
+) -> Optional[str]:
+    """Records that `idempotency_key` started `job_id`. The claim is a
+    set-if-absent, so of two retries racing with the same key exactly one
+    starts a job; the other gets that job's id back from here."""
+    claim = {"job_id": job_id, "request": payload.model_dump()}
+    while not await COST_ESTIMATE_IDEMPOTENCY_KEYS.set_if_absent_async(idempotency_key, claim):
+        previous = await COST_ESTIMATE_IDEMPOTENCY_KEYS.get_async(idempotency_key)
+        if previous is None:
+            continue  # released since by a start that failed; claim it again
+        if previous["request"] != claim["request"]:
+            raise HTTPException(
+                status_code=422, detail="Idempotency-Key was already used for a different request."
+            )
+        if await COST_ESTIMATE_JOBS.contains_async(previous["job_id"]):
+            return previous["job_id"]
+        # The key outlived its job (evicted early): start over under it.
+        await COST_ESTIMATE_IDEMPOTENCY_KEYS.set_async(idempotency_key, claim)
+        break
+    return None
+
+
 @app.post("/api/cost-estimate/start")
-def start_cost_estimate(payload: CostEstimateRequest):
-    return {"job_id": start_cost_estimate_job(payload)}
+async def start_cost_estimate(
+    payload: CostEstimateRequest,
+    idempotency_key: Optional[str] = Header(default=None, max_length=255),
+):
+    return {"job_id": await start_cost_estimate_job(payload, idempotency_key)}
 
 
 @app.get("/api/cost-estimate/status/{job_id}")
-def cost_estimate_status(job_id: str):
-    job = COST_ESTIMATE_JOBS.get(job_id)
+async def cost_estimate_status(job_id: str):
+    job = await COST_ESTIMATE_JOBS.get_async(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found.")
-    return job
+    return {**job, "queue_position": COST_ESTIMATE_SCHEDULER.queue_position(job_id)}
+
+
+def _last_event_id(request: Request, last_event_id: Optional[int]) -> Optional[int]:
+    """Resume point from EventSource's automatic `Last-Event-ID` header, or
+    from a `?last_event_id=` query param for clients that reconnect by hand."""
+    header = request.headers.get("last-event-id")
+    if header and header.isdigit():
+        return int(header)
+    return last_event_id
+
+
+@app.get("/api/cost-estimate/events/{job_id}")
+async def cost_estimate_events(job_id: str, request: Request, last_event_id: Optional[int] = None):
+    if not await COST_ESTIMATE_JOBS.contains_async(job_id):
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return StreamingResponse(
+        job_event_stream(
+            COST_ESTIMATE_JOBS,
+            job_id,
+            progress_fields=("resolved", "total", "generated_chars", "search", "partial_result"),
+            queue_position=COST_ESTIMATE_SCHEDULER.queue_position,
+            is_disconnected=request.is_disconnected,
+            last_event_id=_last_event_id(request, last_event_id),
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
 
 
 class ItineraryRequest(BaseModel):
@@ -210,68 +572,126 @@ class ItineraryRequest(BaseModel):
     nationality: str = ""
 
 
-# In-memory job store, same pattern as COST_ESTIMATE_JOBS above.
-ITINERARY_JOBS: dict[str, dict] = {}
+# Job store, same pattern as COST_ESTIMATE_JOBS above.
+ITINERARY_JOBS = open_store("itinerary_jobs", JOB_TTL_SECONDS, JOB_MAX_ENTRIES, JOB_MAX_BYTES)
 
+ITINERARY_SCHEDULER = JobScheduler(
+    "itinerary",
+    workers=int(os.environ.get("ITINERARY_WORKERS", 20)),
+    queue_size=int(os.environ.get("ITINERARY_QUEUE_SIZE", 200)),
+    initial_job_seconds=60.0,
+)
 
-def _run_itinerary_job(job_id: str, payload: ItineraryRequest) -> None:
-    job = ITINERARY_JOBS[job_id]
-    try:
-        prompt = get_prompt_preference(
-            num_days=payload.num_days,
-            destination=payload.destination,
-            total_budget=payload.total_budget,
-            companions=payload.companions,
-            interests_str=payload.interests_str,
-            child_ages=payload.child_ages,
-            accommodation=payload.accommodation,
-            transportation=payload.transportation,
-            dining=payload.dining,
-            pace=payload.pace,
-            special_requests=payload.special_requests,
-            dietary_restrictions=payload.dietary_restrictions,
-            accessibility_needs=payload.accessibility_needs,
-            nationality=payload.nationality,
-            travel_month=payload.travel_month,
-        )
-
-        def on_chunk(accumulated_text: str) -> None:
-            job["generated_chars"] = len(accumulated_text)
 
-        itinerary_text = call_llm(prompt, on_chunk=on_chunk)
-        job["result"] = {"itinerary": itinerary_text}
-        job["status"] = "done"
+async def _run_itinerary_job(job_id: str, payload: ItineraryRequest) -> None:
+    if not await ITINERARY_JOBS.contains_async(job_id):
+        return  # evicted while still queued; nobody is polling for it
+    progress = JobProgress(ITINERARY_JOBS, job_id)
+    try:
+        trip = payload.model_dump()
+        # The text so far goes into the job on the usual batching timer, so
+        # clients can render it as it's written (see `itinerary_status`).
+        generated = StreamBuffer()
+
+        def on_text(delta: str) -> None:
+            generated.append(delta)
+            progress.set(partial_text=generated.text)
+
+        started = time.monotonic()
+        itinerary_text = None
+        # Characters generated by a per-day attempt that fell back. The
+        # one-pass fallback counts on from there, so the progress clients
+        # see never goes backwards.
+        abandoned_chars = 0
+
+        def on_generated(chars: int) -> None:
+            nonlocal abandoned_chars
+            abandoned_chars = chars
+            progress.set(generated_chars=chars)
+
+        if use_parallel_days(payload.num_days):
+            try:
+                itinerary_text = await generate_itinerary_by_day(
+                    trip,
+                    lambda prompt, on_chunk: call_llm_cached("itinerary", prompt, on_chunk=on_chunk),
+                    on_text=on_text,
+                    on_generated=on_generated,
+                )
+            except SkeletonError as exc:
+                LLM_PARSE_FAILURES.inc(site="itinerary")
+                logger.warning("Per-day itinerary unavailable (%s); writing it in one pass.", exc)
+
+        if itinerary_text is None:
+            def on_chunk(delta: str) -> None:
+                on_text(delta)
+                progress.set(generated_chars=abandoned_chars + len(generated))
+
+            itinerary_text = await call_llm_cached("itinerary", get_prompt_preference(**trip), on_chunk=on_chunk)
+        JOB_PHASE_SECONDS.observe(time.monotonic() - started, job_type="itinerary", phase="generating")
+        await progress.flush(result={"itinerary": itinerary_text}, partial_text=None, status="done")
     except HTTPException as exc:
-        job["status"] = "error"
-        job["error"] = str(exc.detail)
+        await progress.flush(status="error", error=str(exc.detail))
     except Exception as exc:  # last-resort guard so a bug never leaves a job hung
-        job["status"] = "error"
-        job["error"] = f"Unexpected error: {exc}"
+        await progress.flush(status="error", error=f"Unexpected error: {exc}")
 
 
-def start_itinerary_job(payload: ItineraryRequest) -> str:
+async def start_itinerary_job(payload: ItineraryRequest) -> str:
     job_id = str(uuid.uuid4())
-    ITINERARY_JOBS[job_id] = {
+    await ITINERARY_JOBS.set_async(job_id, {
+        "seq": 0,
         "status": "generating",
         "generated_chars": 0,
+        "partial_text": "",
         "result": None,
         "error": None,
-    }
-    threading.Thread(target=_run_itinerary_job, args=(job_id, payload), daemon=True).start()
+    })
+    try:
+        ITINERARY_SCHEDULER.submit(job_id, _run_itinerary_job(job_id, payload))
+    except JobQueueFull:
+        await ITINERARY_JOBS.delete_async(job_id)
+        raise
     return job_id
 
 
 @app.post("/api/itinerary/start")
-def start_itinerary(payload: ItineraryRequest):
-    return {"job_id": start_itinerary_job(payload)}
+async def start_itinerary(payload: ItineraryRequest):
+    return {"job_id": await start_itinerary_job(payload)}
 
 
 @app.get("/api/itinerary/status/{job_id}")
-def itinerary_status(job_id: str):
-    job = ITINERARY_JOBS.get(job_id)
+async def itinerary_status(job_id: str, offset: Optional[int] = Query(default=None, ge=0)):
+    """Job status. With `?offset=N`, also the itinerary text written since
+    character N (`text`) and where to continue from next poll
+    (`next_offset`) — so a client can render the itinerary as it's written
+    without downloading all of it on every poll."""
+    job = await ITINERARY_JOBS.get_async(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found.")
-    return job
+    status = {name: value for name, value in job.items() if name != "partial_text"}
+    status["queue_position"] = ITINERARY_SCHEDULER.queue_position(job_id)
+    if offset is not None:
+        text = (job.get("result") or {}).get("itinerary") or job.get("partial_text") or ""
+        status["text"] = text[offset:]
+        status["next_offset"] = max(offset, len(text))
+    return status
+
+
+@app.get("/api/itinerary/events/{job_id}")
+async def itinerary_events(job_id: str, request: Request, last_event_id: Optional[int] = None):
+    if not await ITINERARY_JOBS.contains_async(job_id):
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return StreamingResponse(
+        job_event_stream(
+            ITINERARY_JOBS,
+            job_id,
+            progress_fields=("generated_chars",),
+            queue_position=ITINERARY_SCHEDULER.queue_position,
+            is_disconnected=request.is_disconnected,
+            last_event_id=_last_event_id(request, last_event_id),
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
 
 
 class ChatStartRequest(BaseModel):
@@ -296,18 +716,37 @@ class ChatTurnResponse(BaseModel):
     phase: str
 
 
-def _run_chat_turn_safely(session) -> str:
+async def _run_chat_turn_safely(session) -> str:
     try:
-        return run_chat_turn(session, call_llm)
+        return await run_chat_turn_async(
+            session,
+            lambda prompt: call_llm_cached(
+                "chat", prompt, cache_if=_parsed_response_is(lambda parsed: "reply" in parsed)
+            ),
+        )
     except Exception:
         logger.exception("Chat turn LLM call failed; falling back to a canned question.")
         fallback_field = next_missing_field(session.state)
         return canned_question(fallback_field) if fallback_field else "Sorry, something went wrong — could you try again?"
 
 
-def _maybe_start_pricing(session) -> None:
-    if session.pricing_job_id is None and has_pricing_inputs(session.state):
-        session.pricing_job_id = start_cost_estimate_job(
+async def _maybe_start_pricing(session) -> None:
+    """Starts the background price estimate once its inputs are known. If the
+    queue is full the chat carries on regardless — `pricing_job_id` stays
+    None, so the next turn simply tries again.
+
+    Until then, as soon as destination and month are known, the price
+    searches are started speculatively: they don't need the trip length or
+    budget, and running them while the user answers the remaining questions
+    hides most of the search phase behind the conversation.
+    """
+    if session.pricing_job_id is not None:
+        return
+    if not has_pricing_inputs(session.state):
+        _maybe_prefetch_prices(session)
+        return
+    try:
+        session.pricing_job_id = await start_cost_estimate_job(
             CostEstimateRequest(
                 destination=session.state["destination"],
                 num_days=session.state["num_days"],
@@ -315,6 +754,25 @@ def _maybe_start_pricing(session) -> None:
                 total_budget=session.state["total_budget"],
             )
         )
+    except JobQueueFull:
+        logger.warning("Cost-estimate queue full; deferring pricing for this session.")
+
+
+def _maybe_prefetch_prices(session) -> None:
+    if not has_price_search_inputs(session.state):
+        return
+    destination, travel_month = session.state["destination"], session.state["travel_month"]
+    key = unit_cost_cache_key(destination, travel_month)
+    # Also covers the user changing their mind about where or when.
+    if session.price_prefetch_key == key:
+        return
+    session.price_prefetch_key = key
+    if get_unit_cost_cache().get(key) is not None:
+        return  # the cost estimate won't search at all
+    try:
+        PRICE_PREFETCH_SCHEDULER.submit(str(uuid.uuid4()), _prefetch_prices(destination, travel_month))
+    except JobQueueFull:
+        session.price_prefetch_key = None  # purely speculative; try again next turn
 
 
 def _build_chat_response(session_id: str, session, message: str) -> ChatTurnResponse:
@@ -345,8 +803,16 @@ def _build_chat_response(session_id: str, session, message: str) -> ChatTurnResp
     )
 
 
-def _start_itinerary_from_state(session) -> str:
-    return start_itinerary_job(
+async def _finish_turn(session_id: str, session, message: str) -> ChatTurnResponse:
+    """Builds the turn's response, then writes the session back — after the
+    build, since that's where this turn's phase is decided."""
+    response = _build_chat_response(session_id, session, message)
+    await save_session_async(session_id, session)
+    return response
+
+
+async def _start_itinerary_from_state(session) -> str:
+    return await start_itinerary_job(
         ItineraryRequest(
             destination=session.state["destination"],
             num_days=session.state["num_days"],
@@ -370,24 +836,24 @@ def _start_itinerary_from_state(session) -> str:
 
 
 @app.post("/api/chat/start", response_model=ChatTurnResponse)
-def chat_start(payload: ChatStartRequest):
-    session_id, session = create_session()
+async def chat_start(payload: ChatStartRequest):
+    session_id, session = await create_session_async()
 
     if payload.seed_text and payload.seed_text.strip():
         session.messages.append({"role": "user", "content": payload.seed_text.strip()})
-        reply = _run_chat_turn_safely(session)
+        reply = await _run_chat_turn_safely(session)
         session.messages.append({"role": "assistant", "content": reply})
-        _maybe_start_pricing(session)
-        return _build_chat_response(session_id, session, reply)
+        await _maybe_start_pricing(session)
+        return await _finish_turn(session_id, session, reply)
 
     opening = canned_question("destination")
     session.messages.append({"role": "assistant", "content": opening})
-    return _build_chat_response(session_id, session, opening)
+    return await _finish_turn(session_id, session, opening)
 
 
 @app.post("/api/chat/{session_id}/message", response_model=ChatTurnResponse)
-def chat_message(session_id: str, payload: ChatMessageRequest):
-    session = get_session(session_id)
+async def chat_message(session_id: str, payload: ChatMessageRequest):
+    session = await get_session_async(session_id)
     if session is None:
         raise HTTPException(status_code=404, detail="Chat session not found.")
 
@@ -406,28 +872,39 @@ def chat_message(session_id: str, payload: ChatMessageRequest):
             message = canned_ack(field, value)
     elif payload.text and payload.text.strip():
         session.messages.append({"role": "user", "content": payload.text.strip()})
-        message = _run_chat_turn_safely(session)
+        message = try_fast_path_turn(session, payload.text)
+        if message is None:
+            message = await _run_chat_turn_safely(session)
     else:
         raise HTTPException(
             status_code=400, detail="Provide either text or a structured_field/structured_value."
         )
 
     session.messages.append({"role": "assistant", "content": message})
-    _maybe_start_pricing(session)
+    await _maybe_start_pricing(session)
 
     # `session.phase` here reflects the value `_build_chat_response` left it at
     # on the *previous* turn — the frontend only ever sends "wrapup_submit"
     # after it already received widget == "optional_wrapup", so this check
     # is reading last turn's outcome, not this turn's (not yet computed).
     if session.phase == "optional_wrapup" and payload.structured_field == "wrapup_submit":
-        session.itinerary_job_id = _start_itinerary_from_state(session)
+        try:
+            session.itinerary_job_id = await _start_itinerary_from_state(session)
+        except JobQueueFull as exc:
+            # Leaves the session in optional_wrapup, so the same submit
+            # button simply works again once there's room.
+            message = (
+                "Lots of trips are being planned right now — give it about "
+                f"{exc.retry_after} seconds and submit again."
+            )
+            session.messages[-1]["content"] = message
 
-    return _build_chat_response(session_id, session, message)
+    return await _finish_turn(session_id, session, message)
 
 
 @app.get("/api/chat/{session_id}", response_model=ChatTurnResponse)
-def chat_get(session_id: str):
-    session = get_session(session_id)
+async def chat_get(session_id: str):
+    session = await get_session_async(session_id)
     if session is None:
         raise HTTPException(status_code=404, detail="Chat session not found.")
     last_message = session.messages[-1]["content"] if session.messages else ""
@@ -438,45 +915,160 @@ class ItineraryPdfRequest(BaseModel):
     itinerary_markdown: str
 
 
-@app.post("/api/itinerary/pdf")
-def itinerary_pdf(payload: ItineraryPdfRequest):
-    start = time.monotonic()
-    html_body = markdown2.markdown(
-        payload.itinerary_markdown, extras=["fenced-code-blocks", "tables"]
-    )
-    html_content = f"""
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <link href="https://fonts.googleapis.com/css2?family=Open+Sans&display=swap" rel="stylesheet">
-        <style>
-            body {{ font-family: 'Open Sans', sans-serif; }}
-            table {{ width: 100%; border-collapse: collapse; }}
-            th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-            th {{ background-color: #f2f2f2; }}
-        </style>
-    </head>
-    <body>
-        {html_body}
-    </body>
-    </html>
-    """
+async def _pdf_response(itinerary_markdown: str, if_none_match: Optional[str]) -> Response:
+    """The itinerary's PDF, or a bare 304 when the client already holds this
+    exact content — the ETag is a hash of it, so that's known before any
+    cache lookup or render."""
+    etag = pdf_etag(itinerary_markdown)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
     try:
-        pdf_bytes = pdfkit.from_string(html_content, False, options={"encoding": "UTF-8"})
-    except OSError as exc:
-        raise HTTPException(
-            status_code=500,
-            detail="PDF generation failed — is wkhtmltopdf installed on this host?",
-        ) from exc
-
-    elapsed = time.monotonic() - start
-    logger.info(
-        "PDF generated in %.2fs (%d chars of markdown in, %d bytes out)",
-        elapsed, len(payload.itinerary_markdown), len(pdf_bytes),
-    )
+        document = await itinerary_pdf(itinerary_markdown)
+    except PdfRenderError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc)) from exc
 
+    rendered = document.rendered
+    if rendered is None:
+        headers["Server-Timing"] = "cache;desc=hit"
+    else:
+        logger.info(
+            "PDF generated in %.2fs after %.2fs queued (%d chars of markdown in, %d bytes out)",
+            rendered.render_seconds, rendered.queue_seconds,
+            len(itinerary_markdown), len(rendered.content),
+        )
+        headers["Server-Timing"] = (
+            f"queue;dur={rendered.queue_seconds * 1000:.0f}, "
+            f"render;dur={rendered.render_seconds * 1000:.0f}"
+        )
     return Response(
-        content=pdf_bytes,
+        content=document.content,
         media_type="application/pdf",
-        headers={"Content-Disposition": "attachment; filename=itinerary.pdf"},
+        headers={"Content-Disposition": "attachment; filename=itinerary.pdf", **headers},
     )
+
+
+@app.post("/api/itinerary/pdf")
+async def itinerary_pdf_from_markdown(
+    payload: ItineraryPdfRequest, if_none_match: Optional[str] = Header(default=None)
+):
+    return await _pdf_response(payload.itinerary_markdown, if_none_match)
+
+
+@app.get("/api/itinerary/pdf/{job_id}")
+async def itinerary_pdf_from_job(job_id: str, if_none_match: Optional[str] = Header(default=None)):
+    """The PDF of a finished itinerary job, so clients don't have to upload
+    the markdown they were just sent."""
+    job = await ITINERARY_JOBS.get_async(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail="The itinerary isn't finished yet.")
+    return await _pdf_response(job["result"]["itinerary"], if_none_match)
+
+
+def _process_stats() -> dict:
+    """Resident memory and thread count of this worker process. RSS comes
+    from /proc, so it's only reported on Linux."""
+    stats = {"threads": threading.active_count()}
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    stats["rss_bytes"] = int(line.split()[1]) * 1024
+                elif line.startswith("Threads:"):
+                    stats["threads"] = int(line.split()[1])  # OS threads, not just Python's
+    except OSError:
+        pass
+    return stats
+
+
+def _collect_stats() -> dict:
+    """Blocking: the store and cache sizes come from SQLite queries or a Redis
+    round trip, so callers on the event loop run this in a thread."""
+    return {
+        "process": _process_stats(),
+        "upstream_pool": pool_stats(),
+        "price_cache": get_price_cache().stats(),
+        "unit_cost_cache": get_unit_cost_cache().stats(),
+        "llm_cache": get_llm_cache().stats(),
+        "pdf_cache": get_pdf_cache().stats(),
+        "model_routing": MODEL_ROUTER.stats(),
+        "search_retries": search_retry_stats(),
+        "chat_fast_path": fast_path_stats(),
+        "stores": {
+            store.name: store.stats()
+            for store in (COST_ESTIMATE_JOBS, COST_ESTIMATE_IDEMPOTENCY_KEYS, ITINERARY_JOBS, CHAT_SESSIONS)
+        },
+        "coalescing": {
+            flights.name: flights.stats() for flights in (PRICE_CONTEXT_FLIGHTS, UNIT_COST_FLIGHTS)
+        },
+        "job_queues": {
+            "cost_estimate": COST_ESTIMATE_SCHEDULER.stats(),
+            "itinerary": ITINERARY_SCHEDULER.stats(),
+            "price_prefetch": PRICE_PREFETCH_SCHEDULER.stats(),
+            "pdf_render": PDF_RENDER_SCHEDULER.stats(),
+        },
+    }
+
+
+@app.get("/api/stats")
+async def stats():
+    """Operational counters for tuning — upstream connection reuse, search
+    retries, chat turns answered without the LLM, cache effectiveness, job
+    queue depth and store sizes. Not user-facing."""
+    return await asyncio.to_thread(_collect_stats)
+
+
+JOB_SCHEDULERS = (COST_ESTIMATE_SCHEDULER, ITINERARY_SCHEDULER, PRICE_PREFETCH_SCHEDULER, PDF_RENDER_SCHEDULER)
+
+
+def _job_counts() -> dict:
+    counts = {}
+    for scheduler in JOB_SCHEDULERS:
+        queue = scheduler.stats()
+        counts[(scheduler.job_type, "running")] = queue["running"]
+        counts[(scheduler.job_type, "queued")] = queue["queued"]
+    return counts
+
+
+def _cache_requests() -> dict:
+    caches = {
+        "price": get_price_cache(),
+        "unit_cost": get_unit_cost_cache(),
+        "llm": get_llm_cache(),
+        "pdf": get_pdf_cache(),
+    }
+    counts = {}
+    for name, cache in caches.items():
+        counts[(name, "hit")] = cache.hits
+        counts[(name, "miss")] = cache.misses
+    return counts
+
+
+# Read from the same sources as /api/stats at scrape time.
+CallbackMetric(
+    "wandor_jobs", "Jobs running or waiting for a worker, per job type.", "gauge",
+    labels=("job_type", "state"), collect=_job_counts,
+)
+CallbackMetric(
+    "wandor_jobs_rejected", "Jobs turned away with a 429 because their queue was full.", "counter",
+    labels=("job_type",),
+    collect=lambda: {(scheduler.job_type,): scheduler.rejected for scheduler in JOB_SCHEDULERS},
+)
+CallbackMetric(
+    "wandor_chat_sessions", "Chat sessions held in the session store (not yet expired).", "gauge",
+    collect=lambda: {(): CHAT_SESSIONS.stats()["entries"]},
+)
+CallbackMetric(
+    "wandor_cache_requests", "Cache lookups per cache; result is hit or miss.", "counter",
+    labels=("cache", "result"), collect=_cache_requests,
+)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint (see metrics.py). Not user-facing. Rendered
+    in a thread because wandor_chat_sessions counts the session store."""
+    return Response(content=await asyncio.to_thread(render_metrics), media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,230 @@
+"""Prometheus metrics, served as text from /metrics.
+
+/api/stats answers "what is the state right now"; these answer "how has it
+been going" — latency distributions of every upstream call and job phase,
+and counters a scraper can rate() over. Instrumented code calls `observe`
+and `inc` on the metrics defined at the bottom of this file; numbers that
+already live elsewhere (cache hit counts, queue depths, store sizes) are
+read at scrape time through `CallbackMetric` instead of being counted twice.
+
+The exposition format is small enough that this doesn't pull in
+prometheus_client. Like /api/stats, everything here is per process: with
+several uvicorn workers, scrape each one (or let Prometheus sum them).
+"""
+
+import bisect
+import math
+import threading
+from typing import Callable, Iterable, Optional
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a cached chat turn to a long itinerary stream.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+CHARS_PER_SECOND_BUCKETS = (10, 25, 50, 100, 200, 400, 800, 1600, 3200)
+
+LabelValues = tuple[str, ...]
+
+_REGISTRY: list["Metric"] = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _REGISTRY.append(self)
+
+    def _label_values(self, labels: dict) -> LabelValues:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> list[tuple[str, LabelValues, tuple[str, ...], float]]:
+        """(suffix, label values, extra label pairs, value) per sample line."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            names = self.labels + tuple(name for name, _ in extra)
+            all_values = values + tuple(label for _, label in extra)
+            lines.append(f"{self.name}{suffix}{_format_labels(names, all_values)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def values(self) -> dict[LabelValues, float]:
+        """Every label set counted so far, with its count."""
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        with self._lock:
+            return [("_total", values, (), value) for values, value in sorted(self._values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count per bucket (non-cumulative), the sum, and the count.
+        self._series: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0, 0])
+            counts, totals = series
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            series = self._series.get(self._label_values(labels))
+            return int(series[1][1]) if series else 0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for values, (counts, (total, count)) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    samples.append(("_bucket", values, (("le", _format_value(bound)),), cumulative))
+                samples.append(("_sum", values, (), total))
+                samples.append(("_count", values, (), count))
+        return samples
+
+
+class CallbackMetric(Metric):
+    """A counter or gauge whose values are read at scrape time from
+    `collect`, which returns {label values: value}."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        kind: str,
+        labels: tuple[str, ...] = (),
+        collect: Optional[Callable[[], dict[LabelValues, float]]] = None,
+    ):
+        super().__init__(name, help_text, labels)
+        self.kind = kind
+        self.collect = collect
+
+    def samples(self):
+        if self.collect is None:
+            return []
+        suffix = "_total" if self.kind == "counter" else ""
+        return [(suffix, tuple(map(str, values)), (), value) for values, value in sorted(self.collect().items())]
+
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    """Nearest-rank percentile of `values` (which must not be empty): the
+    smallest value with at least `pct` percent of them at or below it."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def render_metrics() -> str:
+    with _registry_lock:
+        metrics = list(_REGISTRY)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+TAVILY_SEARCH_SECONDS = Histogram(
+    "wandor_tavily_search_seconds",
+    "Price search latency per sub-category, hedges and retries included; outcome is answered or empty.",
+    labels=("subcategory", "outcome"),
+)
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    "wandor_llm_time_to_first_token_seconds",
+    "Time from sending a streamed LLM request to its first token, per call site.",
+    labels=("site",),
+)
+LLM_RESPONSE_SECONDS = Histogram(
+    "wandor_llm_response_seconds",
+    "Time from sending an LLM request to its last token, per call site.",
+    labels=("site",),
+)
+LLM_CHARS_PER_SECOND = Histogram(
+    "wandor_llm_chars_per_second",
+    "Characters of LLM output per second over the whole response, per call site.",
+    labels=("site",),
+    buckets=CHARS_PER_SECOND_BUCKETS,
+)
+LLM_CALLS = Counter(
+    "wandor_llm_calls", "LLM calls per call site and model; outcome is ok or error.", labels=("site", "model", "outcome")
+)
+LLM_FALLBACKS = Counter(
+    "wandor_llm_fallbacks", "LLM calls retried on the call site's next model.", labels=("site",)
+)
+LLM_PARSE_FAILURES = Counter(
+    "wandor_llm_parse_failures",
+    "LLM responses that couldn't be parsed into what the call site asked for.",
+    labels=("site",),
+)
+TAVILY_SEARCH_EVENTS = Counter(
+    "wandor_tavily_search_events",
+    "Tavily attempts, retries and why retrying stopped (see search.py).",
+    labels=("event",),
+)
+UPSTREAM_REQUESTS = Counter(
+    "wandor_upstream_requests", "Requests sent through the pooled upstream client, per host.", labels=("host",)
+)
+UPSTREAM_CONNECTIONS_OPENED = Counter(
+    "wandor_upstream_connections_opened",
+    "New connections (TCP and TLS handshakes) the pooled upstream client opened, per host.",
+    labels=("host",),
+)
+CHAT_TURNS = Counter(
+    "wandor_chat_turns", "Free-text chat turns; path is fast (no LLM call) or llm.", labels=("path",)
+)
+JOB_PHASE_SECONDS = Histogram(
+    "wandor_job_phase_seconds",
+    "Time jobs spend per phase: queued for a worker, searching, generating or rendering.",
+    labels=("job_type", "phase"),
+)
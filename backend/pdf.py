@@ -0,0 +1,217 @@
+"""Itinerary PDF rendering on a bounded pool of render workers.
+
+Rendering shells out to wkhtmltopdf, which has no server mode, so each PDF
+is still its own process. What used to make export slow and fragile was
+around that: every request rendered in its own thread with no limit, no
+timeout, and a template that fetched Open Sans from Google Fonts — so each
+render also waited on the network, and hung or fell back to a default font
+offline. Here renders go through a JobScheduler (a fixed set of workers, a
+FIFO queue, 429 + Retry-After beyond it), run as async subprocesses killed
+after PDF_RENDER_TIMEOUT_SECONDS, and only use fonts installed on the host
+(the Dockerfile installs them).
+
+Finished PDFs (and the HTML they came from) are cached on disk under a hash
+of the markdown and the template version, which doubles as the ETag — so a
+repeat download costs neither a render nor, with If-None-Match, a body.
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import signal
+import time
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+import markdown2
+import pdfkit
+
+from cache import LazyTTLCache
+from jobs import JobScheduler
+from metrics import JOB_PHASE_SECONDS
+
+PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", 4))
+PDF_RENDER_QUEUE_SIZE = int(os.environ.get("PDF_RENDER_QUEUE_SIZE", 32))
+PDF_RENDER_TIMEOUT_SECONDS = float(os.environ.get("PDF_RENDER_TIMEOUT_SECONDS", 30))
+# Found on PATH when unset.
+WKHTMLTOPDF_PATH = os.environ.get("WKHTMLTOPDF_PATH")
+
+PDF_CACHE_PATH = os.environ.get(
+    "PDF_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf_cache.sqlite3")
+)
+PDF_CACHE_TTL_SECONDS = float(os.environ.get("PDF_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+PDF_CACHE_MAX_ENTRIES = int(os.environ.get("PDF_CACHE_MAX_ENTRIES", 5_000))
+# PDFs run to hundreds of kilobytes, so the cache is bounded by size too.
+PDF_CACHE_MAX_BYTES = int(os.environ.get("PDF_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+get_pdf_cache = LazyTTLCache(
+    PDF_CACHE_PATH, PDF_CACHE_TTL_SECONDS, PDF_CACHE_MAX_ENTRIES, max_bytes=PDF_CACHE_MAX_BYTES
+)
+
+PDF_RENDER_SCHEDULER = JobScheduler(
+    "pdf_render",
+    workers=PDF_RENDER_WORKERS,
+    queue_size=PDF_RENDER_QUEUE_SIZE,
+    initial_job_seconds=2.0,
+)
+
+# Fonts resolved through fontconfig on the host: Open Sans (fonts-open-sans)
+# first, then DejaVu Sans (fonts-dejavu-core), which also covers ₹ and °.
+PDF_TEMPLATE = """
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <style>
+            body {{ font-family: 'Open Sans', 'DejaVu Sans', sans-serif; }}
+            table {{ width: 100%; border-collapse: collapse; }}
+            th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+            th {{ background-color: #f2f2f2; }}
+        </style>
+    </head>
+    <body>
+        {body}
+    </body>
+    </html>
+    """
+
+PDF_OPTIONS = {"encoding": "UTF-8"}
+MARKDOWN_EXTRAS = ["fenced-code-blocks", "tables"]
+
+# Anything that changes the output for the same markdown changes this, so
+# cached PDFs (and their ETags) from an older template are never served.
+PDF_TEMPLATE_VERSION = hashlib.sha256(
+    json.dumps([PDF_TEMPLATE, PDF_OPTIONS, MARKDOWN_EXTRAS]).encode("utf-8")
+).hexdigest()[:12]
+
+
+class PdfRenderError(Exception):
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class RenderedPdf:
+    content: bytes
+    queue_seconds: float
+    render_seconds: float
+
+
+@dataclass
+class ItineraryPdf:
+    content: bytes
+    etag: str
+    # None when served from the cache.
+    rendered: Optional[RenderedPdf] = None
+
+
+def render_html(itinerary_markdown: str) -> str:
+    body = markdown2.markdown(itinerary_markdown, extras=MARKDOWN_EXTRAS)
+    return PDF_TEMPLATE.format(body=body)
+
+
+def pdf_content_key(itinerary_markdown: str) -> str:
+    return hashlib.sha256(f"{PDF_TEMPLATE_VERSION}\n{itinerary_markdown}".encode("utf-8")).hexdigest()
+
+
+def pdf_etag(itinerary_markdown: str) -> str:
+    return f'"{pdf_content_key(itinerary_markdown)}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+@lru_cache(maxsize=1)
+def _configuration():
+    """Located once — pdfkit otherwise runs `which wkhtmltopdf` per render.
+    A failed lookup isn't cached, so installing it later is picked up."""
+    return pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH or "")
+
+
+async def _run_wkhtmltopdf(html: str) -> bytes:
+    try:
+        command = pdfkit.PDFKit(html, "string", options=dict(PDF_OPTIONS), configuration=_configuration()).command()
+    except OSError as exc:  # pdfkit couldn't find the binary
+        raise PdfRenderError("PDF generation failed — is wkhtmltopdf installed on this host?") from exc
+
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            process.communicate(html.encode("utf-8")), PDF_RENDER_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError as exc:
+        # The whole process group, so nothing it spawned keeps the pipes open.
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        raise PdfRenderError(
+            f"PDF generation took longer than {PDF_RENDER_TIMEOUT_SECONDS:g}s.", status_code=504
+        ) from exc
+    # wkhtmltopdf exits non-zero for recoverable load errors too; what
+    # matters is whether a PDF came out.
+    if not stdout.startswith(b"%PDF"):
+        detail = stderr.decode("utf-8", "replace").strip()[:500]
+        raise PdfRenderError(f"PDF generation failed: {detail or f'exit code {process.returncode}'}")
+    return stdout
+
+
+async def render_pdf(html: str) -> RenderedPdf:
+    """Renders `html` on the worker pool. Raises JobQueueFull when the pool's
+    queue is full, PdfRenderError when the render fails or times out."""
+    result: concurrent.futures.Future = concurrent.futures.Future()
+    queued_at = time.monotonic()
+
+    async def render() -> None:
+        started = time.monotonic()
+        try:
+            content = await _run_wkhtmltopdf(html)
+        except Exception as exc:
+            result.set_exception(exc)
+        else:
+            render_seconds = time.monotonic() - started
+            JOB_PHASE_SECONDS.observe(render_seconds, job_type="pdf_render", phase="rendering")
+            result.set_result(RenderedPdf(content, started - queued_at, render_seconds))
+
+    PDF_RENDER_SCHEDULER.submit(str(uuid.uuid4()), render())
+    # The pool runs on the job runner's loop; this may be awaited on another.
+    return await asyncio.wrap_future(result)
+
+
+async def itinerary_pdf(itinerary_markdown: str) -> ItineraryPdf:
+    """The PDF for `itinerary_markdown`, from the cache when it's been
+    rendered before; otherwise rendered on the pool (see `render_pdf` for
+    what that can raise) and cached."""
+    key = pdf_content_key(itinerary_markdown)
+    etag = f'"{key}"'
+    # The cache is SQLite on disk: keep its reads and writes (a cached PDF
+    # is hundreds of kilobytes) off the event loop.
+    cache = await asyncio.to_thread(get_pdf_cache)
+    cached = await asyncio.to_thread(cache.get, f"pdf:{key}")
+    if cached is not None:
+        return ItineraryPdf(cached, etag)
+
+    raw_html = await asyncio.to_thread(cache.get, f"html:{key}")
+    if raw_html is None:
+        html = render_html(itinerary_markdown)
+        await asyncio.to_thread(cache.set, f"html:{key}", html.encode("utf-8"))
+    else:
+        html = raw_html.decode("utf-8")
+    rendered = await render_pdf(html)
+    await asyncio.to_thread(cache.set, f"pdf:{key}", rendered.content)
+    return ItineraryPdf(rendered.content, etag, rendered)
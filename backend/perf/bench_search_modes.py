@@ -0,0 +1,97 @@
+"""Benchmarks the two price search modes (see PRICE_SEARCH_MODE in search.py)
+against the real Tavily API, to pick one per deployment:
+
+    cd backend
+    python -m perf.bench_search_modes --destinations "Tokyo,Lisbon,Goa" --month October
+
+Every run starts from an empty in-memory price cache, so each sub-category is
+searched for. Per mode, it reports Tavily calls made (retries and hedges
+included), wall-clock latency of the search phase, and hit rate: the share of
+the 13 sub-categories that came back with an answer. Needs TAVILY_API_KEY,
+and every call spends quota.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import search
+from cache import TTLCache
+from metrics import percentile
+
+MODES = ("subcategory", "category")
+
+
+async def _run_once(destination: str, month: str, mode: str) -> dict:
+    search.get_price_cache.cache = TTLCache(":memory:", ttl_seconds=3600, max_entries=1000)
+    attempts_before = search.search_retry_stats().get("attempts", 0)
+    started = time.monotonic()
+    context = await search.gather_price_context_async(destination, month, mode=mode)
+    elapsed = time.monotonic() - started
+    total = sum(len(subcategories) for subcategories in search.SUBCATEGORY_QUERIES.values())
+    return {
+        "calls": search.search_retry_stats().get("attempts", 0) - attempts_before,
+        "seconds": elapsed,
+        "hit_rate": sum(len(answers) for answers in context.values()) / total,
+    }
+
+
+def _summarize(runs: list[dict]) -> dict:
+    seconds = [run["seconds"] for run in runs]
+    return {
+        "runs": len(runs),
+        "calls_per_run": statistics.mean(run["calls"] for run in runs),
+        "latency_p50_seconds": round(percentile(seconds, 50), 2),
+        "latency_p95_seconds": round(percentile(seconds, 95), 2),
+        "latency_max_seconds": round(max(seconds), 2),
+        "hit_rate": round(statistics.mean(run["hit_rate"] for run in runs), 3),
+    }
+
+
+async def _bench(destinations: list[str], month: str, rounds: int) -> dict:
+    results: dict[str, list[dict]] = {mode: [] for mode in MODES}
+    for round_number in range(rounds):
+        for destination in destinations:
+            # Alternate which mode goes first so neither always meets a
+            # warmer Tavily.
+            order = MODES if round_number % 2 == 0 else tuple(reversed(MODES))
+            for mode in order:
+                results[mode].append(await _run_once(destination, month, mode))
+    return {mode: _summarize(runs) for mode, runs in results.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--destinations", default="Tokyo,Lisbon,Goa,Cusco,Reykjavik")
+    parser.add_argument("--month", default="October")
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=60,
+        help="search phase deadline in seconds; high by default so latency isn't clipped",
+    )
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    if not search.TAVILY_API_KEY:
+        parser.error("TAVILY_API_KEY is not set.")
+    search.PRICE_SEARCH_DEADLINE_SECONDS = args.deadline
+    destinations = [d.strip() for d in args.destinations.split(",") if d.strip()]
+    summary = asyncio.run(_bench(destinations, args.month, args.rounds))
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{'mode':<12} {'runs':>5} {'calls':>6} {'p50 s':>7} {'p95 s':>7} {'max s':>7} {'hit rate':>9}")
+    for mode, row in summary.items():
+        print(
+            f"{mode:<12} {row['runs']:>5} {row['calls_per_run']:>6.1f} {row['latency_p50_seconds']:>7.2f} "
+            f"{row['latency_p95_seconds']:>7.2f} {row['latency_max_seconds']:>7.2f} {row['hit_rate']:>9.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
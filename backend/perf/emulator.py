@@ -0,0 +1,419 @@
+"""A local stand-in for OpenRouter and Tavily, for perf experiments that
+shouldn't depend on the network, spend quota, or inherit a provider's noise:
+
+    cd backend
+    python -m perf.emulator --port 9100 --preset realistic --seed 1
+    OPENROUTER_URL=http://127.0.0.1:9100/api/v1/chat/completions \\
+    TAVILY_URL=http://127.0.0.1:9100/search uvicorn main:app
+
+It serves the two endpoints the backend calls: OpenRouter's chat completions
+(blocking, and SSE streaming when the request asks for `"stream": true`) and
+Tavily's search. Responses are either replayed from `--recordings` (a JSONL
+file of `{"service": "openrouter" | "tavily", "match": "<substring of the
+prompt or query>", "response": "<text>"}` lines, first match wins) or
+synthesized from the prompt: a chat turn reply, an itinerary outline, a day,
+the closing sections, a full itinerary, or a cost table, shaped like what the
+real models return, and identical for identical prompts.
+
+Each service's timing and failures follow a profile: a latency distribution
+(fixed, uniform or lognormal) to the first token, a streaming rate in tokens
+per second, and the share of calls that fail with a 500, get rate-limited
+with a 429 + Retry-After, or stall mid-response. `--preset` picks a set of
+profiles (fast, realistic, degraded); `--openrouter` and `--tavily` override
+fields of one as JSON, e.g. `--openrouter '{"error_rate": 0.2}'`. With
+`--seed` the draws repeat from run to run. GET /_emulator/stats counts what
+was served.
+
+Neither API key is checked; the backend only needs them set to something.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+from collections import Counter
+from dataclasses import asdict, dataclass, replace
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from search import SUBCATEGORY_QUERIES
+
+# Roughly how many characters a token is, for turning tokens per second
+# into a streaming rate.
+CHARS_PER_TOKEN = 4
+# How often a streamed response sends a chunk.
+CHUNK_SECONDS = 0.02
+
+
+@dataclass(frozen=True)
+class Profile:
+    """Timing and failure behaviour of one emulated service."""
+
+    # "fixed", "uniform" (latency_seconds ± latency_spread) or "lognormal"
+    # (median latency_seconds, sigma latency_spread).
+    latency: str = "fixed"
+    latency_seconds: float = 0.0
+    latency_spread: float = 0.0
+    # Generation speed once the first token is out; 0 sends the whole text
+    # at once. Applies to OpenRouter only.
+    tokens_per_second: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: float = 1.0
+    stall_rate: float = 0.0
+    stall_seconds: float = 0.0
+
+
+PRESETS = {
+    "fast": {
+        "openrouter": Profile(latency_seconds=0.05, tokens_per_second=2000),
+        "tavily": Profile(latency_seconds=0.02),
+    },
+    "realistic": {
+        "openrouter": Profile(
+            latency="lognormal",
+            latency_seconds=0.8,
+            latency_spread=0.5,
+            tokens_per_second=80,
+            error_rate=0.01,
+            rate_limit_rate=0.02,
+            stall_rate=0.02,
+            stall_seconds=2.0,
+        ),
+        "tavily": Profile(
+            latency="lognormal",
+            latency_seconds=1.5,
+            latency_spread=0.6,
+            error_rate=0.01,
+            rate_limit_rate=0.01,
+        ),
+    },
+    "degraded": {
+        "openrouter": Profile(
+            latency="lognormal",
+            latency_seconds=3.0,
+            latency_spread=0.8,
+            tokens_per_second=20,
+            error_rate=0.1,
+            rate_limit_rate=0.15,
+            retry_after_seconds=2.0,
+            stall_rate=0.1,
+            stall_seconds=5.0,
+        ),
+        "tavily": Profile(
+            latency="lognormal",
+            latency_seconds=6.0,
+            latency_spread=0.8,
+            error_rate=0.1,
+            rate_limit_rate=0.1,
+            retry_after_seconds=2.0,
+        ),
+    },
+}
+
+# Typical INR ranges per unit, scaled per destination so different places
+# don't all cost the same.
+BASE_PRICES = {
+    "hotel": (3000, 6000),
+    "hostel": (800, 1500),
+    "vacation rental": (2500, 5000),
+    "boutique hotel": (5000, 9000),
+    "eco-lodge": (3500, 7000),
+    "street food": (150, 400),
+    "casual dining": (600, 1200),
+    "fine dining": (2500, 5000),
+    "local cuisine": (400, 900),
+    "international cuisine": (900, 1800),
+    "taxi": (20, 40),
+    "public transit": (30, 80),
+    "car rental": (2500, 4500),
+}
+
+_UNITS = {"accommodation": "per night", "dining": "per meal"}
+_TRANSPORT_UNITS = {"taxi": "per km", "public transit": "per trip", "car rental": "per day"}
+
+
+def _stable_fraction(text: str) -> float:
+    """A number in [0, 1) that depends only on `text`."""
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16) / 2**32
+
+
+def _price(destination: str, subcategory: str) -> tuple[int, int]:
+    scale = 0.6 + _stable_fraction(destination.lower())
+    low, high = BASE_PRICES[subcategory]
+    return round(low * scale), round(high * scale)
+
+
+def _destination(prompt: str) -> str:
+    match = re.search(r"(?:trip to|itinerary for|a trip to) (.+?)(?: in | with |\.|$)", prompt, re.M)
+    return match.group(1).strip() if match else "the city"
+
+
+def _num_days(prompt: str, default: int = 3) -> int:
+    match = re.search(r"(\d+)-day", prompt)
+    return int(match.group(1)) if match else default
+
+
+def _day_block(day: int, destination: str) -> str:
+    return (
+        f"### Day {day}: Around {destination}\n"
+        "#### Morning\n"
+        f"- Walk the old quarter of {destination} and stop at a market, about ₹500.\n"
+        "#### Afternoon\n"
+        "- Visit a museum, about ₹800.\n"
+        "#### Evening\n"
+        "- Dinner at a local restaurant, about ₹1,200.\n\n"
+        f"**Total for Day {day}: about ₹2,500**\n\n"
+    )
+
+
+def _closing(destination: str) -> str:
+    return (
+        "**Summary Section:**\n\n"
+        "| Category | Estimated cost (INR) |\n|---|---|\n"
+        "| Accommodation | 20,000 |\n| Activities | 8,000 |\n| Dining | 10,000 |\n| Transportation | 4,000 |\n\n"
+        "**Personalized Tips:**\n- Take a cooking class.\n- Join a walking tour.\n\n"
+        f"**Weather Information:**\n- {destination} is mild this time of year, around 22°C. Pack layers.\n"
+    )
+
+
+def _cost_table(destination: str) -> dict:
+    table: dict = {}
+    for category, subcategories in SUBCATEGORY_QUERIES.items():
+        table[category] = {}
+        for subcategory in subcategories:
+            low, high = _price(destination, subcategory)
+            unit = _UNITS.get(category) or _TRANSPORT_UNITS[subcategory]
+            table[category][subcategory] = {"cost": {"min": low, "max": high}, "unit": unit}
+    return table
+
+
+def synthesize_completion(prompt: str) -> str:
+    """A plausible answer to one of the backend's prompts (see prompts.py)."""
+    if '"extracted"' in prompt:
+        extracted = {}
+        field = re.search(r"Ask about: (\w+)", prompt)
+        said = re.findall(r"^\s*user: (.*)$", prompt, re.M)
+        if field and field.group(1) == "destination" and said:
+            extracted["destination"] = said[-1].strip()
+        return json.dumps({"extracted": extracted, "reply": "Lovely — tell me a little more."})
+    destination = _destination(prompt)
+    if '"days": [' in prompt:
+        days = [
+            {"day": day, "theme": f"Day {day} in {destination}", "area": f"District {day}", "highlights": ["a market"]}
+            for day in range(1, _num_days(prompt) + 1)
+        ]
+        return json.dumps({"days": days})
+    if '"accommodation": {' in prompt:
+        return json.dumps(_cost_table(destination))
+    day = re.search(r"You are writing Day (\d+) of", prompt)
+    if day:
+        return _day_block(int(day.group(1)), destination)
+    if "You are writing the closing sections" in prompt:
+        return _closing(destination)
+    days = "".join(_day_block(day, destination) for day in range(1, _num_days(prompt) + 1))
+    return days + _closing(destination)
+
+
+def synthesize_answer(query: str) -> str:
+    """A Tavily-style answer quoting a price for every sub-category the
+    query names, which `split_category_answer` can take apart again."""
+    match = re.search(r" in (.+?)(?: in [A-Z][a-z]+)?$", query)
+    destination = match.group(1) if match else "the city"
+    lowered = query.lower()
+    sentences = [
+        f"In {destination}, {subcategory} prices run about ₹{low}-₹{high}."
+        for subcategories in SUBCATEGORY_QUERIES.values()
+        for subcategory in subcategories
+        if subcategory in lowered
+        for low, high in [_price(destination, subcategory)]
+    ]
+    return " ".join(sentences) or f"Prices in {destination} vary widely."
+
+
+def load_recordings(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as recordings:
+        return [json.loads(line) for line in recordings if line.strip()]
+
+
+class Emulator:
+    def __init__(
+        self,
+        openrouter: Profile,
+        tavily: Profile,
+        recordings: Optional[list[dict]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.profiles = {"openrouter": openrouter, "tavily": tavily}
+        self.recordings = recordings or []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts: Counter = Counter()
+
+    def _count(self, event: str) -> None:
+        with self._lock:
+            self.counts[event] += 1
+
+    def _draw(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def latency(self, service: str) -> float:
+        profile = self.profiles[service]
+        with self._lock:
+            if profile.latency == "uniform":
+                seconds = self._random.uniform(
+                    profile.latency_seconds - profile.latency_spread,
+                    profile.latency_seconds + profile.latency_spread,
+                )
+            elif profile.latency == "lognormal":
+                seconds = profile.latency_seconds * self._random.lognormvariate(0, profile.latency_spread)
+            else:
+                seconds = profile.latency_seconds
+        return max(0.0, seconds)
+
+    def failure(self, service: str) -> Optional[JSONResponse]:
+        """The error response this call gets, if the dice say it fails."""
+        profile = self.profiles[service]
+        roll = self._draw()
+        if roll < profile.rate_limit_rate:
+            self._count(f"{service}.rate_limited")
+            return JSONResponse(
+                {"error": {"message": "Rate limit exceeded (emulated)", "code": 429}},
+                status_code=429,
+                headers={"Retry-After": f"{profile.retry_after_seconds:g}"},
+            )
+        if roll < profile.rate_limit_rate + profile.error_rate:
+            self._count(f"{service}.errors")
+            return JSONResponse({"error": {"message": "Upstream error (emulated)", "code": 500}}, status_code=500)
+        return None
+
+    def stall(self, service: str) -> float:
+        profile = self.profiles[service]
+        if profile.stall_rate and self._draw() < profile.stall_rate:
+            self._count(f"{service}.stalls")
+            return profile.stall_seconds
+        return 0.0
+
+    def recorded(self, service: str, text: str) -> Optional[str]:
+        for recording in self.recordings:
+            if recording.get("service") == service and recording.get("match", "") in text:
+                self._count(f"{service}.replayed")
+                return recording["response"]
+        return None
+
+    def chunks(self, text: str) -> list[str]:
+        tokens_per_second = self.profiles["openrouter"].tokens_per_second
+        if tokens_per_second <= 0:
+            return [text] if text else []
+        size = max(1, round(tokens_per_second * CHARS_PER_TOKEN * CHUNK_SECONDS))
+        return [text[start:start + size] for start in range(0, len(text), size)]
+
+    def generation_seconds(self, text: str) -> float:
+        tokens_per_second = self.profiles["openrouter"].tokens_per_second
+        if tokens_per_second <= 0:
+            return 0.0
+        return len(text) / (tokens_per_second * CHARS_PER_TOKEN)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        return {
+            "profiles": {service: asdict(profile) for service, profile in self.profiles.items()},
+            "recordings": len(self.recordings),
+            "counts": counts,
+        }
+
+
+def create_app(emulator: Emulator) -> FastAPI:
+    app = FastAPI(title="OpenRouter/Tavily emulator")
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        emulator._count("openrouter.requests")
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        await asyncio.sleep(emulator.latency("openrouter"))
+        failed = emulator.failure("openrouter")
+        if failed is not None:
+            return failed
+        text = emulator.recorded("openrouter", prompt)
+        if text is None:
+            text = synthesize_completion(prompt)
+        stall = emulator.stall("openrouter")
+        model = body.get("model", "emulated")
+
+        if not body.get("stream"):
+            await asyncio.sleep(emulator.generation_seconds(text) + stall)
+            return {"model": model, "choices": [{"message": {"role": "assistant", "content": text}}]}
+
+        chunks = emulator.chunks(text)
+        stall_at = len(chunks) // 2
+
+        async def events():
+            for index, chunk in enumerate(chunks):
+                if index:
+                    await asyncio.sleep(CHUNK_SECONDS)
+                if stall and index == stall_at:
+                    await asyncio.sleep(stall)
+                delta = {"model": model, "choices": [{"delta": {"content": chunk}}]}
+                yield f"data: {json.dumps(delta)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/search")
+    async def search(request: Request):
+        body = await request.json()
+        emulator._count("tavily.requests")
+        query = str(body.get("query", ""))
+        await asyncio.sleep(emulator.latency("tavily") + emulator.stall("tavily"))
+        failed = emulator.failure("tavily")
+        if failed is not None:
+            return failed
+        answer = emulator.recorded("tavily", query)
+        if answer is None:
+            answer = synthesize_answer(query)
+        return {"query": query, "answer": answer, "results": []}
+
+    @app.get("/_emulator/stats")
+    async def stats():
+        return emulator.stats()
+
+    return app
+
+
+def _profile(base: Profile, overrides: Optional[str]) -> Profile:
+    return replace(base, **json.loads(overrides)) if overrides else base
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="realistic")
+    parser.add_argument("--openrouter", help="JSON overrides of the OpenRouter profile")
+    parser.add_argument("--tavily", help="JSON overrides of the Tavily profile")
+    parser.add_argument("--recordings", help="JSONL file of responses to replay")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    preset = PRESETS[args.preset]
+    emulator = Emulator(
+        _profile(preset["openrouter"], args.openrouter),
+        _profile(preset["tavily"], args.tavily),
+        recordings=load_recordings(args.recordings) if args.recordings else None,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(emulator), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""End-to-end load test of a running backend, driving the same flow the chat
+UI does:
+
+    cd backend
+    python -m perf.loadtest --base-url http://127.0.0.1:8000 --sessions 50 --concurrency 10 --rate 2
+
+Each simulated session starts a chat with a seed destination, answers the
+required questions (free text, which the chat fast path mostly handles, plus
+the interest picker), polls the cost estimate to completion, submits the
+wrap-up, polls the itinerary to completion and downloads its PDF. Sessions
+arrive as a Poisson process at `--rate` per second (all at once with 0), at
+most `--concurrency` at a time.
+
+Reports p50/p95/p99 latency and error counts per endpoint, session
+throughput, and the server's peak RSS and thread count (sampled from
+/api/stats). `--out` saves the report; `--compare` checks it against a saved
+one (perf/baseline.json is the one kept in the repo) and exits non-zero if
+any endpoint's p95 or error rate regressed past `--tolerance` (p95 also by
+at least `--min-delta-ms`).
+
+Against the live upstreams every session spends LLM and Tavily quota; point
+the server at perf/emulator.py (OPENROUTER_URL, TAVILY_URL) for repeatable
+numbers — the kept baseline was recorded that way, with the fast preset
+and --no-pdf, so it doesn't cover the PDF download.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Optional
+
+import httpx
+
+from metrics import percentile
+
+DESTINATIONS = ("Tokyo", "Lisbon", "Goa", "Cusco", "Reykjavik", "Hanoi", "Marrakech", "Bali")
+
+# The answers a traveler gives after the seed destination, in the order the
+# chat asks for them.
+TURNS = (
+    {"text": "7 days"},
+    {"text": "October"},
+    {"text": "80k"},
+    {"structured_field": "interests", "structured_value": [{"interest": "Food", "rating": 5}]},
+    {"text": "solo"},
+    {"text": "relaxed"},
+)
+
+
+class Recorder:
+    """Latencies and failures per endpoint (path templates, not URLs)."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, Counter] = defaultdict(Counter)
+
+    async def call(self, client: httpx.AsyncClient, method: str, endpoint: str, url: str, **kwargs):
+        started = time.monotonic()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as exc:
+            self.latencies[endpoint].append(time.monotonic() - started)
+            self.errors[endpoint][type(exc).__name__] += 1
+            return None
+        self.latencies[endpoint].append(time.monotonic() - started)
+        if response.status_code >= 400:
+            self.errors[endpoint][str(response.status_code)] += 1
+            return None
+        return response
+
+    def summary(self) -> dict:
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            errors = sum(self.errors[endpoint].values())
+            endpoints[endpoint] = {
+                "requests": len(latencies),
+                "errors": errors,
+                "error_rate": round(errors / len(latencies), 4),
+                "errors_by_kind": dict(self.errors[endpoint]),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            }
+        return endpoints
+
+
+async def _poll_job(
+    client: httpx.AsyncClient, recorder: Recorder, kind: str, job_id: str, interval: float, timeout: float
+) -> Optional[dict]:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = await recorder.call(
+            client, "GET", f"GET /api/{kind}/status/{{id}}", f"/api/{kind}/status/{job_id}"
+        )
+        if response is None:
+            return None
+        job = response.json()
+        if job["status"] in ("done", "error"):
+            return job if job["status"] == "done" else None
+        await asyncio.sleep(interval)
+    return None
+
+
+async def _session(client: httpx.AsyncClient, recorder: Recorder, args: argparse.Namespace) -> bool:
+    message = "POST /api/chat/{id}/message"
+    response = await recorder.call(
+        client,
+        "POST",
+        "POST /api/chat/start",
+        "/api/chat/start",
+        json={"seed_text": random.choice(DESTINATIONS)},
+    )
+    if response is None:
+        return False
+    turn = response.json()
+    session_id = turn["session_id"]
+    for body in TURNS:
+        response = await recorder.call(client, "POST", message, f"/api/chat/{session_id}/message", json=body)
+        if response is None:
+            return False
+        turn = response.json()
+    if turn["phase"] != "optional_wrapup" or not turn["pricing_job_id"]:
+        recorder.errors[message]["unexpected_flow"] += 1
+        return False
+
+    pricing = await _poll_job(
+        client, recorder, "cost-estimate", turn["pricing_job_id"], args.poll_interval, args.job_timeout
+    )
+    if pricing is None:
+        return False
+
+    response = await recorder.call(
+        client,
+        "POST",
+        message,
+        f"/api/chat/{session_id}/message",
+        json={"structured_field": "wrapup_submit", "structured_value": {}},
+    )
+    if response is None or not response.json()["itinerary_job_id"]:
+        return False
+    itinerary_job_id = response.json()["itinerary_job_id"]
+    itinerary = await _poll_job(
+        client, recorder, "itinerary", itinerary_job_id, args.poll_interval, args.job_timeout
+    )
+    if itinerary is None:
+        return False
+
+    if args.pdf:
+        pdf = await recorder.call(
+            client, "GET", "GET /api/itinerary/pdf/{id}", f"/api/itinerary/pdf/{itinerary_job_id}"
+        )
+        if pdf is None:
+            return False
+    return True
+
+
+async def _sample_server(client: httpx.AsyncClient, samples: list[dict], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            response = await client.get("/api/stats")
+            samples.append(response.json().get("process", {}))
+        except (httpx.HTTPError, ValueError):
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run(args: argparse.Namespace) -> dict:
+    recorder = Recorder()
+    # One connection per concurrent session, plus one for the stats sampler.
+    connections = args.concurrency + 1
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    client = httpx.AsyncClient(base_url=args.base_url, timeout=args.request_timeout, limits=limits)
+    async with client:
+        slots = asyncio.Semaphore(args.concurrency)
+        durations: list[float] = []
+        outcomes: list[bool] = []
+
+        async def one_session() -> None:
+            async with slots:
+                started = time.monotonic()
+                ok = await _session(client, recorder, args)
+                outcomes.append(ok)
+                if ok:
+                    durations.append(time.monotonic() - started)
+
+        samples: list[dict] = []
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(_sample_server(client, samples, stop))
+        started = time.monotonic()
+        sessions = []
+        for _ in range(args.sessions):
+            sessions.append(asyncio.create_task(one_session()))
+            if args.rate > 0:
+                await asyncio.sleep(random.expovariate(args.rate))
+        await asyncio.gather(*sessions)
+        elapsed = time.monotonic() - started
+        stop.set()
+        await sampler
+
+    rss = [sample["rss_bytes"] for sample in samples if "rss_bytes" in sample]
+    threads = [sample["threads"] for sample in samples if "threads" in sample]
+    return {
+        "config": {
+            "sessions": args.sessions,
+            "concurrency": args.concurrency,
+            "rate_per_second": args.rate,
+            "pdf": args.pdf,
+            "label": args.label,
+            "python": platform.python_version(),
+        },
+        "sessions": {
+            "completed": sum(outcomes),
+            "failed": len(outcomes) - sum(outcomes),
+            "per_second": round(sum(outcomes) / elapsed, 2),
+            "p50_seconds": round(statistics.median(durations), 2) if durations else None,
+            "p95_seconds": round(percentile(durations, 95), 2) if durations else None,
+        },
+        "endpoints": recorder.summary(),
+        "server": {
+            "rss_max_mb": round(max(rss) / 2**20, 1) if rss else None,
+            "threads_max": max(threads) if threads else None,
+        },
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    """Regressions of `report` against `baseline`: any endpoint whose p95
+    grew by more than `tolerance` (as a fraction) and by at least
+    `min_delta_ms` — a few milliseconds either way is noise — or whose error
+    rate rose by more than `tolerance` percentage points."""
+    regressions = []
+    for endpoint, before in baseline["endpoints"].items():
+        after = report["endpoints"].get(endpoint)
+        if after is None:
+            continue
+        grew = after["p95_ms"] - before["p95_ms"]
+        if after["p95_ms"] > before["p95_ms"] * (1 + tolerance) and grew >= min_delta_ms:
+            regressions.append(f"{endpoint}: p95 {before['p95_ms']}ms -> {after['p95_ms']}ms")
+        if after["error_rate"] > before["error_rate"] + tolerance:
+            regressions.append(
+                f"{endpoint}: error rate {before['error_rate']:.1%} -> {after['error_rate']:.1%}"
+            )
+    return regressions
+
+
+def _print_report(report: dict) -> None:
+    sessions = report["sessions"]
+    print(
+        f"sessions: {sessions['completed']} completed, {sessions['failed']} failed, "
+        f"{sessions['per_second']}/s, p50 {sessions['p50_seconds']}s, p95 {sessions['p95_seconds']}s"
+    )
+    print(f"{'endpoint':<36} {'reqs':>6} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, row in report["endpoints"].items():
+        print(
+            f"{endpoint:<36} {row['requests']:>6} {row['errors']:>7} "
+            f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}"
+        )
+    server = report["server"]
+    print(f"server: peak RSS {server['rss_max_mb']} MB, peak threads {server['threads_max']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument(
+        "--rate", type=float, default=2.0, help="session arrivals per second; 0 for all at once"
+    )
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--job-timeout", type=float, default=180)
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--no-pdf", dest="pdf", action="store_false", help="skip the PDF download")
+    parser.add_argument("--seed", type=int, default=None, help="seed destinations and arrival times")
+    parser.add_argument("--label", default="", help="what this run measured, e.g. the upstream setup")
+    parser.add_argument("--out", help="write the report as JSON to this file")
+    parser.add_argument("--compare", help="a saved report to check for regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = asyncio.run(run(args))
+    _print_report(report)
+    if args.out:
+        with open(args.out, "w") as out:
+            json.dump(report, out, indent=2)
+            out.write("\n")
+    if args.compare:
+        with open(args.compare) as saved:
+            regressions = compare(report, json.load(saved), args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Per-unit cost tables and the trip-specific numbers derived from them.
+
+What `get_prompt_cost` asks the model for — hotel per night, street food per
+meal, taxi per km — depends on where and when, not on the traveler's budget
+or trip length. So the table is cached by (destination, month) and reused
+across trips; anything trip-specific is computed from it here, in
+milliseconds, instead of paying for another streamed generation.
+"""
+
+import os
+from typing import Optional
+
+from cache import LazyTTLCache
+from search import normalize_text
+
+COST_CATEGORIES = ("accommodation", "dining", "transportation")
+
+UNIT_COST_CACHE_PATH = os.environ.get(
+    "UNIT_COST_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "unit_cost_cache.sqlite3"),
+)
+UNIT_COST_CACHE_TTL_SECONDS = float(os.environ.get("UNIT_COST_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+UNIT_COST_CACHE_MAX_ENTRIES = int(os.environ.get("UNIT_COST_CACHE_MAX_ENTRIES", 10_000))
+
+MEALS_PER_DAY = 3
+
+get_unit_cost_cache = LazyTTLCache(
+    UNIT_COST_CACHE_PATH, UNIT_COST_CACHE_TTL_SECONDS, UNIT_COST_CACHE_MAX_ENTRIES
+)
+
+
+def unit_cost_cache_key(destination: str, travel_month: str) -> str:
+    return f"{normalize_text(destination)}|{normalize_text(travel_month)}"
+
+
+def is_unit_cost_table(table: object) -> bool:
+    """True for a model response worth caching: every category present, and
+    each line item a {"cost": {"min", "max"}, "unit"} entry."""
+    if not isinstance(table, dict):
+        return False
+    for category in COST_CATEGORIES:
+        items = table.get(category)
+        if not isinstance(items, dict) or not items:
+            return False
+        for item in items.values():
+            if not isinstance(item, dict) or not isinstance(item.get("cost"), dict):
+                return False
+            if "min" not in item["cost"] or "max" not in item["cost"]:
+                return False
+    return True
+
+
+def _unit_multiplier(unit: str, num_days: int) -> Optional[tuple[int, str]]:
+    """How many units a trip of `num_days` uses, for units that say so
+    unambiguously. Per-km and per-trip prices depend on the itinerary, so
+    they get no trip total."""
+    unit = unit.lower()
+    if "night" in unit:
+        nights = max(1, num_days - 1)
+        return nights, f"{nights} night{'s' if nights != 1 else ''}"
+    if "meal" in unit:
+        meals = num_days * MEALS_PER_DAY
+        return meals, f"{meals} meals"
+    if "day" in unit:
+        return num_days, f"{num_days} day{'s' if num_days != 1 else ''}"
+    return None
+
+
+def derive_trip_totals(table: dict, num_days: int) -> dict:
+    """Scales each per-unit range up to the whole trip where its unit allows,
+    e.g. a per-night hotel range × nights."""
+    totals: dict[str, dict] = {}
+    for category in COST_CATEGORIES:
+        for subcategory, item in (table.get(category) or {}).items():
+            multiplier = _unit_multiplier(str(item.get("unit", "")), num_days)
+            if multiplier is None:
+                continue
+            count, basis = multiplier
+            try:
+                low, high = float(item["cost"]["min"]), float(item["cost"]["max"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            totals.setdefault(category, {})[subcategory] = {
+                "min": round(low * count),
+                "max": round(high * count),
+                "basis": basis,
+            }
+    return totals
+
+
+def build_cost_result(table: dict, num_days: int) -> dict:
+    """The job result: the shared per-unit table plus this trip's totals."""
+    return {**table, "trip_totals": derive_trip_totals(table, num_days)}
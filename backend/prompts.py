@@ -109,7 +109,103 @@ def get_prompt_preference(
     """
 
 
-def get_prompt_cost(destination, num_days, travel_month, total_budget, price_context=None):
+def _traveler_section(trip):
+    """Who's travelling and how they like to travel — shared by the per-day
+    itinerary prompts below. `trip` holds `get_prompt_preference`'s
+    arguments."""
+    companions = trip["companions"]
+    child_ages = trip["child_ages"]
+    return f"""
+            The traveler is a {companions.lower()} who prioritizes interests as follows: {trip["interests_str"]}.
+            {'For family travelers, include activities suitable for children aged ' + child_ages + '.' if companions == 'Family' and child_ages else ''}
+            They prefer {trip["accommodation"].lower()} for accommodations, {trip["transportation"].lower()} for transportation, and {trip["dining"].lower()} for dining.
+            The overall pace should be {trip["pace"].lower()}, meaning {PACE_DEFINITIONS.get(trip["pace"], 'a balanced pace')}.
+
+            **Traveler Details:**
+            - Special requests: {trip["special_requests"] or 'None'}
+            - Dietary restrictions: {trip["dietary_restrictions"] or 'None'}
+            - Accessibility needs: {trip["accessibility_needs"] or 'None'}
+            - Nationality: {trip["nationality"] or 'None'}
+            - Travel month: {trip["travel_month"]} (prioritize activities suitable for this season)
+
+            **Guidance:**
+            - For companions: {COMPANION_GUIDANCE.get(companions, '')}
+            - For transportation: {TRANSPORTATION_GUIDANCE.get(trip["transportation"], '')}
+            - For dining: {DINING_GUIDANCE.get(trip["dining"], '')}
+            - Strictly adhere to dietary restrictions, accessibility needs, and special requests.
+    """
+
+
+def get_prompt_itinerary_skeleton(trip):
+    """Step one of a per-day itinerary: a quick plan of what each day is
+    about, so the days can then be written in parallel without overlapping."""
+    return f"""
+            Plan the outline of a {trip["num_days"]}-day trip to {trip["destination"]} in {trip["travel_month"]} with a total budget of ₹{trip["total_budget"]}.
+            {_traveler_section(trip)}
+            Give each day a distinct theme and a main area or neighbourhood, so no two days repeat the same sights, and order the days so travel between areas is sensible.
+
+            Respond with a JSON object having exactly this shape, with one entry per day:
+            {{
+                "days": [
+                    {{"day": 1, "theme": "<short theme>", "area": "<main area or neighbourhood>", "highlights": ["<2-4 key sights or experiences>"]}}
+                ]
+            }}
+            """
+
+
+def get_prompt_itinerary_day(trip, day, skeleton_days):
+    """Step two: one day's block of the itinerary, written to the outline."""
+    plan = skeleton_days[day - 1]
+    outline = "\n".join(
+        f"            - Day {entry['day']}: {entry.get('theme', '')} ({entry.get('area', '')})"
+        for entry in skeleton_days
+    )
+    daily_budget = round(float(trip["total_budget"]) / max(1, int(trip["num_days"])))
+    return f"""
+            You are writing Day {day} of a {trip["num_days"]}-day itinerary for {trip["destination"]}. Other writers are handling the other days, so cover only Day {day}.
+            {_traveler_section(trip)}
+            **The whole trip's outline (for context — do not describe other days):**
+{outline}
+
+            **Day {day}:** {plan.get('theme', '')}, mostly around {plan.get('area', '')}. Highlights: {', '.join(plan.get('highlights', []))}.
+            The whole trip's budget is ₹{trip["total_budget"]} including accommodation — about ₹{daily_budget} a day — so keep this day's activities, dining and local transport comfortably within that.
+
+            **Format:**
+            - Start with the heading "### Day {day}: <theme>" and use #### for time slots (#### Morning, #### Afternoon, #### Evening).
+            - Use bullet points to list activities under each time slot.
+            - For each activity or dining option, include a brief description (1-2 sentences) and an estimated cost in INR (covering entrance fees and meals, excluding transportation costs).
+            - When referencing specific places, destinations, museums, restaurants, or activities, output the place name as a clickable Markdown hyperlink. Use this format:
+                [Place Name](https://www.google.com/maps/search/?api=1&query=Activity+Name+at+Location+Name).
+            - Briefly explain any local terms, cuisines, or customs that may be unfamiliar to Indian travelers, naturally within the descriptions.
+            - End with the day's total estimated cost in INR.
+            - Write only this day's section — no introduction, trip summary, or closing remarks.
+            """
+
+
+def get_prompt_itinerary_closing(trip, skeleton_days):
+    """Step two, alongside the days: the sections that close the itinerary."""
+    outline = "\n".join(
+        f"            - Day {entry['day']}: {entry.get('theme', '')} ({entry.get('area', '')})"
+        for entry in skeleton_days
+    )
+    return f"""
+            You are writing the closing sections of a {trip["num_days"]}-day itinerary for {trip["destination"]} in {trip["travel_month"]} with a total budget of ₹{trip["total_budget"]}. The day-by-day plan is written separately; its outline is:
+{outline}
+            {_traveler_section(trip)}
+            Write only these sections, in markdown:
+
+            **Summary Section:**
+            - A summary table in markdown breaking down the total estimated cost by category (accommodation for the whole stay, activities, dining, transportation), in INR, confirming it stays within ₹{trip["total_budget"]}.
+
+            **Personalized Tips:**
+            - Since they're interested in {trip["interests_str"]}, 2-3 local experiences to try.
+
+            **Weather Information:**
+            - For {trip["travel_month"]} in {trip["destination"]}, the average temperatures in °C and weather conditions to expect, and what to pack.
+            """
+
+
+def get_prompt_cost(destination, travel_month, price_context=None):
     price_context = price_context or {}
     grounding_lines = [
         f"- {category.capitalize()} > {subcategory}: {answer}"
@@ -128,7 +224,7 @@ def get_prompt_cost(destination, num_days, travel_month, total_budget, price_con
     )
 
     return f"""
-            Based on a trip to {destination} for {num_days} days in {travel_month}, with a total budget of ₹{total_budget} INR, provide a detailed breakdown of estimated costs for accommodation, dining, and transportation.
+            Based on a trip to {destination} in {travel_month}, provide a detailed breakdown of estimated per-unit costs for accommodation, dining, and transportation.
             {grounding_block}
             Requirements:
             - Provide cost estimates in INR (Indian Rupees) using average cost ranges rather than absolute values. Convert non-INR figures to INR.
@@ -164,7 +260,7 @@ def get_prompt_cost(destination, num_days, travel_month, total_budget, price_con
             """
 
 
-def get_prompt_chat_turn(history_text, state, next_field, field_options, next_field_hint):
+def get_prompt_chat_turn(history_text, state, next_field, field_options, next_field_hint, history_summary=""):
     options_line = (
         f" Offer these exact options in your question (the UI will also show them as buttons): "
         f"{', '.join(field_options)}."
@@ -176,14 +272,23 @@ def get_prompt_chat_turn(history_text, state, next_field, field_options, next_fi
         if next_field
         else "All required details are known — write a short closing line, no question needed."
     )
+    summary_block = (
+        f"""
+            Earlier in the conversation, the traveler said:
+{history_summary}
+"""
+        if history_summary
+        else ""
+    )
     return f"""
             You are a warm, concise travel-planning assistant chatting with a
             traveler to gather trip details. Continue the conversation naturally.
-
+{summary_block}
             Conversation so far:
             {history_text}
 
-            What you already know about their trip: {state}
+            What you already know about their trip:
+{state or "            (nothing yet)"}
 
             {next_field_line}
 
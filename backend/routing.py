@@ -0,0 +1,153 @@
+"""Which OpenRouter model each call site uses, and when to stop using it.
+
+Each call site ("chat", "cost", "itinerary") has an ordered list of models,
+e.g. a small fast model for chat turns and a larger one for itineraries
+(OPENROUTER_MODELS_<SITE>, comma-separated; OPENROUTER_MODEL when unset).
+A call goes to the first model whose circuit is closed and falls through to
+the next one if it's rate-limited, erroring or unreachable — so one
+provider's bad hour slows down only the requests that find out, not every
+chat turn and job behind it.
+
+Per model, a rolling window of recent calls tracks latency (to the first
+token when streaming, to the whole response otherwise) and errors. A model
+with too many consecutive failures, too high an error rate, or a p95
+latency over ROUTER_SLOW_SECONDS is skipped for ROUTER_COOLDOWN_SECONDS;
+after that one call is let through as a trial, which closes the circuit
+again if it succeeds.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Iterator, Optional
+
+from metrics import percentile
+
+ROUTING_SITES = ("chat", "cost", "itinerary")
+
+ROUTER_WINDOW = int(os.environ.get("ROUTER_WINDOW", 20))
+# Rates and percentiles need this many calls in the window to mean anything.
+ROUTER_MIN_SAMPLES = int(os.environ.get("ROUTER_MIN_SAMPLES", 5))
+ROUTER_MAX_ERROR_RATE = float(os.environ.get("ROUTER_MAX_ERROR_RATE", 0.5))
+ROUTER_MAX_CONSECUTIVE_FAILURES = int(os.environ.get("ROUTER_MAX_CONSECUTIVE_FAILURES", 3))
+ROUTER_SLOW_SECONDS = float(os.environ.get("ROUTER_SLOW_SECONDS", 15))
+ROUTER_COOLDOWN_SECONDS = float(os.environ.get("ROUTER_COOLDOWN_SECONDS", 30))
+
+# Worth trying another model for; anything else (a bad request, a bad key)
+# would fail the same way everywhere.
+FALLBACK_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+OPENROUTER_SITE_MODELS: dict[str, list[str]] = {
+    site: [
+        model.strip()
+        for model in os.environ.get(f"OPENROUTER_MODELS_{site.upper()}", "").split(",")
+        if model.strip()
+    ]
+    for site in ROUTING_SITES
+}
+
+
+class ModelHealth:
+    """Rolling latency/error window and circuit state for one model."""
+
+    def __init__(self):
+        self.samples: deque[tuple[float, bool]] = deque(maxlen=ROUTER_WINDOW)
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+
+    def available(self, now: float) -> bool:
+        if self.opened_at is None:
+            return True
+        if now - self.opened_at < ROUTER_COOLDOWN_SECONDS:
+            return False
+        # Half-open: this caller gets the one trial call; the next one waits
+        # out another cooldown unless the trial's result closes the circuit.
+        self.opened_at = now
+        return True
+
+    def record(self, latency: float, ok: bool, now: float) -> None:
+        self.samples.append((latency, ok))
+        self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+        if self.opened_at is not None:
+            # A trial call: success closes the circuit with a fresh window.
+            if ok:
+                self.opened_at = None
+                self.samples.clear()
+                self.samples.append((latency, ok))
+            else:
+                self.opened_at = now
+            return
+        if self._degraded():
+            self.opened_at = now
+            self.trips += 1
+
+    def _degraded(self) -> bool:
+        if self.consecutive_failures >= ROUTER_MAX_CONSECUTIVE_FAILURES:
+            return True
+        if len(self.samples) < ROUTER_MIN_SAMPLES:
+            return False
+        failures = sum(1 for _, ok in self.samples if not ok)
+        return failures / len(self.samples) >= ROUTER_MAX_ERROR_RATE or self.p95() >= ROUTER_SLOW_SECONDS
+
+    def p95(self) -> float:
+        if not self.samples:
+            return 0.0
+        return percentile((latency for latency, _ in self.samples), 95)
+
+    def snapshot(self) -> dict:
+        failures = sum(1 for _, ok in self.samples if not ok)
+        return {
+            "state": "closed" if self.opened_at is None else "open",
+            "calls": len(self.samples),
+            "error_rate": round(failures / len(self.samples), 3) if self.samples else 0.0,
+            "p95_seconds": round(self.p95(), 3),
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+        }
+
+
+class ModelRouter:
+    def __init__(self, default_model: str):
+        self.default_model = default_model
+        self._lock = threading.Lock()
+        self._health: dict[str, ModelHealth] = {}
+
+    def _model_health(self, model: str) -> ModelHealth:
+        health = self._health.get(model)
+        if health is None:
+            health = self._health[model] = ModelHealth()
+        return health
+
+    def site_models(self, site: Optional[str]) -> list[str]:
+        return OPENROUTER_SITE_MODELS.get(site or "") or [self.default_model]
+
+    def candidates(self, site: Optional[str]) -> Iterator[str]:
+        """The site's models to try, in order, skipping open circuits. Each
+        model's circuit is checked only when the caller moves on to it, so a
+        half-open backup's one trial isn't spent on a call the primary ends
+        up answering. If every circuit is open the full list is tried anyway
+        — a degraded model beats no answer."""
+        models = self.site_models(site)
+        tried = False
+        for model in models:
+            with self._lock:
+                available = self._model_health(model).available(time.monotonic())
+            if available:
+                tried = True
+                yield model
+        if not tried:
+            yield from models
+
+    def record(self, model: str, latency: float, ok: bool) -> None:
+        with self._lock:
+            self._model_health(model).record(latency, ok, time.monotonic())
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = {model: health.snapshot() for model, health in self._health.items()}
+        return {
+            "routes": {site: self.site_models(site) for site in ROUTING_SITES},
+            "models": models,
+        }
@@ -6,46 +6,150 @@ is a pre-synthesized, current answer to a targeted query; we hand that to the
 LLM as a grounding fact instead of asking it to guess from memory.
 """
 
+import asyncio
 import logging
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from email.utils import parsedate_to_datetime
 from typing import Callable, Optional
 
-import requests
+import httpx
 from dotenv import load_dotenv
 
+from cache import LazyTTLCache
+from metrics import TAVILY_SEARCH_EVENTS, TAVILY_SEARCH_SECONDS, percentile
+from upstream import get_async_client
+
 load_dotenv()  # self-sufficient regardless of import order elsewhere
 
 logger = logging.getLogger("wandor.search")
 
 TAVILY_API_KEY = os.environ.get("TAVILY_API_KEY")
-TAVILY_URL = "https://api.tavily.com/search"
+TAVILY_URL = os.environ.get("TAVILY_URL", "https://api.tavily.com/search")
+
+# Per attempt. Sub-categories whose answers Tavily is known to take longer to
+# synthesize get more room via SUBCATEGORY_TIMEOUT_SECONDS below.
+TAVILY_TIMEOUT_SECONDS = float(os.environ.get("TAVILY_TIMEOUT_SECONDS", 10))
+# Transient failures (connection errors, timeouts, 429 and 5xx) are retried
+# with full-jitter exponential backoff, or after the server's Retry-After —
+# but never past the caller's deadline.
+TAVILY_MAX_ATTEMPTS = int(os.environ.get("TAVILY_MAX_ATTEMPTS", 3))
+TAVILY_BACKOFF_BASE_SECONDS = float(os.environ.get("TAVILY_BACKOFF_BASE_SECONDS", 0.5))
+TAVILY_BACKOFF_MAX_SECONDS = float(os.environ.get("TAVILY_BACKOFF_MAX_SECONDS", 4))
+# Without a deadline, a longer Retry-After than this is treated as a refusal.
+TAVILY_RETRY_AFTER_MAX_SECONDS = float(os.environ.get("TAVILY_RETRY_AFTER_MAX_SECONDS", 10))
+
+_RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Per-subcategory answers are cached on disk so a destination someone else
+# priced recently skips Tavily entirely. Prices drift slowly — a week-old
+# "average hostel price in Tokyo" is still far better grounding than none.
+PRICE_CACHE_PATH = os.environ.get(
+    "PRICE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "price_cache.sqlite3")
+)
+PRICE_CACHE_TTL_SECONDS = float(os.environ.get("PRICE_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+PRICE_CACHE_MAX_ENTRIES = int(os.environ.get("PRICE_CACHE_MAX_ENTRIES", 50_000))
+
+# The search phase as a whole gets this long; whatever hasn't answered by then
+# is left to the model's own knowledge, like a failed search.
+PRICE_SEARCH_DEADLINE_SECONDS = float(os.environ.get("PRICE_SEARCH_DEADLINE_SECONDS", 12))
+# A search still outstanding past this percentile of recent search latencies
+# gets a duplicate request; whichever answers first wins.
+PRICE_SEARCH_HEDGE_PERCENTILE = float(os.environ.get("PRICE_SEARCH_HEDGE_PERCENTILE", 95))
+# Used until there are enough recent latencies to take a percentile of.
+PRICE_SEARCH_HEDGE_DEFAULT_SECONDS = float(os.environ.get("PRICE_SEARCH_HEDGE_DEFAULT_SECONDS", 4))
+# "subcategory": one narrow query per sub-category (13 searches per trip).
+# "category": one combined query per category (3 searches), split back into
+# sub-category answers — fewer calls and quota units, somewhat patchier
+# answers. `python -m perf.bench_search_modes` compares the two.
+PRICE_SEARCH_MODE = os.environ.get("PRICE_SEARCH_MODE", "subcategory")
+
+
+get_price_cache = LazyTTLCache(PRICE_CACHE_PATH, PRICE_CACHE_TTL_SECONDS, PRICE_CACHE_MAX_ENTRIES)
+
+
+def search_retry_stats() -> dict[str, int]:
+    """Search attempts, retries and why retrying stopped — the numbers for
+    tuning the policy above."""
+    return {event: int(count) for (event,), count in TAVILY_SEARCH_EVENTS.values().items()}
+
 
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_seconds(attempt: int) -> float:
+    return random.uniform(0, min(TAVILY_BACKOFF_MAX_SECONDS, TAVILY_BACKOFF_BASE_SECONDS * 2**attempt))
 
-def tavily_search(query: str) -> str:
+
+async def tavily_search_async(
+    query: str, timeout: Optional[float] = None, deadline: Optional[float] = None
+) -> str:
     """Returns Tavily's synthesized answer for a query, or "" on any failure.
 
     Fails open: a missing key, timeout, or API error should degrade the cost
-    estimate back to LLM-only reasoning, not break the endpoint.
+    estimate back to LLM-only reasoning, not break the endpoint. Transient
+    errors are retried first, but a retry is only started if its wait ends
+    before `deadline` (a `time.monotonic()` value) when one is given. Each
+    attempt gets `timeout` seconds, defaulting to TAVILY_TIMEOUT_SECONDS.
     """
     if not TAVILY_API_KEY:
         return ""
-    try:
-        response = requests.post(
-            TAVILY_URL,
-            headers={"Authorization": f"Bearer {TAVILY_API_KEY}"},
-            json={
-                "query": query,
-                "include_answer": True,
-                "search_depth": "basic",
-                "max_results": 3,
-            },
-            timeout=15,
-        )
-        response.raise_for_status()
-        data = response.json()
-    except (requests.RequestException, ValueError):
-        return ""
+    timeout = timeout or TAVILY_TIMEOUT_SECONDS
+    for attempt in range(TAVILY_MAX_ATTEMPTS):
+        TAVILY_SEARCH_EVENTS.inc(event="attempts")
+        retry_after = None
+        try:
+            response = await get_async_client().post(
+                TAVILY_URL,
+                headers={"Authorization": f"Bearer {TAVILY_API_KEY}"},
+                json={
+                    "query": query,
+                    "include_answer": True,
+                    "search_depth": "basic",
+                    "max_results": 3,
+                },
+                timeout=timeout,
+            )
+            if response.status_code in _RETRYABLE_STATUS_CODES:
+                retry_after = _retry_after_seconds(response)
+            else:
+                response.raise_for_status()
+                data = response.json()
+                break
+        except httpx.TransportError:
+            pass  # connection refused/reset, timeouts — all worth another try
+        except (httpx.HTTPError, ValueError):
+            return ""
+
+        if attempt + 1 == TAVILY_MAX_ATTEMPTS:
+            TAVILY_SEARCH_EVENTS.inc(event="exhausted")
+            return ""
+        delay = _backoff_seconds(attempt) if retry_after is None else retry_after
+        if deadline is None and delay > TAVILY_RETRY_AFTER_MAX_SECONDS:
+            TAVILY_SEARCH_EVENTS.inc(event="out_of_time")
+            return ""
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            TAVILY_SEARCH_EVENTS.inc(event="out_of_time")
+            return ""
+        TAVILY_SEARCH_EVENTS.inc(event="retries")
+        if retry_after is not None:
+            TAVILY_SEARCH_EVENTS.inc(event="retry_after_honored")
+        await asyncio.sleep(delay)
+    if attempt:
+        TAVILY_SEARCH_EVENTS.inc(event="recovered")
 
     answer = data.get("answer")
     if answer:
@@ -58,6 +162,78 @@ def tavily_search(query: str) -> str:
     return ""
 
 
+class LatencyTracker:
+    """Sliding window of recent search latencies, for picking hedge delays."""
+
+    def __init__(self, window: int = 500, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = list(self._samples)
+        return percentile(samples, pct)
+
+
+SEARCH_LATENCY = LatencyTracker()
+
+
+def hedge_delay() -> float:
+    return SEARCH_LATENCY.percentile(PRICE_SEARCH_HEDGE_PERCENTILE) or PRICE_SEARCH_HEDGE_DEFAULT_SECONDS
+
+
+async def _timed_search(query: str, timeout: Optional[float], deadline: Optional[float]) -> str:
+    started = time.monotonic()
+    answer = await tavily_search_async(query, timeout=timeout, deadline=deadline)
+    if answer:  # fail-open empties say nothing about how long a real answer takes
+        SEARCH_LATENCY.record(time.monotonic() - started)
+    return answer
+
+
+async def hedged_search(
+    query: str, timeout: Optional[float] = None, deadline: Optional[float] = None
+) -> tuple[str, bool]:
+    """Searches once, and again in parallel if the first attempt outlasts
+    `hedge_delay()`. Returns the first non-empty answer and whether a hedge
+    was sent."""
+    first = asyncio.ensure_future(_timed_search(query, timeout, deadline))
+    attempts = {first}
+    try:
+        done, _ = await asyncio.wait(attempts, timeout=hedge_delay())
+        if done:
+            return first.result(), False
+        attempts.add(asyncio.ensure_future(_timed_search(query, timeout, deadline)))
+        while attempts:
+            done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.result():
+                    return attempt.result(), True
+        return "", True
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
+
+
+async def _observed_search(
+    query: str, subcategories: list[str], timeout: Optional[float], deadline: Optional[float]
+) -> tuple[str, bool]:
+    """`hedged_search`, timed into the per-sub-category latency histogram —
+    searches cut off by the deadline included, once they land."""
+    started = time.monotonic()
+    answer, hedged = await hedged_search(query, timeout, deadline)
+    elapsed = time.monotonic() - started
+    for subcategory in subcategories:
+        TAVILY_SEARCH_SECONDS.observe(elapsed, subcategory=subcategory, outcome="answered" if answer else "empty")
+    return answer, hedged
+
+
 SUBCATEGORY_QUERIES = {
     "accommodation": {
         "hotel": "average hotel price per night in {destination} in {month}",
@@ -81,22 +257,131 @@ SUBCATEGORY_QUERIES = {
 }
 
 
-def gather_price_context(
+# Per-attempt timeouts that differ from TAVILY_TIMEOUT_SECONDS. Everyday
+# prices are widely published and come back fast, so a slow answer there means
+# a stuck request worth cutting loose early; niche lodging and the
+# month-specific hotel query send Tavily further afield and get longer.
+SUBCATEGORY_TIMEOUT_SECONDS = {
+    "hotel": 12.0,
+    "boutique hotel": 12.0,
+    "eco-lodge": 12.0,
+    "street food": 6.0,
+    "taxi": 6.0,
+    "public transit": 6.0,
+}
+
+
+def search_timeout(subcategory: str) -> float:
+    return SUBCATEGORY_TIMEOUT_SECONDS.get(subcategory, TAVILY_TIMEOUT_SECONDS)
+
+
+# Combined queries for PRICE_SEARCH_MODE=category; `{subcategories}` lists the
+# ones not already cached.
+CATEGORY_QUERIES = {
+    "accommodation": "{subcategories} prices per night in {destination} in {month}",
+    "dining": "{subcategories} meal prices in {destination}",
+    "transportation": "{subcategories} prices in {destination}",
+}
+
+# Other words a combined answer may use for a sub-category.
+SUBCATEGORY_ALIASES = {
+    "vacation rental": ("airbnb", "apartment rental"),
+    "eco-lodge": ("eco lodge", "ecolodge"),
+    "street food": ("street stall", "street vendor"),
+    "public transit": ("metro", "subway", "bus fare", "public transport"),
+    "car rental": ("rental car", "renting a car"),
+}
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def _join_names(names: list[str]) -> str:
+    return names[0] if len(names) == 1 else ", ".join(names[:-1]) + " and " + names[-1]
+
+
+def category_query(category: str, subcategories: list[str], destination: str, travel_month: str) -> str:
+    return CATEGORY_QUERIES[category].format(
+        subcategories=_join_names(subcategories), destination=destination, month=travel_month
+    )
+
+
+def split_category_answer(answer: str, subcategories: list[str]) -> dict[str, str]:
+    """Splits a combined answer back into per-sub-category answers: each
+    sentence that quotes a figure goes to every sub-category it names.
+
+    Longer names are matched first and blanked out, so a sentence about
+    boutique hotels isn't also read as one about hotels. Sub-categories no
+    sentence mentions are left out, like a failed search.
+    """
+    names = sorted(
+        ((alias, subcategory) for subcategory in subcategories
+         for alias in (subcategory, *SUBCATEGORY_ALIASES.get(subcategory, ()))),
+        key=lambda pair: len(pair[0]),
+        reverse=True,
+    )
+    sentences: dict[str, list[str]] = defaultdict(list)
+    for sentence in _SENTENCE_BREAK.split(answer):
+        if not any(char.isdigit() for char in sentence):
+            continue
+        sentence = sentence.strip()
+        text = sentence.lower()
+        for alias, subcategory in names:
+            if alias in text:
+                text = text.replace(alias, " ")
+                if sentence not in sentences[subcategory]:
+                    sentences[subcategory].append(sentence)
+    return {subcategory: " ".join(found)[:300] for subcategory, found in sentences.items()}
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive form of user-typed text for cache keys."""
+    return " ".join(text.lower().split())
+
+
+def price_cache_key(destination: str, travel_month: str, category: str, subcategory: str) -> str:
+    """Cache key for one sub-category answer. The month only takes part when
+    that sub-category's query template actually mentions it — "hostel price
+    in Tokyo" is the same question in March and in October.
+    """
+    template = SUBCATEGORY_QUERIES[category][subcategory]
+    month = normalize_text(travel_month) if "{month}" in template else ""
+    return "|".join((normalize_text(destination), month, category, subcategory))
+
+
+async def gather_price_context_async(
     destination: str,
     travel_month: str,
     on_progress: Optional[Callable[[int, int], None]] = None,
+    on_outcome: Optional[Callable[[dict[str, int]], None]] = None,
+    mode: Optional[str] = None,
 ) -> dict[str, dict[str, str]]:
     """Runs every sub-category search concurrently — one real Tavily answer per
     accommodation/dining/transportation sub-type (13 queries total), all fired
     at once so wall-clock latency stays close to the slowest single call, not
-    the sum.
+    the sum. Answers already in the price cache are used as-is and only the
+    misses go to Tavily; fresh non-empty answers are written back (empty
+    fail-open results are not, so a transient outage isn't remembered).
+
+    Even the slowest single call is too slow when it's a 15s outlier, so the
+    phase is bounded twice over: a search outstanding past the usual latency
+    is hedged with a duplicate request (see `hedged_search`), and after
+    `PRICE_SEARCH_DEADLINE_SECONDS` the context is returned with whatever has
+    answered. Searches still running then carry on in the background and
+    fill the cache for the next trip there.
 
     `on_progress(resolved, total)` fires after each query lands (success or
-    fail-open empty), in completion order via `as_completed` — this is what
-    lets the frontend show real "N of 13 prices found" progress instead of a
-    bare spinner, since Tavily latency here is too variable (seconds to
-    minutes) for a client-side simulated progress bar to stay honest.
+    fail-open empty), in completion order — this is what lets the frontend
+    show real "N of 13 prices found" progress instead of a bare spinner,
+    since Tavily latency here is too variable for a client-side simulated
+    progress bar to stay honest. Cache hits count as resolved straight away,
+    before any search is sent. `on_outcome` gets the final tally once:
+    sub-category answers from cache, on time and late (cut off by the
+    deadline), plus searches sent and searches hedged.
+
+    `mode` overrides PRICE_SEARCH_MODE; in "category" mode the misses are
+    grouped into one combined search per category instead.
     """
+    mode = mode or PRICE_SEARCH_MODE
     flat_queries: dict[tuple[str, str], str] = {
         (category, subcategory): template.format(destination=destination, month=travel_month)
         for category, subcategories in SUBCATEGORY_QUERIES.items()
@@ -104,24 +389,113 @@ def gather_price_context(
     }
     total = len(flat_queries)
 
+    cache = get_price_cache()
     context: dict[str, dict[str, str]] = {category: {} for category in SUBCATEGORY_QUERIES}
-    resolved = 0
-    with ThreadPoolExecutor(max_workers=total) as executor:
-        future_to_key = {
-            executor.submit(tavily_search, query): key for key, query in flat_queries.items()
-        }
-        for future in as_completed(future_to_key):
-            category, subcategory = future_to_key[future]
-            answer = future.result()
+    misses: dict[tuple[str, str], str] = {}
+    for (category, subcategory), query in flat_queries.items():
+        cached = cache.get(price_cache_key(destination, travel_month, category, subcategory))
+        if cached is not None:
+            context[category][subcategory] = cached.decode("utf-8")
+        else:
+            misses[(category, subcategory)] = query
+
+    resolved = total - len(misses)
+    if on_progress and resolved:
+        on_progress(resolved, total)
+
+    # The cache is a local SQLite file in WAL mode with no fsync per commit
+    # (see cache.py) — its primary-key reads and writes take microseconds, so
+    # they run inline on the loop rather than in a thread.
+    def remember(answers: dict[tuple[str, str], str]) -> None:
+        for key, answer in answers.items():
             if answer:
-                context[category][subcategory] = answer
-            resolved += 1
+                cache.set(price_cache_key(destination, travel_month, *key), answer.encode("utf-8"))
+
+    deadline = time.monotonic() + PRICE_SEARCH_DEADLINE_SECONDS
+    searches = {}
+    for query, category, subs in _plan_searches(misses, destination, travel_month, mode):
+        timeout = max(search_timeout(subcategory) for subcategory in subs)
+        searches[asyncio.ensure_future(_observed_search(query, subs, timeout, deadline))] = (category, subs)
+    pending = set(searches)
+    hedged = 0
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for search in done:
+            (answer, was_hedged), (category, subs) = search.result(), searches[search]
+            hedged += was_hedged
+            answers = _answers_by_key(answer, category, subs)
+            for (_, subcategory), sub_answer in answers.items():
+                context[category][subcategory] = sub_answer
+            remember(answers)
+            resolved += len(subs)
             if on_progress:
                 on_progress(resolved, total)
 
+    for search in pending:
+        _late_searches.add(search)
+        search.add_done_callback(
+            lambda task, planned=searches[search]: _finish_late_search(task, *planned, remember)
+        )
+
+    late = sum(len(searches[search][1]) for search in pending)
+    outcome = {
+        "cached": total - len(misses),
+        "on_time": len(misses) - late,
+        "late": late,
+        "hedged": hedged,
+        "searches": len(searches),
+    }
+    if on_outcome:
+        on_outcome(outcome)
     hits = sum(len(v) for v in context.values())
     logger.info(
-        "price grounding for %s (%s): %d/%d sub-categories resolved",
-        destination, travel_month, hits, total,
+        "price grounding for %s (%s): %d/%d sub-categories resolved in %d searches "
+        "(%d from cache, %d late, %d hedged)",
+        destination, travel_month, hits, total, len(searches),
+        outcome["cached"], outcome["late"], outcome["hedged"],
     )
     return context
+
+
+def _plan_searches(
+    misses: dict[tuple[str, str], str], destination: str, travel_month: str, mode: str
+) -> list[tuple[str, str, list[str]]]:
+    """(query, category, sub-categories it answers) for each search to send."""
+    if mode != "category":
+        return [(query, category, [subcategory]) for (category, subcategory), query in misses.items()]
+    by_category: dict[str, list[str]] = defaultdict(list)
+    for category, subcategory in misses:
+        by_category[category].append(subcategory)
+    return [
+        (category_query(category, subs, destination, travel_month), category, subs)
+        for category, subs in by_category.items()
+    ]
+
+
+def _answers_by_key(answer: str, category: str, subcategories: list[str]) -> dict[tuple[str, str], str]:
+    if not answer:
+        return {}
+    if len(subcategories) == 1:
+        return {(category, subcategories[0]): answer}
+    return {
+        (category, subcategory): sub_answer
+        for subcategory, sub_answer in split_category_answer(answer, subcategories).items()
+    }
+
+
+# Searches cut off by the deadline, kept referenced until they land.
+_late_searches: set[asyncio.Future] = set()
+
+
+def _finish_late_search(
+    search: asyncio.Future,
+    category: str,
+    subcategories: list[str],
+    remember: Callable[[dict[tuple[str, str], str]], None],
+) -> None:
+    _late_searches.discard(search)
+    if not search.cancelled() and search.exception() is None:
+        remember(_answers_by_key(search.result()[0], category, subcategories))
@@ -0,0 +1,99 @@
+"""Server-sent event streams of job progress.
+
+Polling a status endpoint for the whole 20-130s wait costs a full request —
+and a full serialization of the job, final result included — every tick.
+A job event stream sends only what changed, as it changes:
+
+- `phase`    — the job's status moved (e.g. searching → generating)
+- `progress` — counters moved (resolved/total, generated_chars, queue_position)
+- `result`   — the finished result; the stream ends after it
+- `failed`   — the job errored (named so it can't be confused with
+               EventSource's own connection `error` event); the stream ends
+
+Event ids are the job's store sequence number (`seq`, bumped by every
+`JobProgress` write). Events describe state, not history, so resuming after
+a reconnect (`Last-Event-ID`) just means: if the job has moved past that id,
+send its current state at once, otherwise wait for the next change.
+
+The stream reads the job back from the store on a short interval rather
+than subscribing in-process, so it works on whichever worker the client
+reconnects to when a shared store backend is in use.
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Callable, Optional
+
+from store import KeyValueStore
+
+SSE_POLL_SECONDS = float(os.environ.get("SSE_POLL_SECONDS", 0.25))
+SSE_KEEPALIVE_SECONDS = 15.0
+SSE_RETRY_MS = 2000
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # stops nginx-style proxies buffering the stream
+}
+
+
+def format_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def job_event_stream(
+    store: KeyValueStore,
+    job_id: str,
+    progress_fields: tuple[str, ...],
+    queue_position: Callable[[str], Optional[int]],
+    is_disconnected: Callable[[], "asyncio.Future[bool]"],
+    last_event_id: Optional[int] = None,
+) -> AsyncIterator[str]:
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+    sent_seq = last_event_id if last_event_id is not None else -1
+    sent_status: Optional[str] = None
+    sent_progress: Optional[dict] = None
+    last_write = time.monotonic()
+
+    while True:
+        job = await store.get_async(job_id)
+        if job is None:
+            yield format_event("failed", {"error": "Job not found."})
+            return
+
+        seq = job.get("seq", 0)
+        status = job["status"]
+        progress = {name: job.get(name) for name in progress_fields}
+        progress["queue_position"] = queue_position(job_id)
+        # A resumed client already has everything up to `last_event_id`.
+        caught_up = seq <= sent_seq and sent_status is None
+
+        if not caught_up:
+            if status != sent_status:
+                yield format_event("phase", {"status": status}, seq)
+                sent_status = status
+            if progress != sent_progress:
+                yield format_event("progress", {"status": status, **progress}, seq)
+                sent_progress = progress
+            sent_seq = seq
+            last_write = time.monotonic()
+
+        if status == "done":
+            yield format_event("result", {"status": status, "result": job.get("result")}, seq)
+            return
+        if status == "error":
+            yield format_event("failed", {"status": status, "error": job.get("error")}, seq)
+            return
+
+        if time.monotonic() - last_write >= SSE_KEEPALIVE_SECONDS:
+            yield ": keepalive\n\n"
+            last_write = time.monotonic()
+        if await is_disconnected():
+            return
+        await asyncio.sleep(SSE_POLL_SECONDS)
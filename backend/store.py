@@ -0,0 +1,587 @@
+"""Job and chat-session stores, behind one small interface with three
+backends picked by `STORE_BACKEND`:
+
+- `memory` (default): `BoundedStore`, a dict-like LRU map in this process.
+  Holds live objects, so it's the fastest, but each uvicorn worker sees only
+  its own jobs and sessions.
+- `sqlite`: `SqliteStore`, a WAL-mode SQLite file every worker on one host
+  shares (`STORE_SQLITE_PATH`).
+- `redis`: `RedisStore`, anything speaking the Redis protocol
+  (`STORE_REDIS_URL`; needs the `redis` package), shared across hosts.
+
+Values are JSON-compatible dicts; a store given a `Codec` converts richer
+objects (e.g. `ChatSession`) to and from one — except the memory backend,
+which keeps the object itself. `update()` merges top-level fields into an
+existing entry, which is what lets job progress go out as small batched
+writes (see `jobs.JobProgress`) instead of rewriting the whole job.
+
+Every backend applies an idle TTL, `max_entries` and a `max_bytes` ceiling,
+evicting least-recently-used entries first (Redis leaves the last two to the
+server's own maxmemory policy). A single background sweeper thread expires
+idle entries and re-applies the limits, so they hold even for stores nobody
+is writing to.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import fields, is_dataclass
+from typing import Any, Callable, NamedTuple, Optional
+
+logger = logging.getLogger("wandor.store")
+
+STORE_BACKEND = os.environ.get("STORE_BACKEND", "memory").lower()
+STORE_SQLITE_PATH = os.environ.get(
+    "STORE_SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "wandor_store.sqlite3")
+)
+STORE_REDIS_URL = os.environ.get("STORE_REDIS_URL", "redis://localhost:6379/0")
+
+SWEEP_INTERVAL_SECONDS = 30.0
+# Entries the memory backend's sweep re-measures per turn of its lock.
+SWEEP_BATCH_SIZE = 500
+# A SQLite read only rewrites an entry's touched_at once it's this old, so
+# a status poll or an SSE stream reading a job every 0.25s isn't also a
+# stream of write transactions on the shared file.
+TOUCH_GRANULARITY_SECONDS = 10.0
+
+
+def approx_size(value: Any) -> int:
+    """Rough deep size in bytes of JSON-like values and dataclasses."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(approx_size(item) for item in value)
+    elif is_dataclass(value) and not isinstance(value, type):
+        size += sum(approx_size(getattr(value, f.name)) for f in fields(value))
+    return size
+
+
+class Codec(NamedTuple):
+    encode: Callable[[Any], dict]
+    decode: Callable[[dict], Any]
+
+
+IDENTITY = Codec(encode=lambda value: value, decode=lambda data: data)
+
+_MISSING = object()
+
+
+class KeyValueStore:
+    """Common interface. `blocking` says whether calls do I/O, so async
+    callers know to push them off the event loop."""
+
+    name: str
+    blocking = True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def update(self, key: str, changes: dict) -> None:
+        """Merges `changes` into an existing entry; a no-op if it's gone."""
+        raise NotImplementedError
+
+    def set_if_absent(self, key: str, value: Any) -> bool:
+        """Sets `key` only if it holds no live entry, atomically across every
+        worker sharing the store. Returns whether it did."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def sweep(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.set(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self.delete(key)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    # Async forms for callers on an event loop: the same calls, run in a
+    # worker thread when the backend does I/O.
+    async def _call(self, method: Callable[..., Any], *args: Any) -> Any:
+        if self.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get_async(self, key: str, default: Any = None) -> Any:
+        return await self._call(self.get, key, default)
+
+    async def set_async(self, key: str, value: Any) -> None:
+        await self._call(self.set, key, value)
+
+    async def update_async(self, key: str, changes: dict) -> None:
+        await self._call(self.update, key, changes)
+
+    async def set_if_absent_async(self, key: str, value: Any) -> bool:
+        return await self._call(self.set_if_absent, key, value)
+
+    async def delete_async(self, key: str) -> None:
+        await self._call(self.delete, key)
+
+    async def contains_async(self, key: str) -> bool:
+        return await self._call(self.__contains__, key)
+
+    async def stats_async(self) -> dict:
+        return await self._call(self.stats)
+
+
+class _Entry:
+    __slots__ = ("value", "size", "touched_at")
+
+    def __init__(self, value: Any, now: float):
+        self.value = value
+        self.size = approx_size(value)
+        self.touched_at = now
+
+
+class BoundedStore(KeyValueStore):
+    """In-process backend: a dict-like LRU map holding live objects."""
+
+    blocking = False
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int, max_bytes: int):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        _register(self)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if now - entry.touched_at > self.ttl_seconds:
+                self._remove(key)
+                self.evictions += 1
+                return default
+            entry.touched_at = now
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            entry = _Entry(value, time.monotonic())
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._enforce_limits()
+
+    def set_if_absent(self, key: str, value: Any) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry.touched_at <= self.ttl_seconds:
+                    return False
+                self._remove(key)
+                self.evictions += 1
+            entry = _Entry(value, now)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._enforce_limits()
+            return True
+
+    def update(self, key: str, changes: dict) -> None:
+        # Only the changed fields are measured — re-measuring a whole job on
+        # every progress tick would cost more than the update itself.
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                grown = 0
+                for field_name, value in changes.items():
+                    old = entry.value.get(field_name, _MISSING)
+                    if old is _MISSING:
+                        grown += approx_size(field_name) + approx_size(value)
+                    else:
+                        grown += approx_size(value) - approx_size(old)
+                entry.value.update(changes)
+                entry.size += grown
+                self._bytes += grown
+                entry.touched_at = time.monotonic()
+                self._entries.move_to_end(key)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def sweep(self) -> None:
+        """Drops expired entries, re-measures the rest, then re-applies the
+        size limits.
+
+        `set` and `update` keep each entry's size current, but a live object
+        can still grow in place, so the sweep re-measures everything. That
+        walk is the expensive part (seconds for tens of thousands of chat
+        sessions), so it runs outside the lock, on a snapshot, and takes the
+        lock only briefly per batch to apply what it measured — reads and
+        writes on the event loop never wait behind it.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if now - e.touched_at > self.ttl_seconds]:
+                self._remove(key)
+                self.evictions += 1
+            snapshot = list(self._entries.items())
+        for start in range(0, len(snapshot), SWEEP_BATCH_SIZE):
+            measured = []
+            for key, entry in snapshot[start:start + SWEEP_BATCH_SIZE]:
+                try:
+                    measured.append((key, entry, approx_size(entry.value)))
+                except RuntimeError:
+                    pass  # value resized mid-walk by its job; keep the last measurement
+            with self._lock:
+                for key, entry, size in measured:
+                    # Skip entries replaced or removed since the snapshot.
+                    if self._entries.get(key) is entry:
+                        self._bytes += size - entry.size
+                        entry.size = size
+        with self._lock:
+            self._enforce_limits()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "approx_bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _enforce_limits(self) -> None:
+        # Always keep the newest entry, even if it alone exceeds max_bytes —
+        # evicting what was just written would make the write a no-op.
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+
+class SqliteStore(KeyValueStore):
+    """Shared-file backend. WAL mode lets every worker process read while one
+    writes; each store gets its own table in the same file.
+
+    Entries are kept as JSON text. The entry-count and byte limits are
+    applied by the sweeper rather than on every write, so a progress update
+    stays a single-row UPDATE.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: float,
+        max_entries: int,
+        max_bytes: int,
+        path: str = STORE_SQLITE_PATH,
+        codec: Codec = IDENTITY,
+    ):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._codec = codec
+        self._table = f'"store_{name}"'
+        self._lock = threading.Lock()
+        # Autocommit mode, so `update` can take the write lock up front with
+        # BEGIN IMMEDIATE and two workers can't interleave read-modify-writes.
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._table} ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " touched_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            f'CREATE INDEX IF NOT EXISTS "store_{name}_touched_at" ON {self._table} (touched_at)'
+        )
+        _register(self)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, touched_at FROM {self._table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                return default
+            if now - row[1] >= TOUCH_GRANULARITY_SECONDS:
+                self._conn.execute(f"UPDATE {self._table} SET touched_at = ? WHERE key = ?", (now, key))
+        return self._codec.decode(json.loads(row[0]))
+
+    def set(self, key: str, value: Any) -> None:
+        data = json.dumps(self._codec.encode(value))
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self._table} (key, value, touched_at) VALUES (?, ?, ?)",
+                (key, data, time.time()),
+            )
+
+    def set_if_absent(self, key: str, value: Any) -> bool:
+        data = json.dumps(self._codec.encode(value))
+        now = time.time()
+        with self._lock:
+            # An expired row the sweeper hasn't deleted yet counts as absent.
+            return self._conn.execute(
+                f"INSERT INTO {self._table} (key, value, touched_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET value = excluded.value, touched_at = excluded.touched_at"
+                " WHERE touched_at < ?",
+                (key, data, now, now - self.ttl_seconds),
+            ).rowcount == 1
+
+    def update(self, key: str, changes: dict) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT value FROM {self._table} WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    data = json.loads(row[0])
+                    data.update(changes)
+                    self._conn.execute(
+                        f"UPDATE {self._table} SET value = ?, touched_at = ? WHERE key = ?",
+                        (json.dumps(data), time.time(), key),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+
+    def sweep(self) -> None:
+        with self._lock:
+            expired = self._conn.execute(
+                f"DELETE FROM {self._table} WHERE touched_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+            self.evictions += expired
+            count, total_bytes = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM {self._table}"
+            ).fetchone()
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                return
+            # Walk newest-first, keeping entries while both limits allow.
+            keep_bytes, cutoff = 0, None
+            rows = self._conn.execute(
+                f"SELECT touched_at, LENGTH(value) FROM {self._table} ORDER BY touched_at DESC"
+            )
+            for kept, (touched_at, size) in enumerate(rows, start=1):
+                keep_bytes += size
+                if kept > self.max_entries or (kept > 1 and keep_bytes > self.max_bytes):
+                    cutoff = touched_at
+                    break
+            if cutoff is not None:
+                self.evictions += self._conn.execute(
+                    f"DELETE FROM {self._table} WHERE touched_at <= ?", (cutoff,)
+                ).rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total_bytes = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM {self._table}"
+            ).fetchone()
+        return {
+            "entries": count,
+            "approx_bytes": total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+# Applies an update only if the entry still exists, so a late progress write
+# can't resurrect an expired job as a half-empty hash.
+_REDIS_UPDATE_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    redis.call('ZADD', KEYS[2], ARGV[2], KEYS[1])
+end
+"""
+
+# Creates an entry only if the key doesn't exist yet; returns 1 if it did.
+_REDIS_SET_IF_ABSENT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[2], ARGV[2], KEYS[1])
+return 1
+"""
+
+
+class RedisStore(KeyValueStore):
+    """Redis-protocol backend. Each entry is a hash with one JSON-encoded
+    field per top-level key, so `update` is a single HSET of just the changed
+    fields. The idle TTL is a key EXPIRE refreshed on every access; entry and
+    memory limits are left to the server's maxmemory policy (e.g. allkeys-lru).
+
+    A sorted set alongside the entries holds each one's expiry time, so
+    `stats` counts live entries with a ZCARD instead of scanning the
+    keyspace. An entry the server evicts under maxmemory stays counted until
+    its TTL would have run out.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: float,
+        max_entries: int,
+        max_bytes: int,
+        url: str = STORE_REDIS_URL,
+        codec: Codec = IDENTITY,
+    ):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("STORE_BACKEND=redis needs the `redis` package installed.") from exc
+        self.name = name
+        self.ttl_seconds = max(1, int(ttl_seconds))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._codec = codec
+        self._prefix = f"wandor:{name}:"
+        self._index = f"wandor:{name}#expiries"
+        self._redis = redis.Redis.from_url(url)
+        self._update_if_exists = self._redis.register_script(_REDIS_UPDATE_IF_EXISTS)
+        self._set_if_absent = self._redis.register_script(_REDIS_SET_IF_ABSENT)
+        _register(self)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hgetall(self._prefix + key)
+        pipe.expire(self._prefix + key, self.ttl_seconds)
+        pipe.zadd(self._index, {self._prefix + key: time.time() + self.ttl_seconds}, xx=True)
+        raw, _, _ = pipe.execute()
+        if not raw:
+            return default
+        return self._codec.decode({k.decode(): json.loads(v) for k, v in raw.items()})
+
+    def set(self, key: str, value: Any) -> None:
+        data = self._codec.encode(value)
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.delete(self._prefix + key)
+        if data:
+            pipe.hset(self._prefix + key, mapping={k: json.dumps(v) for k, v in data.items()})
+        pipe.expire(self._prefix + key, self.ttl_seconds)
+        pipe.zadd(self._index, {self._prefix + key: time.time() + self.ttl_seconds})
+        pipe.execute()
+
+    def update(self, key: str, changes: dict) -> None:
+        if not changes:
+            return
+        self._update_if_exists(keys=[self._prefix + key, self._index], args=self._script_args(changes))
+
+    def set_if_absent(self, key: str, value: Any) -> bool:
+        data = self._codec.encode(value)
+        if not data:
+            raise ValueError("RedisStore can't store an empty entry atomically.")
+        return bool(self._set_if_absent(keys=[self._prefix + key, self._index], args=self._script_args(data)))
+
+    def _script_args(self, fields_to_set: dict) -> list:
+        args: list = [self.ttl_seconds, time.time() + self.ttl_seconds]
+        for field_name, value in fields_to_set.items():
+            args += [field_name, json.dumps(value)]
+        return args
+
+    def delete(self, key: str) -> None:
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.delete(self._prefix + key)
+        pipe.zrem(self._index, self._prefix + key)
+        pipe.execute()
+
+    def sweep(self) -> None:
+        self._redis.zremrangebyscore(self._index, "-inf", time.time())
+
+    def stats(self) -> dict:
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.zremrangebyscore(self._index, "-inf", time.time())
+        pipe.zcard(self._index)
+        _, entries = pipe.execute()
+        return {"entries": entries, "max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+
+_stores: "weakref.WeakSet[KeyValueStore]" = weakref.WeakSet()
+_sweeper: Optional[threading.Thread] = None
+_registry_lock = threading.Lock()
+
+
+def _sweep_forever() -> None:
+    while True:
+        time.sleep(SWEEP_INTERVAL_SECONDS)
+        with _registry_lock:
+            stores = list(_stores)
+        for store in stores:
+            try:
+                store.sweep()
+            except Exception:  # a sweep bug must never kill the sweeper
+                logger.exception("Sweeping store %s failed.", store.name)
+
+
+def _register(store: KeyValueStore) -> None:
+    global _sweeper
+    with _registry_lock:
+        _stores.add(store)
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_forever, name="wandor-store-sweeper", daemon=True)
+            _sweeper.start()
+
+
+def open_store(
+    name: str, ttl_seconds: float, max_entries: int, max_bytes: int, codec: Codec = IDENTITY
+) -> KeyValueStore:
+    """Opens store `name` on the backend selected by `STORE_BACKEND`."""
+    if STORE_BACKEND == "memory":
+        return BoundedStore(name, ttl_seconds, max_entries, max_bytes)
+    if STORE_BACKEND == "sqlite":
+        return SqliteStore(name, ttl_seconds, max_entries, max_bytes, codec=codec)
+    if STORE_BACKEND == "redis":
+        return RedisStore(name, ttl_seconds, max_entries, max_bytes, codec=codec)
+    raise ValueError(f"Unknown STORE_BACKEND {STORE_BACKEND!r} (expected memory, sqlite or redis).")
@@ -0,0 +1,80 @@
+from cache import ACCESS_GRANULARITY_SECONDS, LazyTTLCache, TTLCache
+
+
+def test_get_returns_none_for_missing_key():
+    cache = TTLCache(":memory:", ttl_seconds=60, max_entries=10)
+    assert cache.get("missing") is None
+
+
+def test_set_then_get_round_trips_bytes_and_json():
+    cache = TTLCache(":memory:", ttl_seconds=60, max_entries=10)
+    cache.set("a", b"hello")
+    cache.set_json("b", {"x": [1, 2]})
+    assert cache.get("a") == b"hello"
+    assert cache.get_json("b") == {"x": [1, 2]}
+
+
+def test_expired_entries_are_not_returned():
+    cache = TTLCache(":memory:", ttl_seconds=0, max_entries=10)
+    cache.set("a", b"hello")
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_read_entry_is_evicted_past_max_entries(monkeypatch):
+    clock = iter(range(1000, 100_000, 100))
+    monkeypatch.setattr("cache.time.time", lambda: next(clock))
+    cache = TTLCache(":memory:", ttl_seconds=3600, max_entries=2)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    cache.get("a")
+    cache.set("c", b"3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.get("c") == b"3"
+
+
+def test_entries_survive_reopening_the_same_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    TTLCache(path, ttl_seconds=60, max_entries=10).set("a", b"kept")
+    assert TTLCache(path, ttl_seconds=60, max_entries=10).get("a") == b"kept"
+
+
+def test_least_recently_read_entries_are_evicted_past_max_bytes(monkeypatch):
+    clock = iter(range(1000, 100_000, 100))
+    monkeypatch.setattr("cache.time.time", lambda: next(clock))
+    cache = TTLCache(":memory:", ttl_seconds=3600, max_entries=100, max_bytes=10)
+    cache.set("a", b"1234")
+    cache.set("b", b"1234")
+    cache.get("a")
+    cache.set("c", b"1234")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == cache.get("c") == b"1234"
+    assert cache.stats()["bytes"] == 8
+
+
+def test_hits_within_the_access_granularity_write_nothing(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("cache.time.time", lambda: now[0])
+    cache = TTLCache(":memory:", ttl_seconds=3600, max_entries=10)
+    cache.set("a", b"1")
+    writes_before = cache._conn.total_changes
+
+    now[0] += ACCESS_GRANULARITY_SECONDS / 2
+    assert cache.get("a") == b"1"
+    assert cache._conn.total_changes == writes_before
+
+    now[0] += ACCESS_GRANULARITY_SECONDS
+    assert cache.get("a") == b"1"
+    assert cache._conn.total_changes == writes_before + 1
+
+
+def test_lazy_cache_opens_its_file_on_first_use_only(tmp_path):
+    path = tmp_path / "lazy.sqlite3"
+    get_cache = LazyTTLCache(str(path), ttl_seconds=60, max_entries=10)
+    assert not path.exists()
+
+    assert get_cache() is get_cache()
+    assert path.exists()
@@ -1,9 +1,15 @@
+import asyncio
 import json
+import time
 
 import pytest
 from fastapi.testclient import TestClient
 
 import main
+import pricing
+from cache import TTLCache
+from jobs import JobQueueFull
+from store import SqliteStore
 
 
 @pytest.fixture(autouse=True)
@@ -15,7 +21,7 @@ def stub_network_calls(monkeypatch):
         "total_budget": 80000,
     }
 
-    def fake_call_llm(prompt, on_chunk=None):
+    async def fake_call_llm(prompt, on_chunk=None, site=None):
         for field, value in field_values.items():
             if f"Ask about: {field}" in prompt:
                 return json.dumps({
@@ -24,13 +30,16 @@ def stub_network_calls(monkeypatch):
                 })
         return json.dumps({"extracted": {}, "reply": "Tell me more."})
 
-    def fake_gather_price_context(destination, month, on_progress=None):
+    async def fake_gather_price_context(destination, month, on_progress=None, on_outcome=None):
         if on_progress:
             on_progress(13, 13)
         return {}
 
-    monkeypatch.setattr(main, "call_llm", fake_call_llm)
-    monkeypatch.setattr(main, "gather_price_context", fake_gather_price_context)
+    monkeypatch.setattr(main, "call_llm_async", fake_call_llm)
+    monkeypatch.setattr(main, "gather_price_context_async", fake_gather_price_context)
+    monkeypatch.setattr(
+        pricing.get_unit_cost_cache, "cache", TTLCache(":memory:", ttl_seconds=3600, max_entries=100)
+    )
 
 
 @pytest.fixture
@@ -140,10 +149,10 @@ def test_chat_get_unknown_session_returns_404(client):
 
 
 def test_chat_message_falls_back_gracefully_when_llm_call_raises(client, monkeypatch):
-    def raising_call_llm(prompt, on_chunk=None):
+    async def raising_call_llm(prompt, on_chunk=None, site=None):
         raise ConnectionError("simulated network failure")
 
-    monkeypatch.setattr(main, "call_llm", raising_call_llm)
+    monkeypatch.setattr(main, "call_llm_async", raising_call_llm)
     start = client.post("/api/chat/start", json={})
     session_id = start.json()["session_id"]
 
@@ -151,3 +160,118 @@ def test_chat_message_falls_back_gracefully_when_llm_call_raises(client, monkeyp
 
     assert response.status_code == 200
     assert response.json()["field"] == "destination"
+
+
+def test_cost_estimate_start_returns_429_with_retry_after_when_queue_is_full(client, monkeypatch):
+    def full(job_id, coro):
+        coro.close()
+        raise JobQueueFull("cost_estimate", retry_after=12)
+
+    monkeypatch.setattr(main.COST_ESTIMATE_SCHEDULER, "submit", full)
+
+    response = client.post(
+        "/api/cost-estimate/start",
+        json={"destination": "Tokyo", "num_days": 7, "travel_month": "October", "total_budget": 80000},
+    )
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "12"
+
+
+def test_chat_turn_survives_a_full_pricing_queue(client, monkeypatch):
+    def full(job_id, coro):
+        coro.close()
+        raise JobQueueFull("cost_estimate", retry_after=12)
+
+    monkeypatch.setattr(main.COST_ESTIMATE_SCHEDULER, "submit", full)
+    start = client.post("/api/chat/start", json={"seed_text": "Tokyo"})
+
+    response = _complete_required_fields(client, start.json()["session_id"])
+
+    assert response.status_code == 200
+    assert response.json()["pricing_job_id"] is None
+
+
+def test_cost_estimate_start_with_same_idempotency_key_returns_the_original_job(client):
+    body = {"destination": "Tokyo", "num_days": 7, "travel_month": "October", "total_budget": 80000}
+    headers = {"Idempotency-Key": "retry-me"}
+
+    first = client.post("/api/cost-estimate/start", json=body, headers=headers)
+    retried = client.post("/api/cost-estimate/start", json=body, headers=headers)
+    fresh = client.post("/api/cost-estimate/start", json=body)
+    conflicting = client.post(
+        "/api/cost-estimate/start", json={**body, "num_days": 3}, headers=headers
+    )
+
+    assert retried.json()["job_id"] == first.json()["job_id"]
+    assert fresh.json()["job_id"] != first.json()["job_id"]
+    assert conflicting.status_code == 422
+
+
+def test_concurrent_starts_with_the_same_idempotency_key_start_one_job(monkeypatch, tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    jobs = SqliteStore("jobs", ttl_seconds=60, max_entries=100, max_bytes=10**6, path=path)
+    keys = SqliteStore("keys", ttl_seconds=60, max_entries=100, max_bytes=10**6, path=path)
+    monkeypatch.setattr(main, "COST_ESTIMATE_JOBS", jobs)
+    monkeypatch.setattr(main, "COST_ESTIMATE_IDEMPOTENCY_KEYS", keys)
+    submitted = []
+
+    def submit(job_id, coro):
+        coro.close()
+        submitted.append(job_id)
+
+    monkeypatch.setattr(main.COST_ESTIMATE_SCHEDULER, "submit", submit)
+    payload = main.CostEstimateRequest(destination="Tokyo", num_days=7, travel_month="October", total_budget=80000)
+
+    async def race():
+        return await asyncio.gather(*(main.start_cost_estimate(payload, "retry-me") for _ in range(2)))
+
+    first, second = asyncio.run(race())
+
+    assert first == second == {"job_id": submitted[0]}
+    assert len(submitted) == 1
+    assert jobs.stats()["entries"] == 1
+
+
+def test_price_search_starts_once_destination_and_month_are_known_and_the_job_reuses_it(client, monkeypatch):
+    searches = []
+
+    async def slow_gather_price_context(destination, month, on_progress=None, on_outcome=None):
+        searches.append((destination, month))
+        await asyncio.sleep(0.3)
+        return {}
+
+    monkeypatch.setattr(main, "gather_price_context_async", slow_gather_price_context)
+    session_id = client.post("/api/chat/start", json={"seed_text": "Tokyo"}).json()["session_id"]
+
+    client.post(f"/api/chat/{session_id}/message", json={"text": "7 days"})
+    assert searches == []
+    client.post(f"/api/chat/{session_id}/message", json={"text": "October"})
+    deadline = time.monotonic() + 5
+    while not searches:  # the prefetch runs on the job runner's loop
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    job_id = client.post(f"/api/chat/{session_id}/message", json={"text": "80000 INR"}).json()["pricing_job_id"]
+
+    while client.get(f"/api/cost-estimate/status/{job_id}").json()["status"] not in ("done", "error"):
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    assert searches == [("Tokyo", "October")]
+
+
+def test_plain_answer_to_the_asked_field_skips_the_llm(client, monkeypatch):
+    start = client.post("/api/chat/start", json={"seed_text": "Tokyo"})
+    session_id = start.json()["session_id"]
+
+    async def unreachable_call_llm(prompt, on_chunk=None, site=None):
+        raise AssertionError("the fast path should have answered this turn")
+
+    monkeypatch.setattr(main, "call_llm_async", unreachable_call_llm)
+    before = main.fast_path_stats()["fast_path"]
+    response = client.post(f"/api/chat/{session_id}/message", json={"text": "a week"})
+
+    body = response.json()
+    assert body["state"]["num_days"] == 7
+    assert body["field"] == "travel_month"
+    assert body["message"].endswith("What month are you planning to travel?")
+    assert main.fast_path_stats()["fast_path"] == before + 1
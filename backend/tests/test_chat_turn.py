@@ -1,31 +1,33 @@
+import asyncio
 import json
 
-from chat import ChatSession, create_session, get_session, run_chat_turn
+import chat
+from chat import ChatSession, create_session_async, get_session_async, run_chat_turn_async
 
 
 def test_create_session_returns_unique_ids():
-    id_a, session_a = create_session()
-    id_b, session_b = create_session()
+    id_a, session_a = asyncio.run(create_session_async())
+    id_b, session_b = asyncio.run(create_session_async())
     assert id_a != id_b
-    assert get_session(id_a) is session_a
-    assert get_session(id_b) is session_b
+    assert asyncio.run(get_session_async(id_a)) is session_a
+    assert asyncio.run(get_session_async(id_b)) is session_b
 
 
 def test_get_session_returns_none_for_unknown_id():
-    assert get_session("does-not-exist") is None
+    assert asyncio.run(get_session_async("does-not-exist")) is None
 
 
 def test_run_chat_turn_merges_extracted_fields_and_returns_reply():
     session = ChatSession()
     session.messages.append({"role": "user", "content": "7 days in Tokyo"})
 
-    def fake_call_llm(prompt):
+    async def fake_call_llm(prompt):
         return json.dumps({
             "extracted": {"destination": "Tokyo", "num_days": 7},
             "reply": "Tokyo for 7 days — great! What month works for you?",
         })
 
-    reply = run_chat_turn(session, fake_call_llm)
+    reply = asyncio.run(run_chat_turn_async(session, fake_call_llm))
 
     assert reply == "Tokyo for 7 days — great! What month works for you?"
     assert session.state["destination"] == "Tokyo"
@@ -37,11 +39,11 @@ def test_run_chat_turn_retries_once_on_malformed_json_then_falls_back():
     session.messages.append({"role": "user", "content": "somewhere warm"})
     calls = []
 
-    def fake_call_llm(prompt):
+    async def fake_call_llm(prompt):
         calls.append(prompt)
         return "not json at all"
 
-    reply = run_chat_turn(session, fake_call_llm)
+    reply = asyncio.run(run_chat_turn_async(session, fake_call_llm))
 
     assert len(calls) == 2
     assert reply == "Where are you thinking of traveling?"
@@ -56,10 +58,10 @@ def test_run_chat_turn_recovers_after_one_bad_response():
         json.dumps({"extracted": {"destination": "Tokyo"}, "reply": "Got it, Tokyo!"}),
     ])
 
-    def fake_call_llm(prompt):
+    async def fake_call_llm(prompt):
         return next(responses)
 
-    reply = run_chat_turn(session, fake_call_llm)
+    reply = asyncio.run(run_chat_turn_async(session, fake_call_llm))
 
     assert reply == "Got it, Tokyo!"
     assert session.state["destination"] == "Tokyo"
@@ -71,10 +73,37 @@ def test_run_chat_turn_prompt_names_the_next_missing_field():
     session.messages.append({"role": "user", "content": "Tokyo"})
     seen_prompts = []
 
-    def fake_call_llm(prompt):
+    async def fake_call_llm(prompt):
         seen_prompts.append(prompt)
         return json.dumps({"extracted": {}, "reply": "How many days?"})
 
-    run_chat_turn(session, fake_call_llm)
+    asyncio.run(run_chat_turn_async(session, fake_call_llm))
 
     assert "Ask about: num_days" in seen_prompts[0]
+
+
+def test_turn_prompt_lists_only_known_fields():
+    session = ChatSession()
+    session.state["destination"] = "Tokyo"
+    session.messages.append({"role": "user", "content": "Tokyo"})
+
+    _, prompt = chat._turn_prompt(session)
+
+    assert "- destination: Tokyo" in prompt
+    assert "travel_month:" not in prompt and "interests:" not in prompt
+
+
+def test_long_conversations_fold_older_turns_into_a_summary_within_budget(monkeypatch):
+    monkeypatch.setattr(chat, "CHAT_PROMPT_TOKEN_BUDGET", 700)
+    monkeypatch.setattr(chat, "CHAT_SUMMARY_TOKEN_BUDGET", 80)
+    session = ChatSession()
+    for turn in range(30):
+        session.messages.append({"role": "user", "content": f"message {turn} " + "we love street food " * 5})
+        session.messages.append({"role": "assistant", "content": "Noted! Anything else?"})
+        _, prompt = chat._turn_prompt(session)
+        assert chat.count_tokens(prompt) <= 700
+
+    assert "message 29" in prompt
+    assert session.summarized_messages > 0
+    assert "message 0 " not in session.history_summary  # rolled off the summary
+    assert session.history_summary.splitlines()[-1].lstrip(" -").startswith("message ")
@@ -0,0 +1,73 @@
+import httpx
+import pytest
+
+import main
+import routing
+import search
+from jobs import run_sync
+from jsonutil import extract_json_object
+from perf import emulator
+
+
+@pytest.fixture
+def use_emulator(monkeypatch):
+    """Points the backend's pooled client at an in-process emulator."""
+
+    def start(openrouter=emulator.Profile(tokens_per_second=500), tavily=emulator.Profile(), recordings=None):
+        server = emulator.Emulator(openrouter, tavily, recordings=recordings, seed=1)
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=emulator.create_app(server)), base_url="http://emulator"
+        )
+        monkeypatch.setattr(main, "get_async_client", lambda: client)
+        monkeypatch.setattr(search, "get_async_client", lambda: client)
+        monkeypatch.setattr(main, "OPENROUTER_URL", "http://emulator/api/v1/chat/completions")
+        monkeypatch.setattr(search, "TAVILY_URL", "http://emulator/search")
+        monkeypatch.setattr(main, "OPENROUTER_API_KEY", "test-key")
+        monkeypatch.setattr(search, "TAVILY_API_KEY", "test-key")
+        monkeypatch.setattr(main, "MODEL_ROUTER", routing.ModelRouter("default-model"))
+        return server
+
+    return start
+
+
+def test_streamed_and_blocking_completions_match(use_emulator):
+    use_emulator()
+    prompt = "Plan the outline of a 4-day trip to Lisbon in May with a total budget of ₹80000.\n" + (
+        '{"days": [ ... ]}'
+    )
+    chunks = []
+
+    streamed = run_sync(main.call_llm_async(prompt, on_chunk=chunks.append))
+    blocking = run_sync(main.call_llm_async(prompt))
+
+    assert streamed == blocking
+    assert len(chunks) > 1
+    assert extract_json_object(blocking)["days"][-1]["day"] == 4
+
+
+def test_recorded_responses_are_replayed(use_emulator):
+    use_emulator(recordings=[{"service": "openrouter", "match": "Hanoi", "response": "### Day 1: Old Quarter"}])
+
+    assert run_sync(main.call_llm_async("A 1-day itinerary for Hanoi.")) == "### Day 1: Old Quarter"
+
+
+def test_rate_limited_profile_answers_429_with_retry_after(use_emulator):
+    server = use_emulator(openrouter=emulator.Profile(rate_limit_rate=1.0, retry_after_seconds=3))
+
+    with pytest.raises(main.HTTPException) as raised:
+        run_sync(main.call_llm_async("hello"))
+
+    assert raised.value.status_code == 429
+    assert server.stats()["counts"]["openrouter.rate_limited"] == 1
+
+
+def test_synthesized_search_answer_splits_back_into_subcategories(use_emulator):
+    use_emulator()
+    query = search.category_query("dining", ["street food", "fine dining"], "Goa", "October")
+
+    answer = run_sync(search.tavily_search_async(query))
+
+    assert set(search.split_category_answer(answer, ["street food", "fine dining"])) == {
+        "street food",
+        "fine dining",
+    }
@@ -0,0 +1,41 @@
+import pytest
+
+from fastpath import extract_fast_path
+
+
+@pytest.mark.parametrize(
+    "text, field, value",
+    [
+        ("7 days", "num_days", 7),
+        ("  10 ", "num_days", 10),
+        ("a week", "num_days", 7),
+        ("two weeks.", "num_days", 14),
+        ("October", "travel_month", "October"),
+        ("in oct 2026", "travel_month", "October"),
+        ("80k", "total_budget", 80000.0),
+        ("₹1,20,000", "total_budget", 120000.0),
+        ("around 1.5 lakh INR", "total_budget", 150000.0),
+        ("just the two of us", "companions", "Couple"),
+        ("Solo!", "companions", "Solo"),
+        ("laid back", "pace", "Relaxed"),
+    ],
+)
+def test_extract_fast_path_reads_plain_answers(text, field, value):
+    assert extract_fast_path(text, field) == {field: value}
+
+
+@pytest.mark.parametrize(
+    "text, field",
+    [
+        ("7 days in Goa", "num_days"),
+        ("five", "num_days"),
+        ("400 days", "num_days"),
+        ("sometime after the monsoon", "travel_month"),
+        ("80", "total_budget"),
+        ("$2000", "total_budget"),
+        ("me and my kids", "companions"),
+        ("October", "destination"),
+    ],
+)
+def test_extract_fast_path_leaves_anything_else_to_the_llm(text, field):
+    assert extract_fast_path(text, field) is None
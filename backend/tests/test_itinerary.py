@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+from itinerary import BlockStitcher, SkeletonError, generate_itinerary_by_day, parse_skeleton
+from jobs import run_sync
+
+TRIP = {
+    "num_days": 3,
+    "destination": "Kyoto",
+    "total_budget": 90000,
+    "companions": "Couple",
+    "interests_str": "temples, food",
+    "child_ages": "",
+    "accommodation": "Mid-range",
+    "transportation": "Public transport",
+    "dining": "Local",
+    "pace": "Moderate",
+    "special_requests": "",
+    "dietary_restrictions": "",
+    "accessibility_needs": "",
+    "nationality": "Indian",
+    "travel_month": "April",
+}
+
+
+def test_block_stitcher_holds_later_blocks_until_earlier_ones_finish():
+    passed_on = []
+    stitcher = BlockStitcher(3, passed_on.append)
+
+    stitcher.append(2, "closing")
+    stitcher.append(1, "day two")
+    stitcher.finish(1)
+    assert passed_on == []
+
+    stitcher.append(0, "\nday ")
+    stitcher.append(0, "one")
+    assert "".join(passed_on) == "day one"
+
+    stitcher.finish(0)
+    stitcher.finish(2)
+    assert "".join(passed_on) == "day one\n\nday two\n\nclosing" == stitcher.text()
+
+
+def test_parse_skeleton_rejects_the_wrong_number_of_days():
+    raw = json.dumps({"days": [{"theme": "Temples"}, {"theme": "Markets"}]})
+
+    assert [day["day"] for day in parse_skeleton(raw, 2)] == [1, 2]
+    with pytest.raises(SkeletonError):
+        parse_skeleton(raw, 3)
+    with pytest.raises(SkeletonError):
+        parse_skeleton("not json", 2)
+
+
+def test_generate_itinerary_by_day_stitches_concurrent_blocks_in_order():
+    skeleton = json.dumps({"days": [{"theme": f"Theme {n}", "area": "Gion", "highlights": []} for n in (1, 2, 3)]})
+    running = 0
+    peak = 0
+
+    async def fake_call_llm(prompt, on_chunk=None):
+        nonlocal running, peak
+        if '"days"' in prompt:
+            on_chunk(skeleton)
+            return skeleton
+        running += 1
+        peak = max(peak, running)
+        day = next((n for n in (1, 2, 3) if f"### Day {n}:" in prompt), None)
+        text = f"### Day {day}: Theme {day}\n" if day else "## Trip Summary\n"
+        # Later days finish first, so stitching has to hold them back.
+        await asyncio.sleep(0.01 * (4 - day if day else 0))
+        on_chunk(text)
+        running -= 1
+        return text
+
+    passed_on = []
+    generated = []
+    text = run_sync(
+        generate_itinerary_by_day(TRIP, fake_call_llm, passed_on.append, generated.append, concurrency=2)
+    )
+
+    assert text.index("### Day 1") < text.index("### Day 2") < text.index("### Day 3") < text.index("## Trip Summary")
+    assert "".join(passed_on) == text
+    assert peak == 2
+    assert generated[-1] == len(skeleton) + sum(len(f"### Day {n}: Theme {n}\n") for n in (1, 2, 3)) + len(
+        "## Trip Summary\n"
+    )
+
+
+def test_progress_keeps_counting_up_when_the_skeleton_falls_back_to_one_pass(monkeypatch):
+    async def fake_call_llm_cached(site, prompt, on_chunk=None, cache_if=None):
+        text = "not a skeleton" if '"days"' in prompt else "### Day 1: Arrival\n"
+        on_chunk(text)
+        return text
+
+    generated_chars = []
+
+    class RecordingProgress(main.JobProgress):
+        def set(self, **changes):
+            if "generated_chars" in changes:
+                generated_chars.append(changes["generated_chars"])
+            super().set(**changes)
+
+    monkeypatch.setattr(main, "call_llm_cached", fake_call_llm_cached)
+    monkeypatch.setattr(main, "use_parallel_days", lambda num_days: True)
+    monkeypatch.setattr(main, "JobProgress", RecordingProgress)
+    main.ITINERARY_JOBS.set("fallback-job", {"seq": 0, "status": "generating", "generated_chars": 0})
+
+    run_sync(main._run_itinerary_job("fallback-job", main.ItineraryRequest(**TRIP)))
+
+    assert main.ITINERARY_JOBS.get("fallback-job")["status"] == "done"
+    assert generated_chars == sorted(generated_chars)
+    assert generated_chars[-1] == len("not a skeleton") + len("### Day 1: Arrival\n")
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import sse
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(sse, "SSE_POLL_SECONDS", 0.01)
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def _events(response) -> list[tuple[str, dict, str]]:
+    events = []
+    for block in response.text.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"]), fields.get("id")))
+    return events
+
+
+def _put_job(job_id: str, **job) -> None:
+    main.COST_ESTIMATE_JOBS.set(job_id, {
+        "seq": 0, "status": "searching", "resolved": 0, "total": 13,
+        "generated_chars": 0, "result": None, "error": None, **job,
+    })
+
+
+def test_events_stream_sends_phase_progress_and_result_for_a_finished_job(client):
+    _put_job("done-job", seq=4, status="done", resolved=13, generated_chars=900, result={"dining": {}})
+
+    response = client.get("/api/cost-estimate/events/done-job")
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    names = [name for name, _, _ in _events(response)]
+    assert names == ["phase", "progress", "result"]
+    _, result_data, result_id = _events(response)[-1]
+    assert result_data["result"] == {"dining": {}}
+    assert result_id == "4"
+
+
+def test_events_stream_resumes_without_repeating_seen_state(client):
+    _put_job("resumed-job", seq=4, status="done", resolved=13, result={"dining": {}})
+
+    response = client.get("/api/cost-estimate/events/resumed-job", headers={"Last-Event-ID": "4"})
+
+    assert [name for name, _, _ in _events(response)] == ["result"]
+
+
+def test_events_stream_reports_failed_jobs(client):
+    _put_job("failed-job", seq=2, status="error", error="boom")
+
+    events = _events(client.get("/api/cost-estimate/events/failed-job"))
+
+    assert events[-1][0] == "failed"
+    assert events[-1][1]["error"] == "boom"
+
+
+def test_events_stream_unknown_job_returns_404(client):
+    assert client.get("/api/itinerary/events/unknown-id").status_code == 404
+
+
+def test_itinerary_status_with_offset_returns_only_new_text(client):
+    main.ITINERARY_JOBS.set("writing", {
+        "seq": 3, "status": "generating", "generated_chars": 21,
+        "partial_text": "# Day 1\nShibuya walk.", "result": None, "error": None,
+    })
+
+    plain = client.get("/api/itinerary/status/writing").json()
+    first = client.get("/api/itinerary/status/writing", params={"offset": 0}).json()
+    later = client.get("/api/itinerary/status/writing", params={"offset": first["next_offset"] - 5}).json()
+
+    assert "partial_text" not in plain and "text" not in plain
+    assert first["text"] == "# Day 1\nShibuya walk."
+    assert later == {**later, "text": "walk.", "next_offset": 21}
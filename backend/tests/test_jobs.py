@@ -0,0 +1,145 @@
+import asyncio
+import threading
+
+import pytest
+
+from jobs import JobProgress, JobQueueFull, JobRunner, JobScheduler, SingleFlight
+from store import BoundedStore
+
+
+def test_submit_runs_coroutine_on_the_runner_thread():
+    runner = JobRunner()
+
+    async def whoami():
+        await asyncio.sleep(0)
+        return threading.current_thread().name
+
+    assert runner.submit(whoami()).result(timeout=5) == "wandor-jobs"
+
+
+def test_run_sync_returns_the_coroutine_result():
+    runner = JobRunner()
+
+    async def add(a, b):
+        return a + b
+
+    assert runner.run_sync(add(2, 3)) == 5
+
+
+def test_run_sync_refuses_to_deadlock_on_its_own_thread():
+    runner = JobRunner()
+
+    async def nested():
+        with pytest.raises(RuntimeError):
+            runner.run_sync(asyncio.sleep(0))
+        return True
+
+    assert runner.submit(nested()).result(timeout=5) is True
+
+
+def _blocking_job(gate: threading.Event):
+    async def job():
+        while not gate.is_set():
+            await asyncio.sleep(0.01)
+
+    return job()
+
+
+def test_scheduler_runs_at_most_workers_jobs_and_reports_queue_positions():
+    runner = JobRunner()
+    scheduler = JobScheduler("test", workers=1, queue_size=2, runner=runner)
+    gate = threading.Event()
+
+    scheduler.submit("a", _blocking_job(gate))
+    scheduler.submit("b", _blocking_job(gate))
+    scheduler.submit("c", _blocking_job(gate))
+    runner.run_sync(asyncio.sleep(0.05))
+
+    assert scheduler.queue_position("a") is None
+    assert scheduler.queue_position("b") == 1
+    assert scheduler.queue_position("c") == 2
+    assert scheduler.stats()["running"] == 1
+    gate.set()
+
+
+def test_scheduler_rejects_with_retry_after_when_queue_is_full():
+    runner = JobRunner()
+    scheduler = JobScheduler("test", workers=1, queue_size=1, initial_job_seconds=10, runner=runner)
+    gate = threading.Event()
+    scheduler.submit("a", _blocking_job(gate))
+    scheduler.submit("b", _blocking_job(gate))
+    runner.run_sync(asyncio.sleep(0.05))
+
+    with pytest.raises(JobQueueFull) as exc_info:
+        scheduler.submit("c", _blocking_job(gate))
+
+    assert exc_info.value.retry_after == 20
+    assert scheduler.stats()["rejected"] == 1
+    gate.set()
+
+
+def test_job_progress_batches_sets_and_flushes_immediately_on_demand():
+    runner = JobRunner()
+    jobs = BoundedStore("test", ttl_seconds=60, max_entries=10, max_bytes=10**6)
+    jobs["job"] = {"status": "searching", "resolved": 0}
+    updates = []
+    original_update = jobs.update
+    jobs.update = lambda key, changes: (updates.append(dict(changes)), original_update(key, changes))
+
+    async def run():
+        progress = JobProgress(jobs, "job", flush_seconds=0.05)
+        for resolved in range(1, 6):
+            progress.set(resolved=resolved)
+        assert updates == []
+        await asyncio.sleep(0.1)
+        progress.set(resolved=6)
+        await progress.flush(status="done")
+
+    runner.run_sync(run())
+
+    assert updates == [{"resolved": 5, "seq": 1}, {"resolved": 6, "status": "done", "seq": 2}]
+    assert jobs["job"] == {"status": "done", "resolved": 6, "seq": 2}
+
+
+def test_single_flight_shares_one_computation_and_catches_up_late_callers():
+    runner = JobRunner()
+    flights = SingleFlight("test")
+    calls = []
+    seen = {"first": [], "second": []}
+
+    async def work(flight):
+        calls.append(1)
+        flight.publish(resolved=1)
+        await asyncio.sleep(0.05)
+        flight.publish(status="generating")
+        return {"table": 1}
+
+    async def run():
+        first = asyncio.ensure_future(flights.run("goa|december", work, seen["first"].append))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(flights.run("goa|december", work, seen["second"].append))
+        return await asyncio.gather(first, second)
+
+    assert runner.run_sync(run()) == [{"table": 1}, {"table": 1}]
+    assert calls == [1]
+    assert seen["first"] == [{"resolved": 1}, {"status": "generating"}]
+    assert seen["second"] == [{"resolved": 1}, {"status": "generating"}]
+    assert flights.stats() == {"in_flight": 0, "started": 1, "coalesced": 1}
+
+
+def test_single_flight_survives_one_caller_being_cancelled():
+    runner = JobRunner()
+    flights = SingleFlight("test")
+
+    async def work(flight):
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        doomed = asyncio.ensure_future(flights.run("key", work))
+        survivor = asyncio.ensure_future(flights.run("key", work))
+        await asyncio.sleep(0.01)
+        doomed.cancel()
+        return await survivor
+
+    assert runner.run_sync(run()) == "done"
@@ -1,6 +1,6 @@
 import pytest
 
-from jsonutil import extract_json_object
+from jsonutil import IncrementalObjectParser, extract_json_object
 
 
 def test_extracts_json_from_plain_object():
@@ -20,3 +20,26 @@ def test_raises_when_no_braces_present():
 def test_raises_when_braces_contain_invalid_json():
     with pytest.raises(ValueError):
         extract_json_object("{not valid json}")
+
+
+def test_incremental_parser_reports_nested_objects_as_they_close():
+    text = (
+        'Here you go: {"accommodation": {"hotel": {"cost": {"min": 1, "max": 2}, "unit": "per night"}}, '
+        '"dining": {"caf\\u00e9, \\"bistro\\"": {"cost": {"min": 3, "max": 4}, "unit": "per meal"}}} done'
+    )
+    seen = []
+    parser = IncrementalObjectParser(lambda path, value: seen.append((path, value)))
+
+    for i in range(0, len(text), 7):
+        parser.feed(text[i:i + 7])
+        if i < text.index('"dining"') - 7:
+            assert all(path[0] == "accommodation" for path, _ in seen)
+
+    assert [path for path, _ in seen] == [
+        ("accommodation", "hotel"),
+        ("accommodation",),
+        ("dining", 'caf\u00e9, "bistro"'),
+        ("dining",),
+    ]
+    assert seen[0][1] == {"cost": {"min": 1, "max": 2}, "unit": "per night"}
+    assert parser.done
@@ -0,0 +1,54 @@
+import pytest
+
+import llm_cache
+import main
+from cache import TTLCache
+from jobs import run_sync
+
+
+@pytest.fixture
+def cached_sites(monkeypatch):
+    monkeypatch.setattr(llm_cache.get_llm_cache, "cache", TTLCache(":memory:", ttl_seconds=3600, max_entries=100))
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_SITES", frozenset({"itinerary", "chat"}))
+
+
+def test_llm_cache_key_ignores_whitespace_but_not_model_or_temperature():
+    key = llm_cache.llm_cache_key("model-a", "Plan\n   a trip ", 1.0)
+
+    assert key == llm_cache.llm_cache_key("model-a", "Plan a trip", 1.0)
+    assert key != llm_cache.llm_cache_key("model-b", "Plan a trip", 1.0)
+    assert key != llm_cache.llm_cache_key("model-a", "Plan a trip", 0.2)
+
+
+def test_cached_response_is_replayed_through_on_chunk(cached_sites, monkeypatch):
+    calls = []
+
+    async def fake_call_llm(prompt, on_chunk=None, site=None):
+        calls.append(prompt)
+        on_chunk("### Day 1")
+        return "### Day 1"
+
+    monkeypatch.setattr(main, "call_llm_async", fake_call_llm)
+    first, second = [], []
+
+    assert run_sync(main.call_llm_cached("itinerary", "a prompt", on_chunk=first.append)) == "### Day 1"
+    assert run_sync(main.call_llm_cached("itinerary", "a prompt", on_chunk=second.append)) == "### Day 1"
+    assert len(calls) == 1
+    assert "".join(second) == "### Day 1"
+
+
+def test_disabled_sites_and_rejected_responses_are_not_cached(cached_sites, monkeypatch):
+    calls = []
+
+    async def fake_call_llm(prompt, on_chunk=None, site=None):
+        calls.append(prompt)
+        return "not json"
+
+    monkeypatch.setattr(main, "call_llm_async", fake_call_llm)
+    must_be_json = main._parsed_response_is(lambda parsed: "reply" in parsed)
+
+    for _ in range(2):
+        run_sync(main.call_llm_cached("chat", "turn prompt", cache_if=must_be_json))
+        run_sync(main.call_llm_cached("cost", "cost prompt"))
+
+    assert len(calls) == 4
@@ -0,0 +1,99 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import llm_cache
+import main
+import metrics
+import pdf
+import pricing
+import routing
+import search
+from cache import TTLCache
+from jobs import run_sync
+
+
+@pytest.fixture(autouse=True)
+def in_memory_caches(monkeypatch):
+    """A scrape reads every cache's hit counts, which would open them on disk."""
+    for lazy_cache in (
+        search.get_price_cache, pricing.get_unit_cost_cache, llm_cache.get_llm_cache, pdf.get_pdf_cache
+    ):
+        monkeypatch.setattr(lazy_cache, "cache", TTLCache(":memory:", ttl_seconds=3600, max_entries=100))
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    histogram = metrics.Histogram("test_render_seconds", "Test latency.", labels=("site",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, site='say "hi"')
+
+    text = histogram.render()
+
+    assert "# TYPE test_render_seconds histogram" in text
+    assert 'test_render_seconds_bucket{site="say \\"hi\\"",le="0.1"} 1' in text
+    assert 'test_render_seconds_bucket{site="say \\"hi\\"",le="1"} 3' in text
+    assert 'test_render_seconds_bucket{site="say \\"hi\\"",le="+Inf"} 4' in text
+    assert 'test_render_seconds_sum{site="say \\"hi\\""} 4.05' in text
+    assert 'test_render_seconds_count{site="say \\"hi\\""} 4' in text
+
+
+def test_price_searches_are_timed_per_subcategory(monkeypatch):
+    async def fake_tavily_search(query, timeout=None, deadline=None):
+        return "" if "hostel" in query else "about ₹2000"
+
+    monkeypatch.setattr(search, "tavily_search_async", fake_tavily_search)
+    before = metrics.TAVILY_SEARCH_SECONDS.count(subcategory="hostel", outcome="empty")
+
+    run_sync(search.gather_price_context_async("Lisbon", "May"))
+
+    assert metrics.TAVILY_SEARCH_SECONDS.count(subcategory="hostel", outcome="empty") == before + 1
+
+
+def test_metrics_endpoint_reports_llm_calls_and_fallbacks(monkeypatch):
+    replies = [httpx.Response(503, json={"error": "overloaded"}), httpx.Response(
+        200, json={"choices": [{"message": {"content": "hello there"}}]}
+    )]
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: replies.pop(0)))
+    monkeypatch.setattr(main, "get_async_client", lambda: client)
+    monkeypatch.setattr(main, "OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setattr(main, "MODEL_ROUTER", routing.ModelRouter("default-model"))
+    monkeypatch.setitem(routing.OPENROUTER_SITE_MODELS, "cost", ["busy-model", "spare-model"])
+    fallbacks = metrics.LLM_FALLBACKS.value(site="cost")
+
+    run_sync(main.call_llm_async("price it", site="cost"))
+    response = TestClient(main.app).get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert metrics.LLM_FALLBACKS.value(site="cost") == fallbacks + 1
+    assert 'wandor_llm_calls_total{site="cost",model="busy-model",outcome="error"}' in response.text
+    assert 'wandor_llm_response_seconds_count{site="cost"}' in response.text
+    assert 'wandor_jobs{job_type="itinerary",state="queued"} 0' in response.text
+    assert "wandor_chat_sessions " in response.text
+    assert 'wandor_cache_requests_total{cache="llm",result="hit"} 0' in response.text
+
+
+def test_percentile_is_nearest_rank():
+    assert metrics.percentile([4, 1, 3, 2], 50) == 2
+    assert metrics.percentile([4, 1, 3, 2], 95) == 4
+    assert metrics.percentile([4, 1, 3, 2], 0) == 1
+
+
+def test_stats_endpoints_count_the_stores_off_the_event_loop(monkeypatch):
+    calls = []
+
+    def stats():
+        try:
+            asyncio.get_running_loop()
+            calls.append("event loop")
+        except RuntimeError:
+            calls.append("thread")
+        return {"entries": 0, "bytes": 0}
+
+    monkeypatch.setattr(main.CHAT_SESSIONS, "stats", stats)
+    client = TestClient(main.app)
+
+    assert client.get("/metrics").status_code == 200
+    assert client.get("/api/stats").status_code == 200
+    assert calls == ["thread", "thread"]
@@ -0,0 +1,81 @@
+import stat
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import pdf
+from cache import TTLCache
+
+
+@pytest.fixture
+def fake_wkhtmltopdf(tmp_path, monkeypatch):
+    """Points the renderer at a stand-in script with the given shell body."""
+
+    def install(body):
+        script = tmp_path / "wkhtmltopdf"
+        script.write_text(f"#!/bin/sh\ncat > /dev/null\n{body}\n")
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setattr(pdf, "WKHTMLTOPDF_PATH", str(script))
+        pdf._configuration.cache_clear()
+
+    yield install
+    pdf._configuration.cache_clear()
+
+
+@pytest.fixture
+def isolated_pdf_cache(monkeypatch):
+    monkeypatch.setattr(pdf.get_pdf_cache, "cache", TTLCache(":memory:", ttl_seconds=3600, max_entries=100))
+
+
+def test_pdf_is_rendered_on_the_pool_with_timings(fake_wkhtmltopdf, isolated_pdf_cache):
+    fake_wkhtmltopdf("printf '%%PDF-1.4 fake'")
+
+    response = TestClient(main.app).post("/api/itinerary/pdf", json={"itinerary_markdown": "# Day 1"})
+
+    assert response.status_code == 200
+    assert response.content == b"%PDF-1.4 fake"
+    assert "render;dur=" in response.headers["Server-Timing"]
+
+
+def test_slow_render_is_killed_after_the_timeout(fake_wkhtmltopdf, isolated_pdf_cache, monkeypatch):
+    fake_wkhtmltopdf("sleep 5")
+    monkeypatch.setattr(pdf, "PDF_RENDER_TIMEOUT_SECONDS", 0.2)
+
+    response = TestClient(main.app).post("/api/itinerary/pdf", json={"itinerary_markdown": "# Day 1"})
+
+    assert response.status_code == 504
+
+
+def test_template_does_not_fetch_remote_fonts():
+    assert "http" not in pdf.render_html("# Day 1")
+
+
+def test_repeat_downloads_are_served_from_cache_and_by_etag(fake_wkhtmltopdf, isolated_pdf_cache, tmp_path):
+    renders = tmp_path / "renders"
+    fake_wkhtmltopdf(f"echo render >> {renders}; printf '%%PDF-1.4 fake'")
+    client = TestClient(main.app)
+    body = {"itinerary_markdown": "# Day 1"}
+
+    first = client.post("/api/itinerary/pdf", json=body)
+    second = client.post("/api/itinerary/pdf", json=body)
+    revalidated = client.post("/api/itinerary/pdf", json=body, headers={"If-None-Match": first.headers["ETag"]})
+
+    assert first.content == second.content == b"%PDF-1.4 fake"
+    assert second.headers["Server-Timing"] == "cache;desc=hit"
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert renders.read_text().count("render") == 1
+
+
+def test_finished_itinerary_job_renders_by_id(fake_wkhtmltopdf, isolated_pdf_cache):
+    fake_wkhtmltopdf("printf '%%PDF-1.4 fake'")
+    client = TestClient(main.app)
+    main.ITINERARY_JOBS.set("pdf-done", {"seq": 1, "status": "done", "result": {"itinerary": "# Day 1"}})
+    main.ITINERARY_JOBS.set("pdf-running", {"seq": 1, "status": "generating", "result": None})
+
+    done = client.get("/api/itinerary/pdf/pdf-done")
+
+    assert done.status_code == 200 and done.content == b"%PDF-1.4 fake"
+    assert done.headers["ETag"] == pdf.pdf_etag("# Day 1")
+    assert client.get("/api/itinerary/pdf/pdf-running").status_code == 409
+    assert client.get("/api/itinerary/pdf/missing").status_code == 404
@@ -0,0 +1,139 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+import pricing
+from cache import TTLCache
+from jobs import run_sync
+
+TABLE = {
+    "accommodation": {
+        "hotel": {"cost": {"min": 3000, "max": 6000}, "unit": "per night"},
+    },
+    "dining": {
+        "street food": {"cost": {"min": 100, "max": 250}, "unit": "per meal"},
+    },
+    "transportation": {
+        "taxi": {"cost": {"min": 20, "max": 30}, "unit": "per km"},
+        "public transport": {"cost": {"min": 150, "max": 300}, "unit": "per day"},
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def isolated_unit_cost_cache(monkeypatch):
+    cache = TTLCache(":memory:", ttl_seconds=3600, max_entries=100)
+    monkeypatch.setattr(pricing.get_unit_cost_cache, "cache", cache)
+    return cache
+
+
+def test_unit_cost_cache_key_ignores_case_and_whitespace():
+    assert pricing.unit_cost_cache_key(" Tokyo ", "October") == pricing.unit_cost_cache_key("tokyo", "OCTOBER")
+    assert pricing.unit_cost_cache_key("Tokyo", "October") != pricing.unit_cost_cache_key("Tokyo", "March")
+
+
+def test_is_unit_cost_table_rejects_incomplete_tables():
+    assert pricing.is_unit_cost_table(TABLE)
+    assert not pricing.is_unit_cost_table({"accommodation": TABLE["accommodation"]})
+    assert not pricing.is_unit_cost_table({**TABLE, "dining": {"street food": {"unit": "per meal"}}})
+
+
+def test_derive_trip_totals_scales_only_unambiguous_units():
+    totals = pricing.derive_trip_totals(TABLE, num_days=4)
+
+    assert totals["accommodation"]["hotel"] == {"min": 9000, "max": 18000, "basis": "3 nights"}
+    assert totals["dining"]["street food"] == {"min": 1200, "max": 3000, "basis": "12 meals"}
+    assert totals["transportation"] == {"public transport": {"min": 600, "max": 1200, "basis": "4 days"}}
+
+
+def _run_job(monkeypatch, num_days):
+    llm_calls = []
+
+    async def fake_call_llm(prompt, on_chunk=None, site=None):
+        llm_calls.append(prompt)
+        return json.dumps(TABLE)
+
+    async def fake_gather_price_context(destination, month, on_progress=None, on_outcome=None):
+        return {}
+
+    monkeypatch.setattr(main, "call_llm_async", fake_call_llm)
+    monkeypatch.setattr(main, "gather_price_context_async", fake_gather_price_context)
+
+    payload = main.CostEstimateRequest(
+        destination="Tokyo", num_days=num_days, travel_month="October", total_budget=80000
+    )
+    job_id = f"job-{num_days}"
+    main.COST_ESTIMATE_JOBS.set(job_id, {"seq": 0, "status": "searching", "result": None, "error": None})
+    run_sync(main._run_cost_estimate_job(job_id, payload))
+    return main.COST_ESTIMATE_JOBS.get(job_id), llm_calls
+
+
+def test_repeat_destination_is_served_from_the_cached_table(monkeypatch):
+    first, first_calls = _run_job(monkeypatch, num_days=4)
+    second, second_calls = _run_job(monkeypatch, num_days=8)
+
+    assert len(first_calls) == 1 and second_calls == []
+    assert first["status"] == second["status"] == "done"
+    assert second["result"]["accommodation"] == TABLE["accommodation"]
+    assert second["result"]["trip_totals"]["accommodation"]["hotel"]["basis"] == "7 nights"
+
+
+def test_concurrent_jobs_for_the_same_trip_share_one_generation(monkeypatch):
+    llm_calls = []
+
+    async def slow_call_llm(prompt, on_chunk=None, site=None):
+        llm_calls.append(prompt)
+        await asyncio.sleep(0.05)
+        return json.dumps(TABLE)
+
+    async def fake_gather_price_context(destination, month, on_progress=None, on_outcome=None):
+        return {}
+
+    monkeypatch.setattr(main, "call_llm_async", slow_call_llm)
+    monkeypatch.setattr(main, "gather_price_context_async", fake_gather_price_context)
+
+    async def run_both():
+        runs = []
+        for job_id, num_days in (("short", 3), ("long", 10)):
+            main.COST_ESTIMATE_JOBS.set(job_id, {"seq": 0, "status": "searching", "result": None, "error": None})
+            payload = main.CostEstimateRequest(
+                destination="Goa", num_days=num_days, travel_month="December", total_budget=50000
+            )
+            runs.append(main._run_cost_estimate_job(job_id, payload))
+        await asyncio.gather(*runs)
+
+    run_sync(run_both())
+
+    assert len(llm_calls) == 1
+    short, long = main.COST_ESTIMATE_JOBS.get("short"), main.COST_ESTIMATE_JOBS.get("long")
+    assert short["status"] == long["status"] == "done"
+    assert short["result"]["trip_totals"]["accommodation"]["hotel"]["basis"] == "2 nights"
+    assert long["result"]["trip_totals"]["accommodation"]["hotel"]["basis"] == "9 nights"
+
+
+def test_categories_are_published_before_the_response_finishes(monkeypatch):
+    text = json.dumps(TABLE)
+    split_at = text.index('"dining"')
+    partial_seen_mid_stream = []
+
+    async def streaming_call_llm(prompt, on_chunk=None, site=None):
+        on_chunk(text[:split_at])
+        await asyncio.sleep(0.05)
+        partial_seen_mid_stream.append(main.COST_ESTIMATE_JOBS.get("streamed")["partial_result"])
+        on_chunk(text[split_at:])
+        return text
+
+    async def fake_gather_price_context(destination, month, on_progress=None, on_outcome=None):
+        return {}
+
+    monkeypatch.setattr(main, "call_llm_async", streaming_call_llm)
+    monkeypatch.setattr(main, "gather_price_context_async", fake_gather_price_context)
+    main.COST_ESTIMATE_JOBS.set("streamed", {"seq": 0, "status": "searching", "partial_result": None})
+    payload = main.CostEstimateRequest(destination="Lima", num_days=3, travel_month="May", total_budget=1000)
+
+    run_sync(main._run_cost_estimate_job("streamed", payload))
+
+    assert partial_seen_mid_stream == [{"accommodation": TABLE["accommodation"]}]
+    assert main.COST_ESTIMATE_JOBS.get("streamed")["status"] == "done"
@@ -0,0 +1,112 @@
+import json
+import time
+
+import httpx
+import pytest
+
+import main
+import routing
+from jobs import run_sync
+
+
+def test_circuit_opens_on_consecutive_failures_and_closes_after_a_good_trial(monkeypatch):
+    monkeypatch.setattr(routing, "ROUTER_COOLDOWN_SECONDS", 30)
+    health = routing.ModelHealth()
+    for _ in range(routing.ROUTER_MAX_CONSECUTIVE_FAILURES):
+        health.record(1.0, ok=False, now=100)
+
+    assert not health.available(now=110)
+    assert health.available(now=131)  # the trial call
+    assert not health.available(now=132)  # only one per cooldown
+
+    health.record(0.5, ok=True, now=133)
+    assert health.available(now=134)
+    assert health.snapshot()["state"] == "closed"
+
+
+def test_slow_p95_latency_opens_the_circuit(monkeypatch):
+    monkeypatch.setattr(routing, "ROUTER_SLOW_SECONDS", 5)
+    health = routing.ModelHealth()
+    for latency in (1, 1, 1, 9, 9):
+        health.record(latency, ok=True, now=0)
+
+    assert not health.available(now=1)
+
+
+@pytest.fixture
+def openrouter_responses(monkeypatch):
+    """Answers each OpenRouter call with a queued outcome, recording the
+    model each one asked for."""
+    queued, models = [], []
+
+    def handler(request):
+        models.append(json.loads(request.content)["model"])
+        outcome = queued.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(main, "get_async_client", lambda: client)
+    monkeypatch.setattr(main, "OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setattr(main, "MODEL_ROUTER", routing.ModelRouter("default-model"))
+    monkeypatch.setitem(routing.OPENROUTER_SITE_MODELS, "chat", ["fast-model", "backup-model"])
+    return queued, models
+
+
+def _reply(text):
+    return httpx.Response(200, json={"choices": [{"message": {"content": text}}]})
+
+
+def test_rate_limited_model_falls_back_to_the_next_one(openrouter_responses):
+    queued, models = openrouter_responses
+    queued.extend([httpx.Response(429, json={"error": "rate limited"}), _reply("hi")])
+
+    assert run_sync(main.call_llm_async("hello", site="chat")) == "hi"
+    assert models == ["fast-model", "backup-model"]
+
+
+def test_open_circuit_is_skipped_and_client_errors_are_not_retried(openrouter_responses):
+    queued, models = openrouter_responses
+    for _ in range(routing.ROUTER_MAX_CONSECUTIVE_FAILURES):
+        queued.extend([httpx.ConnectError("refused"), _reply("ok")])
+        run_sync(main.call_llm_async("hello", site="chat"))
+    models.clear()
+
+    queued.append(httpx.Response(400, json={"error": "bad request"}))
+    with pytest.raises(main.HTTPException):
+        run_sync(main.call_llm_async("hello", site="chat"))
+    assert models == ["backup-model"]
+    assert main.MODEL_ROUTER.stats()["models"]["fast-model"]["state"] == "open"
+
+
+def test_a_half_open_backup_keeps_its_trial_while_the_primary_answers(openrouter_responses):
+    queued, models = openrouter_responses
+    for _ in range(routing.ROUTER_MAX_CONSECUTIVE_FAILURES):
+        main.MODEL_ROUTER.record("backup-model", 1.0, ok=False)
+    backup = main.MODEL_ROUTER._health["backup-model"]
+    backup.opened_at -= routing.ROUTER_COOLDOWN_SECONDS + 1  # cooled down: its trial is up next
+    queued.append(_reply("hi"))
+
+    assert run_sync(main.call_llm_async("hello", site="chat")) == "hi"
+    assert models == ["fast-model"]
+    assert backup.available(time.monotonic())
+
+
+class StalledStream(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        raise httpx.ReadTimeout("no chunk within the read timeout")
+        yield b""
+
+
+def test_a_stalled_stream_counts_against_the_model_and_falls_back(openrouter_responses):
+    queued, models = openrouter_responses
+    queued.extend([
+        httpx.Response(200, headers={"Content-Type": "text/event-stream"}, stream=StalledStream()),
+        httpx.Response(200, text='data: {"choices": [{"delta": {"content": "hi"}}]}\n\ndata: [DONE]\n\n'),
+    ])
+    chunks = []
+
+    assert run_sync(main.call_llm_async("hello", on_chunk=chunks.append, site="chat")) == "hi"
+    assert models == ["fast-model", "backup-model"]
+    assert main.MODEL_ROUTER.stats()["models"]["fast-model"]["consecutive_failures"] == 1
@@ -0,0 +1,226 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import search
+from cache import TTLCache
+from jobs import run_sync
+
+
+@pytest.fixture(autouse=True)
+def isolated_price_cache(monkeypatch):
+    cache = TTLCache(":memory:", ttl_seconds=3600, max_entries=100)
+    monkeypatch.setattr(search.get_price_cache, "cache", cache)
+    return cache
+
+
+def test_price_cache_key_only_includes_month_when_template_uses_it():
+    assert search.price_cache_key(" Tokyo ", "October", "accommodation", "hotel") == (
+        "tokyo|october|accommodation|hotel"
+    )
+    assert search.price_cache_key("TOKYO", "October", "accommodation", "hostel") == (
+        search.price_cache_key("tokyo", "March", "accommodation", "hostel")
+    )
+
+
+def test_gather_price_context_only_searches_cache_misses(monkeypatch, isolated_price_cache):
+    isolated_price_cache.set(
+        search.price_cache_key("Tokyo", "October", "dining", "street food"), b"cached answer"
+    )
+    queries = []
+
+    async def fake_tavily_search(query, timeout=None, deadline=None):
+        queries.append(query)
+        return "fresh answer"
+
+    monkeypatch.setattr(search, "tavily_search_async", fake_tavily_search)
+    progress = []
+
+    context = run_sync(
+        search.gather_price_context_async("Tokyo", "October", on_progress=lambda r, t: progress.append(r))
+    )
+
+    assert len(queries) == 12
+    assert context["dining"]["street food"] == "cached answer"
+    assert context["accommodation"]["hotel"] == "fresh answer"
+    assert progress[0] == 1
+    assert progress[-1] == 13
+
+
+def test_gather_price_context_writes_answers_back_but_not_empty_ones(monkeypatch, isolated_price_cache):
+    async def fake_tavily_search(query, timeout=None, deadline=None):
+        return "" if "hostel" in query else "answer"
+
+    monkeypatch.setattr(search, "tavily_search_async", fake_tavily_search)
+
+    run_sync(search.gather_price_context_async("Tokyo", "October"))
+
+    assert isolated_price_cache.get(
+        search.price_cache_key("Tokyo", "October", "accommodation", "hotel")
+    ) == b"answer"
+    assert isolated_price_cache.get(
+        search.price_cache_key("Tokyo", "October", "accommodation", "hostel")
+    ) is None
+
+
+def test_gather_price_context_returns_at_the_deadline_and_caches_late_answers(monkeypatch, isolated_price_cache):
+    async def fake_tavily_search(query, timeout=None, deadline=None):
+        if "hostel" in query:
+            await asyncio.sleep(0.3)
+            return "late answer"
+        return "answer"
+
+    monkeypatch.setattr(search, "tavily_search_async", fake_tavily_search)
+    monkeypatch.setattr(search, "PRICE_SEARCH_DEADLINE_SECONDS", 0.1)
+    monkeypatch.setattr(search, "PRICE_SEARCH_HEDGE_DEFAULT_SECONDS", 10)
+    outcomes = []
+
+    started = time.monotonic()
+    context = run_sync(search.gather_price_context_async("Tokyo", "October", on_outcome=outcomes.append))
+
+    assert time.monotonic() - started < 0.3
+    assert "hostel" not in context["accommodation"]
+    assert outcomes == [{"cached": 0, "on_time": 12, "late": 1, "hedged": 0, "searches": 13}]
+    hostel_key = search.price_cache_key("Tokyo", "October", "accommodation", "hostel")
+    deadline = time.monotonic() + 2
+    while isolated_price_cache.get(hostel_key) is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    assert isolated_price_cache.get(hostel_key) == b"late answer"
+
+
+def test_slow_searches_are_hedged_and_the_first_answer_wins(monkeypatch, isolated_price_cache):
+    attempts = {}
+
+    async def fake_tavily_search(query, timeout=None, deadline=None):
+        attempts[query] = attempts.get(query, 0) + 1
+        if query.startswith("average hotel price") and attempts[query] == 1:
+            await asyncio.sleep(5)  # a stuck first attempt
+        return f"answer {attempts[query]}"
+
+    monkeypatch.setattr(search, "tavily_search_async", fake_tavily_search)
+    monkeypatch.setattr(search, "PRICE_SEARCH_HEDGE_DEFAULT_SECONDS", 0.05)
+    monkeypatch.setattr(search, "SEARCH_LATENCY", search.LatencyTracker())
+    outcomes = []
+
+    context = run_sync(search.gather_price_context_async("Tokyo", "October", on_outcome=outcomes.append))
+
+    assert context["accommodation"]["hotel"] == "answer 2"
+    assert outcomes[0]["hedged"] == 1 and outcomes[0]["late"] == 0
+
+
+def test_latency_tracker_needs_enough_samples_for_a_percentile():
+    tracker = search.LatencyTracker(min_samples=3)
+    tracker.record(1.0)
+    assert tracker.percentile(95) is None
+    for seconds in (2.0, 3.0, 4.0):
+        tracker.record(seconds)
+    assert tracker.percentile(50) == 2.0
+    assert tracker.percentile(95) == 4.0
+
+
+@pytest.fixture
+def tavily_responses(monkeypatch):
+    """Serves queued responses (or raises queued exceptions) for Tavily calls."""
+    queued, sent = [], []
+
+    def handler(request):
+        sent.append(request)
+        outcome = queued.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(search, "get_async_client", lambda: client)
+    monkeypatch.setattr(search, "TAVILY_API_KEY", "test-key")
+    monkeypatch.setattr(search, "TAVILY_BACKOFF_BASE_SECONDS", 0.01)
+    return queued, sent
+
+
+def test_tavily_search_retries_transient_failures_honoring_retry_after(tavily_responses):
+    queued, sent = tavily_responses
+    before = search.search_retry_stats()
+    queued.extend([
+        httpx.ConnectError("connection reset"),
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(200, json={"answer": "about 100 USD"}),
+    ])
+
+    assert run_sync(search.tavily_search_async("hotel price")) == "about 100 USD"
+    assert len(sent) == 3
+    after = search.search_retry_stats()
+    counted = {event: after[event] - before.get(event, 0) for event in after}
+    assert {event: count for event, count in counted.items() if count} == {
+        "attempts": 3, "retries": 2, "retry_after_honored": 1, "recovered": 1,
+    }
+
+
+def test_tavily_search_does_not_retry_client_errors(tavily_responses):
+    queued, sent = tavily_responses
+    queued.append(httpx.Response(401))
+
+    assert run_sync(search.tavily_search_async("hotel price")) == ""
+    assert len(sent) == 1
+
+
+def test_tavily_search_gives_up_when_a_retry_would_overrun_the_deadline(tavily_responses):
+    queued, sent = tavily_responses
+    queued.append(httpx.Response(503, headers={"Retry-After": "30"}))
+
+    out_of_time = search.search_retry_stats().get("out_of_time", 0)
+    deadline = time.monotonic() + 5
+    assert run_sync(search.tavily_search_async("hotel price", deadline=deadline)) == ""
+    assert len(sent) == 1
+    assert search.search_retry_stats()["out_of_time"] == out_of_time + 1
+
+
+def test_split_category_answer_assigns_sentences_to_the_subcategories_they_name():
+    answer = (
+        "Boutique hotels cost around 150 USD per night. A standard hotel runs about 80 USD. "
+        "Airbnb listings average 60 USD. Hostels are popular with backpackers."
+    )
+
+    split = search.split_category_answer(answer, ["hotel", "boutique hotel", "vacation rental", "hostel"])
+
+    assert split == {
+        "boutique hotel": "Boutique hotels cost around 150 USD per night.",
+        "hotel": "A standard hotel runs about 80 USD.",
+        "vacation rental": "Airbnb listings average 60 USD.",
+    }
+
+
+def test_split_category_answer_keeps_a_sentence_once_when_two_aliases_name_it():
+    answer = "Transit prices:\n  A metro or subway ride costs 2 USD.  "
+
+    split = search.split_category_answer(answer, ["public transit"])
+
+    assert split == {"public transit": "A metro or subway ride costs 2 USD."}
+
+
+def test_category_mode_sends_one_search_per_category_for_the_uncached_subcategories(
+    monkeypatch, isolated_price_cache
+):
+    isolated_price_cache.set(search.price_cache_key("Tokyo", "October", "dining", "street food"), b"cached")
+    queries = []
+
+    async def fake_tavily_search(query, timeout=None, deadline=None):
+        queries.append(query)
+        return "A taxi costs 400 JPY per km. A metro ticket is 200 JPY."
+
+    monkeypatch.setattr(search, "tavily_search_async", fake_tavily_search)
+    outcomes = []
+
+    context = run_sync(
+        search.gather_price_context_async("Tokyo", "October", on_outcome=outcomes.append, mode="category")
+    )
+
+    assert len(queries) == 3
+    assert "street food" not in next(q for q in queries if "meal prices" in q)
+    assert context["transportation"] == {
+        "taxi": "A taxi costs 400 JPY per km.",
+        "public transit": "A metro ticket is 200 JPY.",
+    }
+    assert outcomes[0]["searches"] == 3 and outcomes[0]["cached"] == 1
@@ -0,0 +1,235 @@
+import asyncio
+
+import pytest
+
+import store
+from chat import SESSION_CODEC, ChatSession
+from jobs import run_sync
+from store import BoundedStore, SqliteStore, approx_size
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(store.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_behaves_like_a_dict_for_set_get_and_delete():
+    jobs = BoundedStore("test", ttl_seconds=60, max_entries=10, max_bytes=10**6)
+    jobs["a"] = {"status": "done"}
+    assert jobs["a"] == {"status": "done"}
+    assert "a" in jobs
+    del jobs["a"]
+    assert jobs.get("a") is None
+    with pytest.raises(KeyError):
+        jobs["a"]
+
+
+def test_entries_expire_after_idle_ttl_but_reads_keep_them_alive(clock):
+    jobs = BoundedStore("test", ttl_seconds=60, max_entries=10, max_bytes=10**6)
+    jobs["a"] = 1
+    jobs["b"] = 2
+    clock[0] += 50
+    jobs.get("a")
+    clock[0] += 20
+
+    assert jobs.get("a") == 1
+    assert jobs.get("b") is None
+
+
+def test_least_recently_used_entry_is_evicted_past_max_entries():
+    jobs = BoundedStore("test", ttl_seconds=60, max_entries=2, max_bytes=10**6)
+    jobs["a"] = 1
+    jobs["b"] = 2
+    jobs.get("a")
+    jobs["c"] = 3
+
+    assert jobs.get("b") is None
+    assert jobs.get("a") == 1
+    assert jobs.stats()["evictions"] == 1
+
+
+def test_memory_ceiling_evicts_oldest_entries_first():
+    big = "x" * 1000
+    jobs = BoundedStore("test", ttl_seconds=60, max_entries=100, max_bytes=approx_size(big) * 2 + 10)
+    jobs["a"] = big
+    jobs["b"] = big
+    jobs["c"] = big
+
+    assert len(jobs) == 2
+    assert jobs.get("a") is None
+    assert jobs.stats()["approx_bytes"] <= jobs.max_bytes
+
+
+def test_sweep_drops_expired_entries_and_remeasures_grown_values(clock):
+    jobs = BoundedStore("test", ttl_seconds=60, max_entries=10, max_bytes=10**6)
+    jobs["stale"] = {}
+    clock[0] += 50
+    job = {"result": None}
+    jobs["live"] = job
+    clock[0] += 20
+    before = jobs.stats()["approx_bytes"]
+    job["result"] = "y" * 5000
+
+    jobs.sweep()
+
+    assert jobs.get("stale") is None
+    assert jobs.stats()["entries"] == 1
+    assert jobs.stats()["approx_bytes"] > before
+
+
+def test_update_keeps_the_running_size_current():
+    jobs = BoundedStore("test", ttl_seconds=60, max_entries=10, max_bytes=10**6)
+    jobs["job"] = {"status": "queued", "result": None}
+
+    jobs.update("job", {"status": "done", "result": "y" * 5000, "finished_at": 1.0})
+
+    assert jobs.stats()["approx_bytes"] == approx_size(jobs["job"])
+
+
+def test_sweep_measures_values_without_holding_the_lock(monkeypatch):
+    jobs = BoundedStore("test", ttl_seconds=60, max_entries=1000, max_bytes=10**9)
+    for index in range(store.SWEEP_BATCH_SIZE + 1):
+        jobs[str(index)] = {"index": index}
+    measured_while_locked = []
+    real_approx_size = store.approx_size
+
+    def approx_size_checking_the_lock(value):
+        measured_while_locked.append(jobs._lock.locked())
+        return real_approx_size(value)
+
+    monkeypatch.setattr(store, "approx_size", approx_size_checking_the_lock)
+    jobs.sweep()
+
+    assert measured_while_locked and not any(measured_while_locked)
+
+
+def test_update_merges_fields_into_existing_entries_only():
+    jobs = BoundedStore("test", ttl_seconds=60, max_entries=10, max_bytes=10**6)
+    jobs["a"] = {"status": "searching", "resolved": 0}
+    jobs.update("a", {"resolved": 5})
+    jobs.update("missing", {"resolved": 5})
+
+    assert jobs["a"] == {"status": "searching", "resolved": 5}
+    assert "missing" not in jobs
+
+
+def _sqlite_store(path, **limits):
+    return SqliteStore(
+        "jobs",
+        ttl_seconds=limits.get("ttl_seconds", 60),
+        max_entries=limits.get("max_entries", 100),
+        max_bytes=limits.get("max_bytes", 10**6),
+        path=str(path),
+    )
+
+
+def test_sqlite_store_is_shared_between_independent_connections(tmp_path):
+    worker_a = _sqlite_store(tmp_path / "store.sqlite3")
+    worker_b = _sqlite_store(tmp_path / "store.sqlite3")
+
+    worker_a.set("job", {"status": "searching", "resolved": 0})
+    worker_b.update("job", {"resolved": 7})
+
+    assert worker_a.get("job") == {"status": "searching", "resolved": 7}
+    worker_b.delete("job")
+    assert worker_a.get("job") is None
+
+
+def test_sqlite_store_async_forms_run_in_a_worker_thread(tmp_path, monkeypatch):
+    jobs = _sqlite_store(tmp_path / "store.sqlite3")
+    offloaded = []
+    real_to_thread = asyncio.to_thread
+
+    def to_thread(method, *args):
+        offloaded.append(method.__name__)
+        return real_to_thread(method, *args)
+
+    monkeypatch.setattr(store.asyncio, "to_thread", to_thread)
+
+    async def scenario():
+        await jobs.set_async("job", {"status": "searching"})
+        await jobs.update_async("job", {"status": "done"})
+        found = await jobs.get_async("job"), await jobs.contains_async("job")
+        await jobs.delete_async("job")
+        return found + (await jobs.contains_async("job"), (await jobs.stats_async())["entries"])
+
+    assert run_sync(scenario()) == ({"status": "done"}, True, False, 0)
+    assert offloaded == ["set", "update", "get", "__contains__", "delete", "__contains__", "stats"]
+
+
+def test_sqlite_store_expires_idle_entries(tmp_path, monkeypatch):
+    jobs = _sqlite_store(tmp_path / "store.sqlite3", ttl_seconds=60)
+    jobs.set("job", {"status": "done"})
+    real_time = store.time.time
+    monkeypatch.setattr(store.time, "time", lambda: real_time() + 120)
+
+    assert jobs.get("job") is None
+    jobs.sweep()
+    assert jobs.stats()["entries"] == 0
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_set_if_absent_only_writes_a_missing_or_expired_key(backend, tmp_path, monkeypatch):
+    if backend == "memory":
+        jobs = BoundedStore("test", ttl_seconds=60, max_entries=10, max_bytes=10**6)
+    else:
+        jobs = _sqlite_store(tmp_path / "store.sqlite3", ttl_seconds=60)
+    now = [1000.0]
+    monkeypatch.setattr(store.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(store.time, "time", lambda: now[0])
+
+    assert jobs.set_if_absent("key", {"job_id": "first"})
+    assert not jobs.set_if_absent("key", {"job_id": "second"})
+    assert jobs.get("key") == {"job_id": "first"}
+
+    now[0] += 120
+    assert jobs.set_if_absent("key", {"job_id": "third"})
+    assert jobs.get("key") == {"job_id": "third"}
+
+
+def test_sqlite_store_reads_only_rewrite_touched_at_past_the_granularity(tmp_path, monkeypatch):
+    jobs = _sqlite_store(tmp_path / "store.sqlite3")
+    now = [store.time.time()]
+    monkeypatch.setattr(store.time, "time", lambda: now[0])
+    jobs.set("job", {"status": "searching"})
+    writes = jobs._conn.total_changes
+
+    for _ in range(4):
+        now[0] += 0.25
+        jobs.get("job")
+    assert jobs._conn.total_changes == writes
+
+    now[0] += store.TOUCH_GRANULARITY_SECONDS
+    jobs.get("job")
+    assert jobs._conn.total_changes == writes + 1
+
+
+def test_sqlite_store_sweep_keeps_only_the_most_recent_entries(tmp_path, monkeypatch):
+    jobs = _sqlite_store(tmp_path / "store.sqlite3", max_entries=2)
+    now = [store.time.time()]
+    monkeypatch.setattr(store.time, "time", lambda: now[0])
+    for key in ("a", "b", "c"):
+        now[0] += 1
+        jobs.set(key, {"key": key})
+
+    jobs.sweep()
+
+    assert jobs.get("a") is None
+    assert jobs.get("b") == {"key": "b"}
+    assert jobs.get("c") == {"key": "c"}
+
+
+def test_sqlite_store_round_trips_objects_through_a_codec(tmp_path):
+    sessions = SqliteStore(
+        "sessions", ttl_seconds=60, max_entries=10, max_bytes=10**6,
+        path=str(tmp_path / "store.sqlite3"), codec=SESSION_CODEC,
+    )
+    session = ChatSession()
+    session.state["destination"] = "Tokyo"
+    session.messages.append({"role": "user", "content": "Tokyo"})
+
+    sessions.set("s", session)
+
+    assert sessions.get("s") == session
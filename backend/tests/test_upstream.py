@@ -0,0 +1,55 @@
+import asyncio
+
+import httpx
+
+import upstream
+
+
+def test_pool_stats_counts_reused_connections():
+    async def send_three():
+        for _ in range(3):
+            request = httpx.Request("POST", "https://pool-stats.test/search")
+            await upstream._on_request(request)
+        await request.extensions["trace"]("connection.connect_tcp.complete", {})
+
+    asyncio.run(send_three())
+
+    assert upstream.pool_stats()["pool-stats.test"] == {
+        "requests": 3, "connections_opened": 1, "connections_reused": 2
+    }
+
+
+def test_trace_ignores_events_other_than_new_connections():
+    async def send_one():
+        request = httpx.Request("POST", "https://trace-events.test/api/v1/chat/completions")
+        await upstream._on_request(request)
+        await request.extensions["trace"]("http11.send_request_headers.complete", {})
+
+    asyncio.run(send_one())
+
+    assert upstream.pool_stats()["trace-events.test"]["connections_opened"] == 0
+
+
+def test_get_async_client_is_shared_within_a_loop_but_not_across_loops():
+    async def two_lookups():
+        return upstream.get_async_client(), upstream.get_async_client()
+
+    first_a, first_b = asyncio.run(two_lookups())
+    second_a, _ = asyncio.run(two_lookups())
+
+    assert first_a is first_b
+    assert second_a is not first_a
+
+
+def test_stream_buffer_returns_text_since_any_offset():
+    buffer = upstream.StreamBuffer()
+    for delta in ("Day 1: ", "", "Senso-ji", " temple. ", "Day 2: Nikko."):
+        buffer.append(delta)
+
+    assert len(buffer) == len("Day 1: Senso-ji temple. Day 2: Nikko.")
+    assert buffer.text() == "Day 1: Senso-ji temple. Day 2: Nikko."
+    assert buffer.since(10) == "so-ji temple. Day 2: Nikko."
+    assert buffer.since(24) == "Day 2: Nikko."
+    assert buffer.since(len(buffer)) == ""
+    buffer.append(" Day 3.")
+    assert buffer.since(31) == "Nikko. Day 3."
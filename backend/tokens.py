@@ -0,0 +1,18 @@
+"""Local prompt-size accounting, so prompts can be built to a token budget
+without asking the provider.
+
+This is an estimate, and the only tokenizer the backend uses: models behind
+OpenRouter don't share one tokenizer anyway, and a real one (tiktoken) would
+be a dependency that downloads its vocabulary on first use. Roughly one
+token per four characters of each word, one per punctuation mark, is close
+enough for budgeting.
+"""
+
+import math
+import re
+
+_WORD_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    return sum(math.ceil(len(piece) / 4) for piece in _WORD_PIECES.findall(text))
@@ -0,0 +1,137 @@
+"""Shared, pooled async HTTP clients for every upstream API call (OpenRouter,
+Tavily).
+
+A bare `requests.post` per call pays a fresh TCP + TLS handshake every time —
+13 of them per cost-estimate job, one per chat turn. Routing everything
+through a long-lived `httpx.AsyncClient` keeps connections alive between calls,
+and HTTP/2 (opt-in, needs the `h2` package) lets the parallel Tavily searches
+multiplex over a single connection.
+
+`pool_stats()` reports, per host, how many requests went out and how many new
+connections had to be opened for them — the gap is the handshakes saved.
+"""
+
+import asyncio
+import bisect
+import importlib.util
+import logging
+import os
+import weakref
+
+import httpx
+from dotenv import load_dotenv
+
+from metrics import UPSTREAM_CONNECTIONS_OPENED, UPSTREAM_REQUESTS
+
+load_dotenv()
+
+logger = logging.getLogger("wandor.upstream")
+# httpx logs every request at INFO — 13 lines per cost estimate is noise.
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+UPSTREAM_MAX_CONNECTIONS = int(os.environ.get("UPSTREAM_MAX_CONNECTIONS", 1000))
+UPSTREAM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", 100))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.environ.get("UPSTREAM_KEEPALIVE_EXPIRY", 60))
+UPSTREAM_HTTP2 = os.environ.get("UPSTREAM_HTTP2", "").lower() in ("1", "true", "yes")
+
+
+async def _on_request(request: httpx.Request) -> None:
+    host = request.url.host
+    UPSTREAM_REQUESTS.inc(host=host)
+
+    # httpcore reports connection lifecycle through the "trace" extension;
+    # a completed TCP connect is exactly one handshake we couldn't avoid.
+    async def trace(event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            UPSTREAM_CONNECTIONS_OPENED.inc(host=host)
+
+    request.extensions["trace"] = trace
+
+
+def _http2_enabled() -> bool:
+    if UPSTREAM_HTTP2 and importlib.util.find_spec("h2") is None:
+        logger.warning("UPSTREAM_HTTP2 is set but the `h2` package isn't installed; using HTTP/1.1.")
+        return False
+    return UPSTREAM_HTTP2
+
+
+# One client per event loop: an httpx.AsyncClient's connections belong to the
+# loop that opened them, and both the request-serving loop and the job
+# runner's loop (see jobs.py) make upstream calls.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Returns the pooled client for the running event loop, creating it on
+    first use.
+
+    No client-wide timeout: streamed LLM responses legitimately run for
+    minutes, so callers pass their own `timeout=` where they want one.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            http2=_http2_enabled(),
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=None,
+            event_hooks={"request": [_on_request]},
+            default_encoding="utf-8",
+        )
+        _clients[loop] = client
+    return client
+
+
+def pool_stats() -> dict[str, dict[str, int]]:
+    opened = {host: count for (host,), count in UPSTREAM_CONNECTIONS_OPENED.values().items()}
+    return {
+        host: {
+            "requests": int(sent),
+            "connections_opened": int(opened.get(host, 0)),
+            "connections_reused": int(max(0, sent - opened.get(host, 0))),
+        }
+        for (host,), sent in UPSTREAM_REQUESTS.values().items()
+    }
+
+
+class StreamBuffer:
+    """Accumulates streamed text without rebuilding it on every chunk.
+
+    `text += delta` copies everything received so far on each of a
+    response's hundreds of chunks — quadratic in its length. Appending to a
+    list is constant time; the string is only joined when someone asks for
+    it, and `since(offset)` joins just the chunks after `offset`.
+    """
+
+    def __init__(self):
+        self._chunks: list[str] = []
+        self._starts: list[int] = []  # offset of each chunk's first character
+        self._length = 0
+
+    def append(self, delta: str) -> None:
+        if delta:
+            self._chunks.append(delta)
+            self._starts.append(self._length)
+            self._length += len(delta)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def text(self) -> str:
+        return self.since(0)
+
+    def since(self, offset: int) -> str:
+        if offset >= self._length:
+            return ""
+        first = max(0, bisect.bisect_right(self._starts, offset) - 1)
+        if first == 0 and len(self._chunks) > 1:
+            # Collapse, so repeated full reads don't redo the same join.
+            self._chunks, self._starts = ["".join(self._chunks)], [0]
+        tail = "".join(self._chunks[first:])
+        return tail[offset - self._starts[first]:]
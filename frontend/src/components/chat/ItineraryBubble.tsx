@@ -5,7 +5,13 @@ import { ChevronDown, Download } from 'lucide-react'
 import Card from '@/components/ui/Card'
 import PillButton from '@/components/ui/PillButton'
 import ProgressBar from '@/components/ui/ProgressBar'
-import { pollItineraryByJobId, fetchItineraryPdf, ApiError, type ItineraryProgress } from '@/lib/api'
+import {
+  pollItineraryByJobId,
+  fetchItineraryPdf,
+  fetchItineraryPdfByJobId,
+  ApiError,
+  type ItineraryProgress,
+} from '@/lib/api'
 
 interface DaySection {
   title: string
@@ -90,7 +96,11 @@ export default function ItineraryBubble({
     setDownloading(true)
     setDownloadError(null)
     try {
-      const blob = await fetchItineraryPdf(itinerary)
+      // Finished jobs expire server-side; past that, upload the markdown.
+      const blob = await fetchItineraryPdfByJobId(jobId).catch((err) => {
+        if (err instanceof ApiError && err.status === 404) return fetchItineraryPdf(itinerary)
+        throw err
+      })
       const url = URL.createObjectURL(blob)
       const link = document.createElement('a')
       link.href = url
@@ -7,7 +7,7 @@ import ProgressBar from '@/components/ui/ProgressBar'
 import { MONTHS, usePlan } from '@/lib/planContext'
 import { pollCostEstimate, ApiError, type CostEstimateProgress, type CostEstimates } from '@/lib/api'
 
-function formatCategory(estimates: CostEstimates[keyof CostEstimates]) {
+function formatCategory(estimates: CostEstimates['accommodation']) {
   return Object.entries(estimates).map(([key, value]) => ({
     key,
     label: key.charAt(0).toUpperCase() + key.slice(1),
@@ -38,6 +38,8 @@ export default function TripDetailsStep() {
   const [error, setError] = useState<string | null>(null)
 
   const loading = progress !== null && progress.status !== 'done' && progress.status !== 'error'
+  // While the estimate streams in, show whichever categories are complete.
+  const estimates: Partial<CostEstimates> | null = plan.costEstimates ?? progress?.partial_result ?? null
   const canSubmit =
     plan.destination.trim().length > 0 && plan.numDays >= 1 && plan.totalBudget > 0
 
@@ -141,7 +143,7 @@ export default function TripDetailsStep() {
         </div>
       </Card>
 
-      {plan.costEstimates && (
+      {estimates && (
         <Card elevated className="px-8 py-9 max-md:px-6">
           <h3 className="font-sans text-lg font-semibold text-wandor-text mb-4">
             Estimated costs for {plan.destination}
@@ -153,7 +155,7 @@ export default function TripDetailsStep() {
                   {category}
                 </p>
                 <ul className="flex flex-col gap-1.5">
-                  {formatCategory(plan.costEstimates![category]).map((item) => (
+                  {formatCategory(estimates[category] ?? {}).map((item) => (
                     <li key={item.key} className="text-[14px] text-wandor-text">
                       <span className="text-[#5c5c5c]">{item.label}: </span>
                       {item.range}
@@ -164,11 +166,13 @@ export default function TripDetailsStep() {
             ))}
           </div>
 
-          <div className="mt-7 flex justify-end">
-            <PillButton onClick={() => update({ step: 'preferences' })}>
-              Continue to preferences
-            </PillButton>
-          </div>
+          {plan.costEstimates && (
+            <div className="mt-7 flex justify-end">
+              <PillButton onClick={() => update({ step: 'preferences' })}>
+                Continue to preferences
+              </PillButton>
+            </div>
+          )}
         </Card>
       )}
     </div>
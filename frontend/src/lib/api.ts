@@ -23,10 +23,10 @@ async function parseErrorDetail(res: Response): Promise<string> {
   }
 }
 
-async function request<T>(path: string, body: unknown): Promise<T> {
+async function request<T>(path: string, body: unknown, headers: Record<string, string> = {}): Promise<T> {
   const res = await fetch(`${API_BASE_URL}${path}`, {
     method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
+    headers: { 'Content-Type': 'application/json', ...headers },
     body: JSON.stringify(body),
   })
   if (!res.ok) throw new ApiError(res.status, await parseErrorDetail(res))
@@ -44,10 +44,19 @@ export interface CostRange {
   unit: string
 }
 
+export interface TripTotal {
+  min: number
+  max: number
+  /** What the per-unit cost was multiplied by, e.g. "6 nights". */
+  basis: string
+}
+
 export interface CostEstimates {
   accommodation: Record<string, CostRange>
   dining: Record<string, CostRange>
   transportation: Record<string, CostRange>
+  /** Per-unit costs scaled to this trip's length, where the unit allows it. */
+  trip_totals?: Partial<Record<'accommodation' | 'dining' | 'transportation', Record<string, TripTotal>>>
 }
 
 export interface CostEstimateProgress {
@@ -55,8 +64,16 @@ export interface CostEstimateProgress {
   resolved: number
   total: number
   generated_chars: number
+  /** How the search phase went, once it's over: answers from cache, in time
+   * for the deadline, cut off by it, and searches that needed a hedge. */
+  search?: { cached: number; on_time: number; late: number; hedged: number; searches: number } | null
+  /** Categories (and line items) parsed so far while the estimate is still
+   * being written; superseded by `result`. */
+  partial_result?: Partial<CostEstimates> | null
   result: CostEstimates | null
   error: string | null
+  /** 1-based place in the backend's job queue while waiting to start, else null. */
+  queue_position?: number | null
 }
 
 export interface CostEstimateParams {
@@ -66,39 +83,144 @@ export interface CostEstimateParams {
   total_budget: number
 }
 
+/** The job's event stream couldn't be opened or was dropped for good. */
+class JobStreamUnavailable extends Error {}
+
 /**
- * Starts a cost-estimate job (13 parallel real-price searches + one LLM call
- * on the backend, often 20s-130s+) and polls its real progress until it
- * resolves. `onProgress` fires on every poll tick so the UI can show genuine
- * "N of 13 prices found" status — the wait is too long and too variable for a
- * simulated/fake progress bar to stay honest.
+ * Follows a backend job over its server-sent event stream until it finishes.
+ * The server pushes only what changed (`phase`, `progress`), then `result` or
+ * `failed` — no repeated full-status polls. EventSource reconnects on its own
+ * after a network blip, resuming via `Last-Event-ID`; only when it gives up
+ * does this reject with `JobStreamUnavailable`, so callers can fall back to
+ * polling.
  */
-export async function pollCostEstimateByJobId(
-  jobId: string,
-  onProgress: (progress: CostEstimateProgress) => void,
-  pollIntervalMs = 900,
-): Promise<CostEstimates> {
+function followJobEvents<P extends { status: string }, R>(
+  path: string,
+  initial: P,
+  onProgress: (progress: P) => void,
+): Promise<R> {
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(`${API_BASE_URL}${path}`)
+    let progress = initial
+    const update = (event: MessageEvent) => {
+      progress = { ...progress, ...JSON.parse(event.data) }
+      onProgress(progress)
+    }
+    source.addEventListener('phase', update)
+    source.addEventListener('progress', update)
+    source.addEventListener('result', (event: MessageEvent) => {
+      source.close()
+      resolve((JSON.parse(event.data) as { result: R }).result)
+    })
+    source.addEventListener('failed', (event: MessageEvent) => {
+      source.close()
+      const { error } = JSON.parse(event.data) as { error?: string | null }
+      reject(new ApiError(502, error ?? 'Job failed.'))
+    })
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) {
+        reject(new JobStreamUnavailable())
+      }
+    }
+  })
+}
+
+/**
+ * Polls a job's status endpoint until it resolves — the fallback when the
+ * event stream isn't available.
+ */
+async function pollJobStatus<P extends { status: string; error: string | null; result: R | null }, R>(
+  path: string,
+  failureMessage: string,
+  onProgress: (progress: P) => void,
+  pollIntervalMs: number,
+  followText = false,
+): Promise<R> {
+  // With `followText`, each poll asks only for the text written since the
+  // last one and the pieces are stitched together here.
+  let text = ''
+  let offset = 0
   // eslint-disable-next-line no-constant-condition
   while (true) {
-    const progress = await requestGet<CostEstimateProgress>(`/api/cost-estimate/status/${jobId}`)
-    onProgress(progress)
+    const progress = await requestGet<P & { text?: string; next_offset?: number }>(
+      followText ? `${path}?offset=${offset}` : path,
+    )
+    if (followText) {
+      text += progress.text ?? ''
+      offset = progress.next_offset ?? offset
+    }
+    onProgress(followText ? { ...progress, text } : progress)
 
     if (progress.status === 'done' && progress.result) {
       return progress.result
     }
     if (progress.status === 'error') {
-      throw new ApiError(502, progress.error ?? 'Cost estimate failed.')
+      throw new ApiError(502, progress.error ?? failureMessage)
     }
     await new Promise((resolve) => setTimeout(resolve, pollIntervalMs))
   }
 }
 
+async function watchJob<P extends { status: string; error: string | null; result: R | null }, R>(
+  kind: 'cost-estimate' | 'itinerary',
+  jobId: string,
+  initial: P,
+  failureMessage: string,
+  onProgress: (progress: P) => void,
+  pollIntervalMs: number,
+): Promise<R> {
+  if (typeof EventSource !== 'undefined') {
+    try {
+      return await followJobEvents<P, R>(`/api/${kind}/events/${jobId}`, initial, onProgress)
+    } catch (err) {
+      if (!(err instanceof JobStreamUnavailable)) throw err
+    }
+  }
+  return pollJobStatus<P, R>(
+    `/api/${kind}/status/${jobId}`,
+    failureMessage,
+    onProgress,
+    pollIntervalMs,
+    kind === 'itinerary',
+  )
+}
+
+/**
+ * Follows a cost-estimate job (13 parallel real-price searches + one LLM call
+ * on the backend, often 20s-130s+) until it resolves. `onProgress` fires on
+ * every update so the UI can show genuine "N of 13 prices found" status — the
+ * wait is too long and too variable for a simulated/fake progress bar to stay
+ * honest. Uses the job's event stream, falling back to polling every
+ * `pollIntervalMs` if the stream is unavailable.
+ */
+export function pollCostEstimateByJobId(
+  jobId: string,
+  onProgress: (progress: CostEstimateProgress) => void,
+  pollIntervalMs = 900,
+): Promise<CostEstimates> {
+  return watchJob<CostEstimateProgress, CostEstimates>(
+    'cost-estimate',
+    jobId,
+    { status: 'searching', resolved: 0, total: 13, generated_chars: 0, result: null, error: null },
+    'Cost estimate failed.',
+    onProgress,
+    pollIntervalMs,
+  )
+}
+
 export async function pollCostEstimate(
   params: CostEstimateParams,
   onProgress: (progress: CostEstimateProgress) => void,
   pollIntervalMs = 900,
 ): Promise<CostEstimates> {
-  const { job_id } = await request<{ job_id: string }>('/api/cost-estimate/start', params)
+  // The key lets a retry after a dropped response pick up the job the first
+  // attempt already started, rather than starting a second one.
+  const headers = { 'Idempotency-Key': crypto.randomUUID() }
+  const start = () => request<{ job_id: string }>('/api/cost-estimate/start', params, headers)
+  const { job_id } = await start().catch((err) => {
+    if (err instanceof ApiError) throw err
+    return start() // network failure: the job may have started, so retry with the same key
+  })
   return pollCostEstimateByJobId(job_id, onProgress, pollIntervalMs)
 }
 
@@ -123,35 +245,35 @@ export interface ItineraryRequest {
 export interface ItineraryProgress {
   status: 'generating' | 'done' | 'error'
   generated_chars: number
+  /** The itinerary as written so far (when following the job by polling). */
+  text?: string
   result: { itinerary: string } | null
   error: string | null
+  /** 1-based place in the backend's job queue while waiting to start, else null. */
+  queue_position?: number | null
 }
 
 /**
- * Starts an itinerary-generation job (a single, often 10s-100s+ LLM call whose
- * length scales with the number of days requested) and polls its real progress
- * until it resolves. `onProgress` fires on every poll tick with the real
- * character count streamed so far — the wait is too long and variable for a
- * simulated/fake progress bar to stay honest.
+ * Follows an itinerary-generation job (a single, often 10s-100s+ LLM call whose
+ * length scales with the number of days requested) until it resolves.
+ * `onProgress` fires on every update with the real character count streamed so
+ * far — the wait is too long and variable for a simulated/fake progress bar to
+ * stay honest. Uses the job's event stream, falling back to polling every
+ * `pollIntervalMs` if the stream is unavailable.
  */
-export async function pollItineraryByJobId(
+export function pollItineraryByJobId(
   jobId: string,
   onProgress: (progress: ItineraryProgress) => void,
   pollIntervalMs = 900,
 ): Promise<{ itinerary: string }> {
-  // eslint-disable-next-line no-constant-condition
-  while (true) {
-    const progress = await requestGet<ItineraryProgress>(`/api/itinerary/status/${jobId}`)
-    onProgress(progress)
-
-    if (progress.status === 'done' && progress.result) {
-      return progress.result
-    }
-    if (progress.status === 'error') {
-      throw new ApiError(502, progress.error ?? 'Itinerary generation failed.')
-    }
-    await new Promise((resolve) => setTimeout(resolve, pollIntervalMs))
-  }
+  return watchJob<ItineraryProgress, { itinerary: string }>(
+    'itinerary',
+    jobId,
+    { status: 'generating', generated_chars: 0, result: null, error: null },
+    'Itinerary generation failed.',
+    onProgress,
+    pollIntervalMs,
+  )
 }
 
 export async function pollItinerary(
@@ -172,3 +294,11 @@ export async function fetchItineraryPdf(itinerary_markdown: string): Promise<Blo
   if (!res.ok) throw new ApiError(res.status, 'Failed to generate PDF.')
   return res.blob()
 }
+
+// Renders a finished itinerary job server-side — no markdown upload, and the
+// browser revalidates repeat downloads with the response's ETag.
+export async function fetchItineraryPdfByJobId(jobId: string): Promise<Blob> {
+  const res = await fetch(`${API_BASE_URL}/api/itinerary/pdf/${jobId}`)
+  if (!res.ok) throw new ApiError(res.status, 'Failed to generate PDF.')
+  return res.blob()
+}